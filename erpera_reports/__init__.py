@@ -7,6 +7,7 @@ __all__ = [
     'get_total_branch_wise_selling',
     'get_branch_wise_selling',
     'get_company_wise_selling',
+    'get_branch_group_wise_selling',
     'get_selling_summary',
     'consolidated_total_selling',
     'get_entity_wise_selling',
@@ -0,0 +1,214 @@
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+import frappe
+from frappe import _
+from frappe.utils import cint
+from werkzeug.wrappers import Response
+
+# Cost tiers of the report endpoints: how many reports of the tier may run at
+# once across the site and per user, how long a request over the site limit
+# waits for a slot, and the Retry-After it gets when turned away. A user's
+# cap covers every chart of the tier on one page (the selling page loads three
+# heavy ones at once). Override under "erpera_reports_admission" in
+# site_config.json, e.g. {"heavy": {"site": 8}, "site": 24}.
+COST_TIERS = {
+    "light": {"site": 16, "user": 6, "wait": 2, "retry_after": 2},
+    "standard": {"site": 8, "user": 3, "wait": 3, "retry_after": 5},
+    "heavy": {"site": 6, "user": 3, "wait": 2, "retry_after": 15}
+}
+# Reports running at once across every tier
+SITE_LIMIT = 12
+# Tiers whose requests over the site limits are queued as background jobs
+# (see erpera_reports.jobs) instead of being turned away
+QUEUED_TIERS = ("heavy",)
+
+# A lease left behind by a killed worker frees its slot after this long
+LEASE_TTL = 15 * 60
+# Seconds between attempts while waiting for a slot
+ADMISSION_POLL = 0.25
+
+ADMISSION_KEY = "erpera_reports:admission"
+
+# Drops the expired leases of every scope, then takes a lease in each if all
+# have room, atomically. Returns 0 when admitted, else the 1-based index of
+# the first full scope.
+# KEYS: scope sets; ARGV: now, lease expiry, token, one limit per key, key TTL
+ADMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now)
+    local limit = tonumber(ARGV[3 + i])
+    if limit > 0 and redis.call('ZCARD', key) >= limit then
+        return i
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, ARGV[2], ARGV[3])
+    redis.call('EXPIRE', key, ARGV[4 + #KEYS])
+end
+return 0
+"""
+
+
+def get_admission_config():
+    return frappe.conf.get("erpera_reports_admission") or {}
+
+
+def get_tier_limits(tier):
+    return dict(COST_TIERS[tier], **(get_admission_config().get(tier) or {}))
+
+
+def get_site_limit():
+    return cint(get_admission_config().get("site") or SITE_LIMIT)
+
+
+def get_cost_tier(endpoint):
+    """
+    Cost tier of a REPORT_ENDPOINTS entry: per method under
+    "erpera_reports_cost_tiers" in site_config.json, else the one it was
+    registered with.
+    """
+    return (frappe.conf.get("erpera_reports_cost_tiers") or {}).get(endpoint.path) or endpoint.cost
+
+
+def get_scopes(tier):
+    """(scope, key, limit) of every limit a report of `tier` counts against, per user first."""
+    limits = get_tier_limits(tier)
+    return [
+        ("user", f"{ADMISSION_KEY}:{tier}:user:{frappe.session.user}", cint(limits["user"])),
+        ("tier", f"{ADMISSION_KEY}:{tier}", cint(limits["site"])),
+        ("site", ADMISSION_KEY, get_site_limit())
+    ]
+
+
+def admit(tier):
+    """
+    Take a slot for a report of cost `tier`, waiting up to the tier's `wait`
+    seconds while the site or tier is full. Returns the lease: `admitted`,
+    and otherwise the full `scope` and `retry_after`. Release an admitted
+    lease with release().
+
+    A user at their own limit is turned away at once. Admission fails open
+    when Redis cannot be reached.
+    """
+    limits = get_tier_limits(tier)
+    scopes = get_scopes(tier)
+    cache = frappe.cache()
+    lease = frappe._dict(
+        admitted=True,
+        tier=tier,
+        token=frappe.generate_hash(length=16),
+        scope_keys=[cache.make_key(key) for _, key, _ in scopes]
+    )
+
+    deadline = time.monotonic() + cint(limits["wait"])
+    while True:
+        try:
+            now = time.time()
+            full = cache.eval(
+                ADMIT_SCRIPT, len(lease.scope_keys), *lease.scope_keys,
+                now, now + LEASE_TTL, lease.token, *[limit for _, _, limit in scopes], LEASE_TTL
+            )
+        except Exception as e:
+            frappe.log_error(f"Error in admit: {str(e)}")
+            lease.scope_keys = []
+            return lease
+
+        if not full:
+            return lease
+        scope = scopes[cint(full) - 1][0]
+        if scope == "user" or time.monotonic() >= deadline:
+            lease.update(admitted=False, scope=scope, retry_after=cint(limits["retry_after"]))
+            return lease
+        time.sleep(ADMISSION_POLL)
+
+
+def release(lease):
+    """Give back the slots of an admitted lease."""
+    if not lease or not lease.admitted or not lease.scope_keys:
+        return
+    try:
+        pipeline = frappe.cache().pipeline()
+        for key in lease.scope_keys:
+            pipeline.zrem(key, lease.token)
+        pipeline.execute()
+    except Exception as e:
+        # The lease expires on its own after LEASE_TTL
+        frappe.log_error(f"Error in release: {str(e)}")
+
+
+def can_queue(lease, background=False):
+    """
+    True when a turned-away report can run as a background job instead: any
+    report of a `background` capable endpoint, else one in a queued tier over
+    the site's limits rather than the user's own.
+    """
+    return background or (lease.scope != "user" and lease.tier in QUEUED_TIERS)
+
+
+def get_throttled_response(lease):
+    """429 Too Many Requests for a turned-away lease, with its Retry-After."""
+    return Response(
+        json.dumps({"throttled": 1, "scope": lease.scope, "retry_after": lease.retry_after}),
+        status=429,
+        mimetype="application/json",
+        headers={"Retry-After": str(lease.retry_after)}
+    )
+
+
+@contextmanager
+def admitted(tier):
+    """
+    Hold a lease of `tier` for the block, for reports run outside an HTTP
+    endpoint wrapper (e.g. saved report snapshots). Raises
+    TooManyRequestsError (429) when turned away.
+    """
+    lease = admit(tier)
+    if not lease.admitted:
+        frappe.throw(
+            _("Too many reports are running. Try again in {0} seconds.").format(lease.retry_after),
+            frappe.TooManyRequestsError
+        )
+    try:
+        yield lease
+    finally:
+        release(lease)
+
+
+def admission_control(tier):
+    """
+    Admission control for a whitelisted report method outside
+    endpoints.report_endpoint(), e.g. the drill-downs. Place below
+    @frappe.whitelist() and above @read_from_replica, so a waiting request
+    holds no connection; only the method requested over HTTP is counted.
+    A streamed response (e.g. an export) keeps its lease until the body is
+    closed.
+    """
+    def decorator(fn):
+        path = f"{fn.__module__}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not getattr(frappe.local, "request", None) or frappe.form_dict.get("cmd") != path:
+                return fn(*args, **kwargs)
+
+            lease = admit(tier)
+            if not lease.admitted:
+                return get_throttled_response(lease)
+            streamed = False
+            try:
+                result = fn(*args, **kwargs)
+                if isinstance(result, Response) and result.is_streamed:
+                    result.call_on_close(functools.partial(release, lease))
+                    streamed = True
+                return result
+            finally:
+                if not streamed:
+                    release(lease)
+
+        return wrapper
+
+    return decorator
@@ -1,10 +1,14 @@
 import frappe
 import json
-@frappe.whitelist()
-def get_buying_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
+from erpera_reports.admission import admission_control
+from erpera_reports.export import stream_export
+from erpera_reports.replica import read_from_replica
+from erpera_reports.trees import cost_center_condition, item_group_condition
+
+def build_buying_drill_down_query(filters=None, chart_title=None, clicked_label=None):
     """
-    Get detailed drill-down data when a bar chart is clicked
-    Returns purchase invoice details based on the clicked element
+    Build the purchase invoice drill-down query without ORDER BY / LIMIT
+    Shared by the drill-down modal and the streaming export
     """
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -53,7 +57,7 @@ def get_buying_drill_down_data(filters=None, chart_title=None, clicked_label=Non
         # Date filters should already be applied via filters['from_date'] and filters['to_date']
         
     elif drill_type == 'branch' and drill_value:
-        drill_conditions.append("(pi.cost_center = %(drill_branch)s OR pi.cost_center LIKE %(drill_branch_like)s)")
+        drill_conditions.append(f"({cost_center_condition('pi.cost_center', drill_value, 'drill_branch')} OR pi.cost_center LIKE %(drill_branch_like)s)")
         drill_params['drill_branch'] = drill_value
         drill_params['drill_branch_like'] = f"%{drill_value}%"
         title = f"Purchase Details for Branch: {drill_value}"
@@ -98,44 +102,70 @@ def get_buying_drill_down_data(filters=None, chart_title=None, clicked_label=Non
              OR (i.is_stock_item IS NULL AND pii.item_group NOT IN ('EXPENSE', 'FIXED ASSET', 'Service', 'SERVICES')))
             AND pii.item_group NOT IN ('EXPENSE', 'FIXED ASSET', 'Service', 'SERVICES')
         """)
+
+    query = base_query
+    params = drill_params.copy()
+    
+    # Add drill-down conditions
+    if drill_conditions:
+        query += " AND " + " AND ".join(drill_conditions)
+    
+    # Apply additional filters (dates, etc.)
+    if filters.get('from_date'):
+        query += " AND pi.posting_date >= %(from_date)s"
+        params['from_date'] = filters['from_date']
+    
+    if filters.get('to_date'):
+        query += " AND pi.posting_date <= %(to_date)s"
+        params['to_date'] = filters['to_date']
+    
+    if filters.get('company') and drill_type != 'company':
+        query += " AND pi.company = %(company)s"
+        params['company'] = filters['company']
+    
+    if filters.get('branch'):
+        query += f" AND {cost_center_condition('pi.cost_center', filters['branch'])}"
+        params['branch'] = filters['branch']
+    
+    if filters.get('item'):
+        query += " AND (pii.item_code = %(item)s OR pii.item_name = %(item)s)"
+        params['item'] = filters['item']
     
+    if filters.get('item_group'):
+        query += f" AND {item_group_condition('pii.item_group', filters['item_group'])}"
+        params['item_group'] = filters['item_group']
+
+    return frappe._dict(
+        query=query,
+        params=params,
+        order_by="pi.posting_date DESC, pi.creation DESC",
+        columns=["invoice_name", "posting_date", "supplier_name", "company", "branch", "item_name", "item_group", "total_qty", "total_amount", "status"],
+        title=title,
+        filters=filters,
+        drill_type=drill_type,
+        drill_value=drill_value,
+        drill_params=drill_params
+    )
+
+@frappe.whitelist()
+@admission_control("standard")
+@read_from_replica
+def get_buying_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
+    """
+    Get detailed drill-down data when a bar chart is clicked
+    Returns purchase invoice details based on the clicked element
+    """
+    drill = build_buying_drill_down_query(filters, chart_title, clicked_label)
+    filters, drill_type, drill_value, title = drill.filters, drill.drill_type, drill.drill_value, drill.title
+    drill_params = drill.drill_params
+
     try:
-        # Build the complete query
-        query = base_query
-        params = drill_params.copy()
-        
-        # Add drill-down conditions
-        if drill_conditions:
-            query += " AND " + " AND ".join(drill_conditions)
-        
-        # Apply additional filters (dates, etc.)
-        if filters.get('from_date'):
-            query += " AND pi.posting_date >= %(from_date)s"
-            params['from_date'] = filters['from_date']
-        
-        if filters.get('to_date'):
-            query += " AND pi.posting_date <= %(to_date)s"
-            params['to_date'] = filters['to_date']
-        
-        if filters.get('company') and drill_type != 'company':
-            query += " AND pi.company = %(company)s"
-            params['company'] = filters['company']
-        
-        if filters.get('branch'):
-            query += " AND pi.cost_center = %(branch)s"
-            params['branch'] = filters['branch']
-        
-        if filters.get('item'):
-            query += " AND (pii.item_code = %(item)s OR pii.item_name = %(item)s)"
-            params['item'] = filters['item']
-        
-        if filters.get('item_group'):
-            query += " AND pii.item_group = %(item_group)s"
-            params['item_group'] = filters['item_group']
+        query = drill.query
+        params = drill.params
         
         # Add ordering and limit
-        query += """
-        ORDER BY pi.posting_date DESC, pi.creation DESC
+        query += f"""
+        ORDER BY {drill.order_by}
         LIMIT 500
         """
         
@@ -237,11 +267,10 @@ def get_buying_drill_down_data(filters=None, chart_title=None, clicked_label=Non
             'title': f"Error: {title if 'title' in locals() else 'Unknown'}"
         }
 
-@frappe.whitelist()
-def get_selling_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
+def build_selling_drill_down_query(filters=None, chart_title=None, clicked_label=None):
     """
-    Get detailed drill-down data for sales when a bar chart is clicked
-    Returns sales invoice details based on the clicked element
+    Build the sales invoice drill-down query without ORDER BY / LIMIT
+    Shared by the drill-down modal and the streaming export
     """
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -277,7 +306,7 @@ def get_selling_drill_down_data(filters=None, chart_title=None, clicked_label=No
     if drill_type == 'time_period' and drill_value:
         title = f"Selling Details for {drill_value}"
     elif drill_type == 'branch' and drill_value:
-        drill_conditions.append("(si.cost_center = %(drill_branch)s OR si.cost_center LIKE %(drill_branch_like)s)")
+        drill_conditions.append(f"({cost_center_condition('si.cost_center', drill_value, 'drill_branch')} OR si.cost_center LIKE %(drill_branch_like)s)")
         drill_params['drill_branch'] = drill_value
         drill_params['drill_branch_like'] = f"%{drill_value}%"
         title = f"Selling Details for Branch: {drill_value}"
@@ -314,36 +343,64 @@ def get_selling_drill_down_data(filters=None, chart_title=None, clicked_label=No
              OR (i.is_stock_item IS NULL AND sii.item_group NOT IN ('EXPENSE', 'FIXED ASSET', 'Service', 'SERVICES')))
             AND sii.item_group NOT IN ('EXPENSE', 'FIXED ASSET', 'Service', 'SERVICES')
         """)
+
+    query = base_query
+    params = drill_params.copy()
+    if drill_conditions:
+        query += " AND " + " AND ".join(drill_conditions)
+    if filters.get('from_date'):
+        query += " AND si.posting_date >= %(from_date)s"
+        params['from_date'] = filters['from_date']
+    if filters.get('to_date'):
+        query += " AND si.posting_date <= %(to_date)s"
+        params['to_date'] = filters['to_date']
+    if filters.get('company') and drill_type != 'company':
+        query += " AND si.company = %(company)s"
+        params['company'] = filters['company']
+    if filters.get('branch'):
+        query += f" AND {cost_center_condition('si.cost_center', filters['branch'])}"
+        params['branch'] = filters['branch']
+    if filters.get('item'):
+        query += " AND (sii.item_code = %(item)s OR sii.item_name = %(item)s"
+        params['item'] = filters['item']
+        # If this is a category chart, also match item_group
+        if chart_title and "category" in chart_title.lower():
+            query += " OR sii.item_group = %(item_group)s"
+            params['item_group'] = filters['item']
+        query += ")"
+    if filters.get('item_group'):
+        query += f" AND {item_group_condition('sii.item_group', filters['item_group'])}"
+        params['item_group'] = filters['item_group']
+
+    return frappe._dict(
+        query=query,
+        params=params,
+        order_by="si.posting_date DESC, si.creation DESC",
+        columns=["invoice_name", "posting_date", "customer_name", "company", "branch", "item_name", "item_group", "total_qty", "total_amount", "status"],
+        title=title,
+        filters=filters,
+        drill_type=drill_type,
+        drill_value=drill_value,
+        drill_params=drill_params
+    )
+
+@frappe.whitelist()
+@admission_control("standard")
+@read_from_replica
+def get_selling_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
+    """
+    Get detailed drill-down data for sales when a bar chart is clicked
+    Returns sales invoice details based on the clicked element
+    """
+    drill = build_selling_drill_down_query(filters, chart_title, clicked_label)
+    filters, drill_type, drill_value, title = drill.filters, drill.drill_type, drill.drill_value, drill.title
+    drill_params = drill.drill_params
+
     try:
-        query = base_query
-        params = drill_params.copy()
-        if drill_conditions:
-            query += " AND " + " AND ".join(drill_conditions)
-        if filters.get('from_date'):
-            query += " AND si.posting_date >= %(from_date)s"
-            params['from_date'] = filters['from_date']
-        if filters.get('to_date'):
-            query += " AND si.posting_date <= %(to_date)s"
-            params['to_date'] = filters['to_date']
-        if filters.get('company') and drill_type != 'company':
-            query += " AND si.company = %(company)s"
-            params['company'] = filters['company']
-        if filters.get('branch'):
-            query += " AND si.cost_center = %(branch)s"
-            params['branch'] = filters['branch']
-        if filters.get('item'):
-            query += " AND (sii.item_code = %(item)s OR sii.item_name = %(item)s"
-            params['item'] = filters['item']
-            # If this is a category chart, also match item_group
-            if chart_title and "category" in chart_title.lower():
-                query += " OR sii.item_group = %(item_group)s"
-                params['item_group'] = filters['item']
-            query += ")"
-        if filters.get('item_group'):
-            query += " AND sii.item_group = %(item_group)s"
-            params['item_group'] = filters['item_group']
-        query += """
-        ORDER BY si.posting_date DESC, si.creation DESC
+        query = drill.query
+        params = drill.params
+        query += f"""
+        ORDER BY {drill.order_by}
         LIMIT 500
         """
         result = frappe.db.sql(query, params, as_dict=True)
@@ -380,11 +437,10 @@ def get_selling_drill_down_data(filters=None, chart_title=None, clicked_label=No
             'title': f"Error: {title if 'title' in locals() else 'Unknown'}"
         }
 
-@frappe.whitelist()
-def get_stock_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
+def build_stock_drill_down_query(filters=None, chart_title=None, clicked_label=None):
     """
-    Get detailed drill-down data for stock when a bar chart is clicked
-    Returns stock ledger details based on the clicked element
+    Build the stock ledger drill-down query without ORDER BY / LIMIT
+    Shared by the drill-down modal and the streaming export
     """
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -433,35 +489,63 @@ def get_stock_drill_down_data(filters=None, chart_title=None, clicked_label=None
         title = f"Stock Details: {drill_value or 'All'}"
     if chart_title and any(keyword in chart_title.lower() for keyword in ['stock', 'product', 'item']):
         drill_conditions.append("(sle.voucher_type IN ('Stock Entry', 'Purchase Receipt', 'Delivery Note'))")
+
+    query = base_query
+    params = drill_params.copy()
+    if drill_conditions:
+        query += " AND " + " AND ".join(drill_conditions)
+    if filters.get('from_date'):
+        query += " AND sle.posting_date >= %(from_date)s"
+        params['from_date'] = filters['from_date']
+    if filters.get('to_date'):
+        query += " AND sle.posting_date <= %(to_date)s"
+        params['to_date'] = filters['to_date']
+    if filters.get('company') and drill_type != 'company':
+        query += " AND sle.company = %(company)s"
+        params['company'] = filters['company']
+    # Branch filter (maps to warehouse in stock context)
+    if filters.get('branch'):
+        query += " AND LOWER(TRIM(sle.warehouse)) = LOWER(TRIM(%(branch)s))"
+        params['branch'] = filters['branch'].strip()
+    elif filters.get('warehouse'):
+        query += " AND sle.warehouse = %(warehouse)s"
+        params['warehouse'] = filters['warehouse']
+    if filters.get('item'):
+        query += " AND sle.item_code = %(item)s"
+        params['item'] = filters['item']
+    if filters.get('item_group'):
+        query += f" AND {item_group_condition('i.item_group', filters['item_group'])}"
+        params['item_group'] = filters['item_group']
+
+    return frappe._dict(
+        query=query,
+        params=params,
+        order_by="sle.posting_date DESC, sle.creation DESC",
+        columns=["posting_date", "item_name", "item_group", "warehouse", "stock_value", "company"],
+        title=title,
+        filters=filters,
+        drill_type=drill_type,
+        drill_value=drill_value,
+        drill_params=drill_params
+    )
+
+@frappe.whitelist()
+@admission_control("standard")
+@read_from_replica
+def get_stock_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
+    """
+    Get detailed drill-down data for stock when a bar chart is clicked
+    Returns stock ledger details based on the clicked element
+    """
+    drill = build_stock_drill_down_query(filters, chart_title, clicked_label)
+    filters, drill_type, drill_value, title = drill.filters, drill.drill_type, drill.drill_value, drill.title
+    drill_params = drill.drill_params
+
     try:
-        query = base_query
-        params = drill_params.copy()
-        if drill_conditions:
-            query += " AND " + " AND ".join(drill_conditions)
-        if filters.get('from_date'):
-            query += " AND sle.posting_date >= %(from_date)s"
-            params['from_date'] = filters['from_date']
-        if filters.get('to_date'):
-            query += " AND sle.posting_date <= %(to_date)s"
-            params['to_date'] = filters['to_date']
-        if filters.get('company') and drill_type != 'company':
-            query += " AND sle.company = %(company)s"
-            params['company'] = filters['company']
-        # Branch filter (maps to warehouse in stock context)
-        if filters.get('branch'):
-            query += " AND LOWER(TRIM(sle.warehouse)) = LOWER(TRIM(%(branch)s))"
-            params['branch'] = filters['branch'].strip()
-        elif filters.get('warehouse'):
-            query += " AND sle.warehouse = %(warehouse)s"
-            params['warehouse'] = filters['warehouse']
-        if filters.get('item'):
-            query += " AND sle.item_code = %(item)s"
-            params['item'] = filters['item']
-        if filters.get('item_group'):
-            query += " AND i.item_group = %(item_group)s"
-            params['item_group'] = filters['item_group']
-        query += """
-        ORDER BY sle.posting_date DESC, sle.creation DESC
+        query = drill.query
+        params = drill.params
+        query += f"""
+        ORDER BY {drill.order_by}
         LIMIT 500
         """
         result = frappe.db.sql(query, params, as_dict=True)
@@ -494,11 +578,10 @@ def get_stock_drill_down_data(filters=None, chart_title=None, clicked_label=None
             'title': f"Error: {title if 'title' in locals() else 'Unknown'}"
         }
 
-@frappe.whitelist()
-def get_expense_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
+def build_expense_drill_down_query(filters=None, chart_title=None, clicked_label=None):
     """
-    Get detailed drill-down data for expenses when a bar chart is clicked
-    Returns purchase invoice details for expense items based on the clicked element
+    Build the expense drill-down query without ORDER BY / LIMIT
+    Shared by the drill-down modal and the streaming export
     """
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -548,7 +631,7 @@ def get_expense_drill_down_data(filters=None, chart_title=None, clicked_label=No
         # Date filters should already be applied via filters['from_date'] and filters['to_date']
         
     elif drill_type == 'branch' and drill_value:
-        drill_conditions.append("(pi.cost_center = %(drill_branch)s OR pi.cost_center LIKE %(drill_branch_like)s)")
+        drill_conditions.append(f"({cost_center_condition('pi.cost_center', drill_value, 'drill_branch')} OR pi.cost_center LIKE %(drill_branch_like)s)")
         drill_params['drill_branch'] = drill_value
         drill_params['drill_branch_like'] = f"%{drill_value}%"
         title = f"Expense Details for Branch: {drill_value}"
@@ -596,44 +679,70 @@ def get_expense_drill_down_data(filters=None, chart_title=None, clicked_label=No
     
     else:
         title = f"Expense Details: {drill_value or 'All'}"
+
+    query = base_query
+    params = drill_params.copy()
+    
+    # Add drill-down conditions
+    if drill_conditions:
+        query += " AND " + " AND ".join(drill_conditions)
+    
+    # Apply additional filters (dates, etc.)
+    if filters.get('from_date'):
+        query += " AND pi.posting_date >= %(from_date)s"
+        params['from_date'] = filters['from_date']
+    
+    if filters.get('to_date'):
+        query += " AND pi.posting_date <= %(to_date)s"
+        params['to_date'] = filters['to_date']
     
+    if filters.get('company') and drill_type != 'company' and drill_type != 'entity':
+        query += " AND pi.company = %(company)s"
+        params['company'] = filters['company']
+    
+    if filters.get('branch') and drill_type != 'branch' and drill_type != 'entity':
+        query += f" AND {cost_center_condition('pi.cost_center', filters['branch'])}"
+        params['branch'] = filters['branch']
+    
+    if filters.get('item'):
+        query += " AND (pii.item_code = %(item)s OR pii.item_name = %(item)s)"
+        params['item'] = filters['item']
+    
+    if filters.get('item_group') and drill_type != 'item_group':
+        query += f" AND {item_group_condition('pii.item_group', filters['item_group'])}"
+        params['item_group'] = filters['item_group']
+
+    return frappe._dict(
+        query=query,
+        params=params,
+        order_by="pi.posting_date DESC, pi.creation DESC",
+        columns=["posting_date", "supplier_name", "item_name", "item_group", "total_qty", "total_amount", "status"],
+        title=title,
+        filters=filters,
+        drill_type=drill_type,
+        drill_value=drill_value,
+        drill_params=drill_params
+    )
+
+@frappe.whitelist()
+@admission_control("standard")
+@read_from_replica
+def get_expense_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
+    """
+    Get detailed drill-down data for expenses when a bar chart is clicked
+    Returns purchase invoice details for expense items based on the clicked element
+    """
+    drill = build_expense_drill_down_query(filters, chart_title, clicked_label)
+    filters, drill_type, drill_value, title = drill.filters, drill.drill_type, drill.drill_value, drill.title
+    drill_params = drill.drill_params
+
     try:
-        # Build the complete query
-        query = base_query
-        params = drill_params.copy()
-        
-        # Add drill-down conditions
-        if drill_conditions:
-            query += " AND " + " AND ".join(drill_conditions)
-        
-        # Apply additional filters (dates, etc.)
-        if filters.get('from_date'):
-            query += " AND pi.posting_date >= %(from_date)s"
-            params['from_date'] = filters['from_date']
-        
-        if filters.get('to_date'):
-            query += " AND pi.posting_date <= %(to_date)s"
-            params['to_date'] = filters['to_date']
-        
-        if filters.get('company') and drill_type != 'company' and drill_type != 'entity':
-            query += " AND pi.company = %(company)s"
-            params['company'] = filters['company']
-        
-        if filters.get('branch') and drill_type != 'branch' and drill_type != 'entity':
-            query += " AND pi.cost_center = %(branch)s"
-            params['branch'] = filters['branch']
-        
-        if filters.get('item'):
-            query += " AND (pii.item_code = %(item)s OR pii.item_name = %(item)s)"
-            params['item'] = filters['item']
-        
-        if filters.get('item_group') and drill_type != 'item_group':
-            query += " AND pii.item_group = %(item_group)s"
-            params['item_group'] = filters['item_group']
+        query = drill.query
+        params = drill.params
         
         # Add ordering and limit
-        query += """
-        ORDER BY pi.posting_date DESC, pi.creation DESC
+        query += f"""
+        ORDER BY {drill.order_by}
         LIMIT 500
         """
         
@@ -735,6 +844,38 @@ def get_expense_drill_down_data(filters=None, chart_title=None, clicked_label=No
             'title': f"Error: {title if 'title' in locals() else 'Unknown'}"
         }
     
+@frappe.whitelist()
+@admission_control("heavy")
+@read_from_replica
+def export_buying_drill_down_data(filters=None, chart_title=None, clicked_label=None, file_format="csv"):
+    """Stream the full purchase drill-down (no row limit) as CSV or XLSX"""
+    drill = build_buying_drill_down_query(filters, chart_title, clicked_label)
+    return stream_export(drill, file_format, drill.title)
+
+@frappe.whitelist()
+@admission_control("heavy")
+@read_from_replica
+def export_selling_drill_down_data(filters=None, chart_title=None, clicked_label=None, file_format="csv"):
+    """Stream the full selling drill-down (no row limit) as CSV or XLSX"""
+    drill = build_selling_drill_down_query(filters, chart_title, clicked_label)
+    return stream_export(drill, file_format, drill.title)
+
+@frappe.whitelist()
+@admission_control("heavy")
+@read_from_replica
+def export_stock_drill_down_data(filters=None, chart_title=None, clicked_label=None, file_format="csv"):
+    """Stream the full stock drill-down (no row limit) as CSV or XLSX"""
+    drill = build_stock_drill_down_query(filters, chart_title, clicked_label)
+    return stream_export(drill, file_format, drill.title)
+
+@frappe.whitelist()
+@admission_control("heavy")
+@read_from_replica
+def export_expense_drill_down_data(filters=None, chart_title=None, clicked_label=None, file_format="csv"):
+    """Stream the full expense drill-down (no row limit) as CSV or XLSX"""
+    drill = build_expense_drill_down_query(filters, chart_title, clicked_label)
+    return stream_export(drill, file_format, drill.title)
+
 @frappe.whitelist()
 def log_error(doc, method=None):
     frappe.log_error(frappe.get_traceback(), "Erro in purchase receipt")
@@ -742,6 +883,7 @@ def log_error(doc, method=None):
 
 
 @frappe.whitelist()
+@read_from_replica
 def get_stock_value():
     total_stock_value = frappe.db.sql("""
     SELECT SUM(stock_value)
@@ -750,6 +892,7 @@ def get_stock_value():
     return total_stock_value
 
 @frappe.whitelist()
+@read_from_replica
 def get_stock_value_by_warehouse():
     results = frappe.db.sql("""
         SELECT warehouse, SUM(stock_value) AS total_stock_value
@@ -762,6 +905,7 @@ def get_stock_value_by_warehouse():
 
 
 @frappe.whitelist()
+@read_from_replica
 def get_total_expense_by_cost_center(date=None, start_date = None, company = None):
     from erpnext.accounts.utils import get_balance_on
     filters = {}
@@ -795,6 +939,7 @@ def get_total_expense_by_cost_center(date=None, start_date = None, company = Non
     
     return data
 @frappe.whitelist()
+@read_from_replica
 def get_total_salaries_by_cost_center(date=None, start_date = None, company = None):
     from erpnext.accounts.utils import get_balance_on
     filters = {}
@@ -829,6 +974,7 @@ def get_total_salaries_by_cost_center(date=None, start_date = None, company = No
     return data
 
 @frappe.whitelist()
+@read_from_replica
 def get_total_rents_by_cost_center(date=None, start_date = None, company = None):
     from erpnext.accounts.utils import get_balance_on
     filters = {}
@@ -863,6 +1009,7 @@ def get_total_rents_by_cost_center(date=None, start_date = None, company = None)
     return data
 
 @frappe.whitelist()
+@read_from_replica
 def get_total_electric_bill_by_cost_center(date=None, start_date = None, company = None):
     from erpnext.accounts.utils import get_balance_on
     filters = {}
@@ -0,0 +1,25 @@
+import hashlib
+from functools import lru_cache
+
+import frappe
+
+from erpera_reports import __version__
+
+
+@lru_cache(maxsize=None)
+def get_asset_hash(path):
+    """Short content hash of a file under public/; changes whenever the file is redeployed."""
+    try:
+        with open(frappe.get_app_path("erpera_reports", "public", path), "rb") as f:
+            return hashlib.md5(f.read()).hexdigest()[:10]
+    except OSError:
+        return __version__
+
+
+def get_asset_url(path):
+    """
+    Jinja method: versioned URL of a static asset, e.g. get_asset_url("js/charts.js").
+    The version changes with the content, so browsers can cache the file indefinitely.
+    """
+    path = path.lstrip("/")
+    return f"/assets/erpera_reports/{path}?v={get_asset_hash(path)}"
@@ -1,6 +1,16 @@
 import frappe
 from frappe import _
 import json
+from erpera_reports.admission import admission_control
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.items import items_in_group, reportable_items
+from erpera_reports.replica import read_from_replica
+from erpera_reports.rollup import get_entity_data, get_month_label, get_monthly_rollup
+from erpera_reports.topn import get_share_pie, get_top_n_per_group
+from erpera_reports.trees import cost_center_condition, get_group_totals, item_group_condition
+
+# Doctypes whose modification watermark versions the report responses
+REPORT_SOURCES = ("Purchase Invoice", "Item", "Item Group", "Cost Center")
 
 def apply_filters_to_query(base_query, filters):
     """
@@ -29,8 +39,7 @@ def apply_filters_to_query(base_query, filters):
     
     # Item group filter
     if filters.get('item_group'):
-        conditions.append("i.item_group = %(item_group)s")
-        params['item_group'] = filters['item_group']
+        conditions.append(items_in_group("pii.item_code", filters['item_group']))
     
     # Company filter
     if filters.get('company'):
@@ -39,7 +48,7 @@ def apply_filters_to_query(base_query, filters):
     
     # Branch filter
     if filters.get('branch'):
-        conditions.append("pi.cost_center = %(branch)s")
+        conditions.append(cost_center_condition("pi.cost_center", filters['branch']))
         params['branch'] = filters['branch']
     
     # Custom filters
@@ -57,6 +66,7 @@ def apply_filters_to_query(base_query, filters):
     return base_query, params
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_mota_chart_data(filters=None):
     return {
         "labels": ["Jan", "Apr", "May", "Jun"],
@@ -65,6 +75,7 @@ def get_mota_chart_data(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_total_branch_wise_buying(filters=None):
     """
     Chart Name: Total Buying
@@ -73,131 +84,62 @@ def get_total_branch_wise_buying(filters=None):
     Note 2: Only Choose item which is in stock not choose expense or service item
     """
     
-    # Main query for branch-wise data
-    branch_query = """
+    # One scan for every level: WITH ROLLUP adds the company x month and
+    # month totals to the branch x month rows
+    rollup_query = f"""
     SELECT
-        COALESCE(pi.cost_center, 'Unknown Branch') AS branch,
-        DATE_FORMAT(pi.posting_date, '%%b %%Y') AS month_year,
         DATE_FORMAT(pi.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(pii.amount) AS total_amount,
-        COUNT(DISTINCT pi.name) AS invoice_count
-    FROM `tabPurchase Invoice` pi
-    INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
-    INNER JOIN `tabItem` i ON pii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        pi.docstatus = 1
-        AND pi.status NOT IN ('Cancelled', 'Return')
-        AND pi.cost_center IS NOT NULL
-        AND pi.cost_center != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-    """
-    
-    # Query for company-wise data
-    company_query = """
-    SELECT
-        COALESCE(pi.company, 'Unknown Company') AS company,
-        DATE_FORMAT(pi.posting_date, '%%b %%Y') AS month_year,
-        DATE_FORMAT(pi.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(pii.amount) AS total_amount,
-        COUNT(DISTINCT pi.name) AS invoice_count
-    FROM `tabPurchase Invoice` pi
-    INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
-    INNER JOIN `tabItem` i ON pii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        pi.docstatus = 1
-        AND pi.status NOT IN ('Cancelled', 'Return')
-        AND pi.company IS NOT NULL
-        AND pi.company != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-    """
-    
-    # Summary query for overall totals
-    summary_query = """
-    SELECT
-        DATE_FORMAT(pi.posting_date, '%%b %%Y') AS month_year,
-        DATE_FORMAT(pi.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(pii.amount) AS total_amount,
-        COUNT(DISTINCT pi.name) AS invoice_count,
-        COUNT(DISTINCT pi.cost_center) AS branch_count,
-        COUNT(DISTINCT pi.company) AS company_count
+        pi.company AS company,
+        pi.cost_center AS cost_center,
+        SUM(pii.amount) AS total_amount
     FROM `tabPurchase Invoice` pi
     INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
-    INNER JOIN `tabItem` i ON pii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
         pi.docstatus = 1
         AND pi.status NOT IN ('Cancelled', 'Return')
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+        AND {reportable_items('pii.item_code')}
     """
     
     try:
-        # Apply filters to queries
-        branch_query, branch_params = apply_filters_to_query(branch_query, filters)
-        company_query, company_params = apply_filters_to_query(company_query, filters)
-        summary_query, summary_params = apply_filters_to_query(summary_query, filters)
-        
-        # Add GROUP BY and ORDER BY clauses
-        branch_query += """
-        GROUP BY 
-            pi.cost_center,
-            DATE_FORMAT(pi.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(pi.posting_date, '%%b %%Y')
-        ORDER BY 
-            pi.cost_center,
-            sort_date
-        """
+        # Apply filters to the query
+        rollup_query, rollup_params = apply_filters_to_query(rollup_query, filters)
         
-        company_query += """
+        # Plain columns in the GROUP BY, labels are built in Python
+        rollup_query += """
         GROUP BY 
-            pi.company,
             DATE_FORMAT(pi.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(pi.posting_date, '%%b %%Y')
-        ORDER BY 
             pi.company,
-            sort_date
+            pi.cost_center
+        WITH ROLLUP
         """
         
-        summary_query += """
-        GROUP BY 
-            DATE_FORMAT(pi.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(pi.posting_date, '%%b %%Y')
-        ORDER BY sort_date
-        """
-        
-        # Execute queries
-        branch_result = frappe.db.sql(branch_query, branch_params, as_dict=True)
-        company_result = frappe.db.sql(company_query, company_params, as_dict=True)
-        summary_result = frappe.db.sql(summary_query, summary_params, as_dict=True)
+        rollup = get_monthly_rollup(rollup_query, rollup_params)
         
         # Process branch-wise data
         branch_data = {}
         branch_months = set()
         
-        for row in branch_result:
-            branch = row['branch']
-            month = row['month_year']
-            amount = float(row['total_amount']) if row['total_amount'] else 0
+        for (company, branch), months in rollup.branches.items():
+            if not branch:
+                continue
             
             if branch not in branch_data:
                 branch_data[branch] = {}
-            branch_data[branch][month] = amount
-            branch_months.add(month)
+            for sort_date, amount in months.items():
+                month = get_month_label(sort_date)
+                branch_data[branch][month] = branch_data[branch].get(month, 0) + amount
+                branch_months.add(month)
         
         # Process company-wise data
         company_data = {}
         company_months = set()
         
-        for row in company_result:
-            company = row['company']
-            month = row['month_year']
-            amount = float(row['total_amount']) if row['total_amount'] else 0
+        for company, months in rollup.companies.items():
+            if not company:
+                continue
             
-            if company not in company_data:
-                company_data[company] = {}
-            company_data[company][month] = amount
-            company_months.add(month)
+            company_data[company] = {get_month_label(sort_date): amount for sort_date, amount in months.items()}
+            company_months.update(company_data[company])
         
         # Sort months chronologically
         all_months = sorted(list(branch_months.union(company_months)), 
@@ -236,9 +178,27 @@ def get_total_branch_wise_buying(filters=None):
                 'borderWidth': 1
             })
         
+        # Branch group totals, rolled up the Cost Center tree from the branch rows
+        branch_group_datasets = []
+        branch_groups = get_group_totals("Cost Center", branch_data)
+        
+        for i, branch_group in enumerate(sorted(branch_groups.keys())):
+            data_points = []
+            for month in all_months:
+                data_points.append(branch_groups[branch_group].get(month, 0))
+            
+            branch_group_datasets.append({
+                'label': branch_group,
+                'data': data_points,
+                'backgroundColor': colors[i % len(colors)],
+                'borderColor': colors[i % len(colors)],
+                'borderWidth': 1
+            })
+        
         # Prepare summary data
-        summary_labels = [row['month_year'] for row in summary_result]
-        summary_data = [float(row['total_amount']) if row['total_amount'] else 0 for row in summary_result]
+        summary_months = sorted(rollup.months)
+        summary_labels = [get_month_label(sort_date) for sort_date in summary_months]
+        summary_data = [rollup.months[sort_date] for sort_date in summary_months]
         
         return {
             "chart_type": "bar",
@@ -252,6 +212,11 @@ def get_total_branch_wise_buying(filters=None):
                 "datasets": company_datasets,
                 "title": "Total Buying - Company Wise"
             },
+            "branch_group_wise": {
+                "labels": all_months,
+                "datasets": branch_group_datasets,
+                "title": "Total Buying - Branch Group Wise"
+            },
             "summary": {
                 "labels": summary_labels,
                 "data": summary_data,
@@ -260,6 +225,7 @@ def get_total_branch_wise_buying(filters=None):
             "metadata": {
                 "total_branches": len(branch_data),
                 "total_companies": len(company_data),
+                "total_branch_groups": len(branch_groups),
                 "date_range": "Last 12 months",
                 "filters_applied": filters
             },
@@ -272,12 +238,14 @@ def get_total_branch_wise_buying(filters=None):
             "chart_type": "bar",
             "branch_wise": {"labels": [], "datasets": []},
             "company_wise": {"labels": [], "datasets": []},
+            "branch_group_wise": {"labels": [], "datasets": []},
             "summary": {"labels": [], "data": []},
             "error": str(e),
             "success": False
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_wise_buying(filters=None):
     """
     Separate endpoint for branch-wise data only
@@ -288,6 +256,7 @@ def get_branch_wise_buying(filters=None):
     return {"labels": [], "datasets": [], "error": result.get('error')}
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_company_wise_buying(filters=None):
     """
     Separate endpoint for company-wise data only
@@ -298,6 +267,18 @@ def get_company_wise_buying(filters=None):
     return {"labels": [], "datasets": [], "error": result.get('error')}
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
+def get_branch_group_wise_buying(filters=None):
+    """
+    Separate endpoint for branch group (group Cost Center) data only
+    """
+    result = get_total_branch_wise_buying(filters)
+    if result.get('success'):
+        return result['branch_group_wise']
+    return {"labels": [], "datasets": [], "error": result.get('error')}
+
+@frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_buying_summary(filters=None):
     """
     Separate endpoint for summary data only
@@ -308,12 +289,13 @@ def get_buying_summary(filters=None):
     return {"labels": [], "data": [], "error": result.get('error')}
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_buying_products_by_branch(filters=None):
     """
     Get top buying products for each branch with percentage calculations
     Returns data in multi-pie chart format with datasets for each branch
     """
-    base_query = """
+    base_query = f"""
         SELECT 
             COALESCE(pi.cost_center, 'No Branch') as branch,
             pii.item_name,
@@ -323,14 +305,12 @@ def get_top_buying_products_by_branch(filters=None):
             COUNT(DISTINCT pi.name) as invoice_count
         FROM `tabPurchase Invoice` pi
         INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
-        INNER JOIN `tabItem` i ON pii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             pi.docstatus = 1
             AND pi.status NOT IN ('Cancelled', 'Return')
             AND pi.cost_center IS NOT NULL 
             AND pi.cost_center != ''
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('pii.item_code')}
     """
     
     try:
@@ -338,72 +318,22 @@ def get_top_buying_products_by_branch(filters=None):
         query, params = apply_filters_to_query(base_query, filters)
         query += """
         GROUP BY pi.cost_center, pii.item_code, pii.item_name
-        ORDER BY pi.cost_center, total_amount DESC
         """
         
-        result = frappe.db.sql(query, params, as_dict=True)
-        
-        # Process data by branch
-        branch_data = {}
-        for row in result:
-            branch = row['branch']
-            if branch not in branch_data:
-                branch_data[branch] = {
-                    'items': [],
-                    'total_branch_amount': 0
-                }
-            
-            # Add to branch total
-            amount = float(row['total_amount']) if row['total_amount'] else 0
-            branch_data[branch]['total_branch_amount'] += amount
-            
-            # Only store top 10 items per branch
-            if len(branch_data[branch]['items']) < 10:
-                branch_data[branch]['items'].append({
-                    'item_name': row['item_name'],
-                    'amount': amount,
-                    'quantity': float(row['total_quantity']) if row['total_quantity'] else 0
-                })
-        
-        # Color palette for the pie charts
-        colors = [
-            '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
-            '#FF9F40', '#FF6384', '#C9CBCF', '#4BC0C0', '#FF9F40'
-        ]
+        # Top 10 items per branch, the rest summed into one row
+        groups = get_top_n_per_group(
+            query, params, 'branch', ['total_amount', 'total_quantity'], 10, columns=['item_code', 'item_name']
+        )
         
         # Prepare datasets for each branch
         datasets = {}
-        for branch, data in branch_data.items():
-            total_branch_amount = data['total_branch_amount']
-            
-            # Calculate percentages and prepare labels
-            labels = []
-            data_values = []
-            background_colors = []
-            
-            # Process top items
-            top_items_amount = 0
-            for i, item in enumerate(data['items']):
-                percentage = (item['amount'] / total_branch_amount) * 100
-                top_items_amount += item['amount']
-                label = f"{item['item_name']} ({percentage:.1f}%)"
-                labels.append(label)
-                data_values.append(item['amount'])
-                background_colors.append(colors[i % len(colors)])
-            
-            # Add "Others" category if there's remaining amount
-            remaining_amount = total_branch_amount - top_items_amount
-            if remaining_amount > 0:
-                percentage = (remaining_amount / total_branch_amount) * 100
-                labels.append(f"Others ({percentage:.1f}%)")
-                data_values.append(remaining_amount)
-                background_colors.append('#C9CBCF')
-            
+        for branch, entry in groups.items():
+            pie = get_share_pie(entry, 'item_name', 'total_amount')
             datasets[branch] = {
-                'labels': labels,
-                'data': data_values,
-                'backgroundColor': background_colors,
-                'total_amount': total_branch_amount
+                'labels': pie.labels,
+                'data': pie.data,
+                'backgroundColor': pie.backgroundColor,
+                'total_amount': pie.total
             }
         
         return {
@@ -421,12 +351,13 @@ def get_top_buying_products_by_branch(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_buying_products_by_company(filters=None):
     """
     Get top buying products for each company with percentage calculations
     Returns data in multi-pie chart format with datasets for each company
     """
-    base_query = """
+    base_query = f"""
         SELECT 
             pi.company,
             pii.item_name,
@@ -436,14 +367,12 @@ def get_top_buying_products_by_company(filters=None):
             COUNT(DISTINCT pi.name) as invoice_count
         FROM `tabPurchase Invoice` pi
         INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
-        INNER JOIN `tabItem` i ON pii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             pi.docstatus = 1 
             AND pi.status NOT IN ('Cancelled', 'Return')
             AND pi.company IS NOT NULL 
             AND pi.company != ''
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('pii.item_code')}
     """
     
     try:
@@ -451,72 +380,22 @@ def get_top_buying_products_by_company(filters=None):
         query, params = apply_filters_to_query(base_query, filters)
         query += """
         GROUP BY pi.company, pii.item_code, pii.item_name
-        ORDER BY pi.company, total_amount DESC
         """
         
-        result = frappe.db.sql(query, params, as_dict=True)
-        
-        # Process data by company
-        company_data = {}
-        for row in result:
-            company = row['company']
-            if company not in company_data:
-                company_data[company] = {
-                    'items': [],
-                    'total_company_amount': 0
-                }
-            
-            # Add to company total
-            amount = float(row['total_amount']) if row['total_amount'] else 0
-            company_data[company]['total_company_amount'] += amount
-            
-            # Only store top 10 items per company
-            if len(company_data[company]['items']) < 10:
-                company_data[company]['items'].append({
-                    'item_name': row['item_name'],
-                    'amount': amount,
-                    'quantity': float(row['total_quantity']) if row['total_quantity'] else 0
-                })
-        
-        # Color palette for the pie charts
-        colors = [
-            '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
-            '#FF9F40', '#FF6384', '#C9CBCF', '#4BC0C0', '#FF9F40'
-        ]
+        # Top 10 items per company, the rest summed into one row
+        groups = get_top_n_per_group(
+            query, params, 'company', ['total_amount', 'total_quantity'], 10, columns=['item_code', 'item_name']
+        )
         
         # Prepare datasets for each company
         datasets = {}
-        for company, data in company_data.items():
-            total_company_amount = data['total_company_amount']
-            
-            # Calculate percentages and prepare labels
-            labels = []
-            data_values = []
-            background_colors = []
-            
-            # Process top items
-            top_items_amount = 0
-            for i, item in enumerate(data['items']):
-                percentage = (item['amount'] / total_company_amount) * 100
-                top_items_amount += item['amount']
-                label = f"{item['item_name']} ({percentage:.1f}%)"
-                labels.append(label)
-                data_values.append(item['amount'])
-                background_colors.append(colors[i % len(colors)])
-            
-            # Add "Others" category if there's remaining amount
-            remaining_amount = total_company_amount - top_items_amount
-            if remaining_amount > 0:
-                percentage = (remaining_amount / total_company_amount) * 100
-                labels.append(f"Others ({percentage:.1f}%)")
-                data_values.append(remaining_amount)
-                background_colors.append('#C9CBCF')
-            
+        for company, entry in groups.items():
+            pie = get_share_pie(entry, 'item_name', 'total_amount')
             datasets[company] = {
-                'labels': labels,
-                'data': data_values,
-                'backgroundColor': background_colors,
-                'total_amount': total_company_amount
+                'labels': pie.labels,
+                'data': pie.data,
+                'backgroundColor': pie.backgroundColor,
+                'total_amount': pie.total
             }
         
         return {
@@ -535,6 +414,7 @@ def get_top_buying_products_by_company(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(schema="consolidated_total_amount", sources=REPORT_SOURCES, background=True)
 def consolidated_total_buying(filters=None):
     """
     Chart Name: Consolidate Total Buying
@@ -542,79 +422,38 @@ def consolidated_total_buying(filters=None):
     Note: All the company's buying shows in one bar chart using different colour for each company or branch
     """
     
-    # Query to get consolidated data by company and branch
-    consolidated_query = """
+    # One scan: the branch x month rows of a WITH ROLLUP over month, company and branch
+    rollup_query = f"""
     SELECT
-        CASE 
-            WHEN pi.cost_center IS NOT NULL AND pi.cost_center != '' 
-            THEN CONCAT(COALESCE(pi.company, 'Unknown'), ' - ', pi.cost_center)
-            ELSE COALESCE(pi.company, 'Unknown Company')
-        END AS entity_name,
-        COALESCE(pi.company, 'Unknown Company') AS company,
-        COALESCE(pi.cost_center, 'No Branch') AS branch,
-        DATE_FORMAT(pi.posting_date, '%%b %%Y') AS month_year,
         DATE_FORMAT(pi.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(pii.amount) AS total_amount,
-        COUNT(DISTINCT pi.name) AS invoice_count,
-        SUM(pii.qty) AS total_qty
-    FROM `tabPurchase Invoice` pi
-    INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
-    INNER JOIN `tabItem` i ON pii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        pi.docstatus = 1
-        AND pi.status NOT IN ('Cancelled', 'Return')
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-    """
-    
-    # Query to get entity totals for sorting
-    entity_totals_query = """
-    SELECT
-        CASE 
-            WHEN pi.cost_center IS NOT NULL AND pi.cost_center != '' 
-            THEN CONCAT(COALESCE(pi.company, 'Unknown'), ' - ', pi.cost_center)
-            ELSE COALESCE(pi.company, 'Unknown Company')
-        END AS entity_name,
+        pi.company AS company,
+        pi.cost_center AS cost_center,
         SUM(pii.amount) AS total_amount
     FROM `tabPurchase Invoice` pi
     INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
-    INNER JOIN `tabItem` i ON pii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
         pi.docstatus = 1
         AND pi.status NOT IN ('Cancelled', 'Return')
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+        AND {reportable_items('pii.item_code')}
     """
     
     try:
-        # Apply filters to queries
-        consolidated_query, consolidated_params = apply_filters_to_query(consolidated_query, filters)
-        entity_totals_query, entity_totals_params = apply_filters_to_query(entity_totals_query, filters)
+        # Apply filters to the query
+        rollup_query, rollup_params = apply_filters_to_query(rollup_query, filters)
         
-        # Add GROUP BY and ORDER BY clauses
-        consolidated_query += """
+        # Entities are labelled and ordered in Python rather than grouped by a
+        # CONCAT() of company and branch
+        rollup_query += """
         GROUP BY 
-            entity_name,
-            pi.company,
-            pi.cost_center,
             DATE_FORMAT(pi.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(pi.posting_date, '%%b %%Y')
-        ORDER BY 
             pi.company,
-            pi.cost_center,
-            sort_date
-        """
-        
-        entity_totals_query += """
-        GROUP BY entity_name
-        ORDER BY total_amount DESC
+            pi.cost_center
+        WITH ROLLUP
         """
         
-        # Execute queries
-        consolidated_result = frappe.db.sql(consolidated_query, consolidated_params, as_dict=True)
-        entity_totals_result = frappe.db.sql(entity_totals_query, entity_totals_params, as_dict=True)
+        rollup = get_monthly_rollup(rollup_query, rollup_params)
         
-        if not consolidated_result:
+        if not rollup.branches:
             return {
                 "chart_type": "bar",
                 "labels": [],
@@ -623,26 +462,11 @@ def consolidated_total_buying(filters=None):
                 "success": True
             }
         
-        # Process consolidated data
-        entity_data = {}
-        all_months = set()
-        
-        for row in consolidated_result:
-            entity = row['entity_name']
-            month = row['month_year']
-            amount = float(row['total_amount']) if row['total_amount'] else 0
-            
-            if entity not in entity_data:
-                entity_data[entity] = {}
-            entity_data[entity][month] = amount
-            all_months.add(month)
+        # Process consolidated data, entities ordered by total amount (descending)
+        entity_data, entity_order = get_entity_data(rollup)
         
         # Sort months chronologically
-        sorted_months = sorted(list(all_months), 
-                              key=lambda x: frappe.utils.getdate(f"01 {x}"))
-        
-        # Get entity order by total amount (descending)
-        entity_order = [row['entity_name'] for row in entity_totals_result]
+        sorted_months = [get_month_label(sort_date) for sort_date in sorted(rollup.months)]
         
         # Color palette for different entities
         color_palette = [
@@ -728,6 +552,7 @@ def consolidated_total_buying(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_entity_summary(filters=None):
     """
     Get summary of all entities with their totals for a single-bar-per-entity chart
@@ -767,10 +592,12 @@ def get_entity_summary(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def total_buying(filters=None):
     return get_total_branch_wise_buying(filters)
 
 @frappe.whitelist()
+@read_from_replica
 def get_top_supplier_for_expenses_raw_bar(filters=None, branch=None, company=None, limit=5):
     """
     Top Suppliers for Expenses Raw Bar Chart
@@ -854,6 +681,7 @@ def get_top_supplier_for_expenses_raw_bar(filters=None, branch=None, company=Non
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_most_expenses_head_by_branch(filters=None):
     """
     Most Expenses Head by Branch - Pie Chart
@@ -976,6 +804,7 @@ def get_most_expenses_head_by_branch(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_most_expenses_head_by_company(filters=None):
     """
     Most Expenses Head by Company - Pie Chart
@@ -1099,6 +928,7 @@ def get_most_expenses_head_by_company(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_consolidate_most_purchase_head(filters=None):
     """
     Consolidate Most Purchase Head - Single Pie Chart
@@ -1226,6 +1056,8 @@ def get_consolidate_most_purchase_head(filters=None):
         }
 
 @frappe.whitelist()
+@admission_control("standard")
+@read_from_replica
 def get_drill_down_data(filters=None, chart_title=None, clicked_label=None, clicked_value=None):
     """
     Get detailed drill-down data when a bar chart is clicked
@@ -1278,7 +1110,7 @@ def get_drill_down_data(filters=None, chart_title=None, clicked_label=None, clic
         # Date filters should already be applied via filters['from_date'] and filters['to_date']
         
     elif drill_type == 'branch' and drill_value:
-        drill_conditions.append("(pi.cost_center = %(drill_branch)s OR pi.cost_center LIKE %(drill_branch_like)s)")
+        drill_conditions.append(f"({cost_center_condition('pi.cost_center', drill_value, 'drill_branch')} OR pi.cost_center LIKE %(drill_branch_like)s)")
         drill_params['drill_branch'] = drill_value
         drill_params['drill_branch_like'] = f"%{drill_value}%"
         title = f"Purchase Details for Branch: {drill_value}"
@@ -1347,7 +1179,7 @@ def get_drill_down_data(filters=None, chart_title=None, clicked_label=None, clic
             params['company'] = filters['company']
         
         if filters.get('branch') and drill_type != 'branch':
-            query += " AND pi.cost_center = %(branch)s"
+            query += f" AND {cost_center_condition('pi.cost_center', filters['branch'])}"
             params['branch'] = filters['branch']
         
         if filters.get('item'):
@@ -1355,7 +1187,7 @@ def get_drill_down_data(filters=None, chart_title=None, clicked_label=None, clic
             params['item'] = filters['item']
         
         if filters.get('item_group'):
-            query += " AND pii.item_group = %(item_group)s"
+            query += f" AND {item_group_condition('pii.item_group', filters['item_group'])}"
             params['item_group'] = filters['item_group']
         
         # Add ordering and limit
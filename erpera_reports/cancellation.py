@@ -0,0 +1,96 @@
+import json
+
+import frappe
+from frappe.utils import cint
+
+from erpera_reports.replica import is_replica_active, server_connection
+
+# Headers sent by the report client (public/js/report_client.js). The request
+# id names one report call; the slot names what it is loading (a chart), so a
+# newer call for the same slot and session supersedes the older one.
+REQUEST_ID_HEADER = "X-Report-Request-Id"
+SLOT_HEADER = "X-Report-Slot"
+
+# Safety net only: registrations are removed as soon as their request ends
+REGISTRATION_TTL = 15 * 60
+
+
+def get_request_key(request_id):
+    return f"erpera_reports:report_request:{request_id}"
+
+
+def get_slot_key(slot):
+    return f"erpera_reports:report_slot:{frappe.session.sid}:{slot}"
+
+
+def get_connection_id():
+    return cint(frappe.db.sql("SELECT CONNECTION_ID()")[0][0])
+
+
+def register_request():
+    """
+    Record the database connection serving the current report request under
+    its client request id, killing the query of a request it supersedes.
+    Returns the request id, or None when the client sent none.
+    """
+    request_id = frappe.get_request_header(REQUEST_ID_HEADER)
+    if not request_id or frappe.db.db_type != "mariadb":
+        return None
+
+    registration = {
+        "connection_id": get_connection_id(),
+        "replica": is_replica_active(),
+        "user": frappe.session.user,
+        "slot": frappe.get_request_header(SLOT_HEADER)
+    }
+    if registration["slot"]:
+        slot_key = get_slot_key(registration["slot"])
+        superseded = frappe.cache().get_value(slot_key)
+        if superseded and superseded != request_id:
+            kill_request(superseded)
+        frappe.cache().set_value(slot_key, request_id, expires_in_sec=REGISTRATION_TTL)
+
+    frappe.cache().set_value(get_request_key(request_id), registration, expires_in_sec=REGISTRATION_TTL)
+    return request_id
+
+
+def unregister_request(request_id):
+    registration = frappe.cache().get_value(get_request_key(request_id))
+    frappe.cache().delete_value(get_request_key(request_id))
+    if registration and registration.get("slot"):
+        slot_key = get_slot_key(registration["slot"])
+        if frappe.cache().get_value(slot_key) == request_id:
+            frappe.cache().delete_value(slot_key)
+
+
+def kill_request(request_id):
+    """KILL QUERY the statement running for `request_id`; only the user who started it may."""
+    key = get_request_key(request_id)
+    registration = frappe.cache().get_value(key)
+    if not registration or registration.get("user") != frappe.session.user:
+        return False
+
+    frappe.cache().delete_value(key)
+    connection_id = cint(registration.get("connection_id"))
+    if not connection_id:
+        return False
+
+    try:
+        # Connection ids are per server: kill on the one the request read from
+        with server_connection(registration.get("replica")) as db:
+            if connection_id == cint(db.sql("SELECT CONNECTION_ID()")[0][0]):
+                return False
+            # Ends only the running statement; the connection and its worker carry on
+            db.sql(f"KILL QUERY {connection_id}")
+    except Exception:
+        # The request finished (and its connection closed) in the meantime
+        return False
+    return True
+
+
+@frappe.whitelist()
+def cancel_report_requests(request_ids):
+    """Kill the queries of abandoned report requests, e.g. when filters change or the tab is closed."""
+    if isinstance(request_ids, str):
+        request_ids = json.loads(request_ids)
+    return {"cancelled": [request_id for request_id in request_ids or [] if kill_request(request_id)]}
@@ -1,5 +1,7 @@
 import frappe 
 
+from erpera_reports.replica import read_from_replica
+
 @frappe.whitelist()
 def get_sample_doughnut_chart_data():
     """
@@ -12,6 +14,7 @@ def get_sample_doughnut_chart_data():
     }
 
 @frappe.whitelist()
+@read_from_replica
 def get_top_buying_product_pie(branch=None, company=None, limit=5):
     """
     Top Buying Product Pie Chart
@@ -0,0 +1,97 @@
+import base64
+import math
+import struct
+from decimal import Decimal
+
+# Keys holding static Chart.js configuration. In compact mode these are
+# replaced by a schema id and rebuilt client-side (see public/js/compact_response.js).
+STATIC_OPTION_KEYS = ("options", "chart_options")
+
+INT32_MIN = -(2 ** 31)
+INT32_MAX = 2 ** 31 - 1
+
+
+def compact_response(payload, schema=None, precision=2):
+    """
+    Encode a chart response into the compact columnar format.
+
+    Layout of the returned dict:
+        compact  - format version
+        schema   - chart schema id used by the client to rebuild static options
+        omitted  - keys dropped from the payload in favour of the schema
+        strings  - shared string dictionary
+        body     - the payload with every list encoded as a node:
+                   {"$": "i4", "s": scale, "b": base64}   int32 array, value / 10**scale
+                   {"$": "f8", "b": base64}               float64 array
+                   {"$": "s", "i": [..]}                  indexes into strings
+                   {"$": "t", "k": [..], "c": [..]}       list of row dicts stored by column
+    """
+    if not isinstance(payload, dict):
+        return payload
+
+    encoder = CompactEncoder(precision)
+    omitted = [key for key in STATIC_OPTION_KEYS if key in payload]
+    body = {key: encoder.encode(value) for key, value in payload.items() if key not in omitted}
+
+    return {
+        "compact": 1,
+        "schema": schema,
+        "omitted": omitted,
+        "strings": encoder.strings,
+        "body": body
+    }
+
+
+def is_number(value):
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+class CompactEncoder:
+    def __init__(self, precision=2):
+        self.precision = precision
+        self.strings = []
+        self.string_index = {}
+
+    def encode(self, value):
+        if isinstance(value, dict):
+            return {key: self.encode(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return self.encode_list(list(value))
+        if isinstance(value, (float, Decimal)):
+            return round(float(value), self.precision)
+        return value
+
+    def encode_list(self, values):
+        if not values:
+            return []
+        if all(is_number(v) for v in values):
+            return self.encode_numbers(values)
+        if all(isinstance(v, str) for v in values):
+            return {"$": "s", "i": [self.intern(v) for v in values]}
+        if len(values) > 1 and all(isinstance(v, dict) for v in values):
+            keys = list(values[0].keys())
+            if all(list(v.keys()) == keys for v in values):
+                columns = [self.encode_list([row[key] for row in values]) for key in keys]
+                return {"$": "t", "k": keys, "c": columns}
+        return [self.encode(v) for v in values]
+
+    def encode_numbers(self, values):
+        rounded = [round(float(v), self.precision) for v in values]
+        scale = 0 if all(v == int(v) for v in rounded) else self.precision
+        factor = 10 ** scale
+        scaled = [int(round(v * factor)) for v in rounded]
+
+        if all(INT32_MIN <= v <= INT32_MAX for v in scaled):
+            packed = struct.pack(f"<{len(scaled)}i", *scaled)
+            return {"$": "i4", "s": scale, "b": base64.b64encode(packed).decode()}
+
+        packed = struct.pack(f"<{len(rounded)}d", *rounded)
+        return {"$": "f8", "b": base64.b64encode(packed).decode()}
+
+    def intern(self, value):
+        index = self.string_index.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(value)
+            self.string_index[value] = index
+        return index
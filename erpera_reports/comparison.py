@@ -0,0 +1,141 @@
+import frappe
+from frappe import _
+from frappe.utils import add_days, add_years, date_diff, flt, getdate
+
+# How the comparison window is derived from the base window
+COMPARISON_RULES = ("previous_period", "same_period_last_year", "custom")
+
+# Aggregates a measure can use; each is applied to a CASE expression
+# restricted to one window, so both windows come out of the same scan
+AGGREGATES = {
+    "SUM": "SUM({expr})",
+    "COUNT": "COUNT({expr})",
+    "AVG": "AVG({expr})",
+    "MIN": "MIN({expr})",
+    "MAX": "MAX({expr})",
+    "COUNT DISTINCT": "COUNT(DISTINCT {expr})"
+}
+
+WINDOWS = ("current", "previous")
+
+
+def resolve_windows(from_date, to_date, rule="previous_period", compare_from=None, compare_to=None):
+    """
+    Base window plus the comparison window for `rule`:
+    - previous_period: the same number of days immediately before the base window
+    - same_period_last_year: the base window shifted back one year
+    - custom: `compare_from` to `compare_to`
+    """
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    if from_date > to_date:
+        frappe.throw(_("From Date cannot be after To Date"))
+
+    rule = rule or "previous_period"
+    if rule == "previous_period":
+        previous_to = add_days(from_date, -1)
+        previous_from = add_days(previous_to, -date_diff(to_date, from_date))
+    elif rule == "same_period_last_year":
+        previous_from, previous_to = add_years(from_date, -1), add_years(to_date, -1)
+    elif rule == "custom":
+        if not (compare_from and compare_to):
+            frappe.throw(_("A custom comparison needs both a compare from and compare to date"))
+        previous_from, previous_to = getdate(compare_from), getdate(compare_to)
+    else:
+        frappe.throw(_("Unknown comparison rule {0}").format(rule))
+
+    return frappe._dict(
+        rule=rule,
+        current=(from_date, to_date),
+        previous=(getdate(previous_from), getdate(previous_to))
+    )
+
+
+def get_windows_from_filters(filters, from_date, to_date):
+    """resolve_windows() driven by the `compare_rule`, `compare_from_date` and `compare_to_date` filters."""
+    return resolve_windows(
+        from_date,
+        to_date,
+        rule=filters.get("compare_rule"),
+        compare_from=filters.get("compare_from_date"),
+        compare_to=filters.get("compare_to_date")
+    )
+
+
+def compare_periods(table, measures, windows, date_field="posting_date", group_by=None,
+                    conditions="", values=None):
+    """
+    Aggregate `measures` for both windows in a single conditional-aggregation scan.
+
+    `table` is the FROM clause (with any joins), `measures` maps a name to
+    (aggregate, SQL expression), e.g. {"total_sales": ("SUM", "grand_total")}.
+    `group_by` is an optional SQL expression identifying the entity and
+    `conditions` extra " AND ..." clauses using `values` as named parameters.
+
+    Returns one row per entity: {"entity": ..., <measure>: {value, previous, delta, change}}
+    """
+    values = dict(values or {})
+    for window in WINDOWS:
+        values[f"{window}_from"], values[f"{window}_to"] = windows[window]
+
+    columns = []
+    for name, (aggregate, expr) in measures.items():
+        for window in WINDOWS:
+            in_window = f"CASE WHEN {date_field} BETWEEN %({window}_from)s AND %({window}_to)s THEN {expr} END"
+            columns.append(f"{AGGREGATES[aggregate].format(expr=in_window)} AS `{window}_{name}`")
+
+    entity = f"{group_by} AS entity" if group_by else "NULL AS entity"
+    group_clause = f"GROUP BY {group_by}" if group_by else ""
+
+    rows = frappe.db.sql(f"""
+        SELECT
+            {entity},
+            {", ".join(columns)}
+        FROM {table}
+        WHERE (
+            {date_field} BETWEEN %(current_from)s AND %(current_to)s
+            OR {date_field} BETWEEN %(previous_from)s AND %(previous_to)s
+        )
+        {conditions}
+        {group_clause}
+    """, values, as_dict=True)
+
+    return [
+        frappe._dict(
+            {"entity": row.entity},
+            **{
+                name: get_comparison(row.get(f"current_{name}"), row.get(f"previous_{name}"))
+                for name in measures
+            }
+        )
+        for row in rows
+    ]
+
+
+def compare_totals(table, measures, windows, **kwargs):
+    """compare_periods() without grouping: a single row, zero-filled when nothing matched."""
+    rows = compare_periods(table, measures, windows, **kwargs)
+    if rows:
+        return rows[0]
+    return frappe._dict({name: get_comparison(0, 0) for name in measures})
+
+
+def get_comparison(value, previous):
+    value, previous = flt(value), flt(previous)
+    return frappe._dict(
+        value=value,
+        previous=previous,
+        delta=value - previous,
+        change=get_percent_change(value, previous)
+    )
+
+
+def get_percent_change(value, previous, precision=1):
+    """Percent change from `previous`; 0 when there is nothing to compare against."""
+    if not previous:
+        return 0
+    return round(((flt(value) - flt(previous)) / abs(flt(previous))) * 100, precision)
+
+
+def to_kpi(comparison):
+    """The {value, change} card shape used by the KPI endpoints."""
+    return {"value": comparison.value, "change": comparison.change}
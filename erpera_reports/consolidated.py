@@ -1,7 +1,14 @@
 import frappe
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.jobs import report_progress
+from erpera_reports.rollup import get_entity_data, get_month_label, get_monthly_rollup
+
+# Doctypes whose modification watermark versions the report responses
+REPORT_SOURCES = ("Purchase Invoice", "Item")
 
 
 @frappe.whitelist()
+@report_endpoint(schema="consolidated_total_amount", sources=REPORT_SOURCES, background=True)
 def consolidated_total_buying():
     """
     Chart Name: Consolidate Total Buying
@@ -10,21 +17,14 @@ def consolidated_total_buying():
     Note 2: Only Choose item which is in stock not choose expense or service item
     """
     
-    # Query to get consolidated data by company and branch
-    consolidated_query = """
+    # One scan: a WITH ROLLUP over month, company and branch gives the entity
+    # rows and the monthly totals
+    rollup_query = """
     SELECT
-        CASE 
-            WHEN pi.cost_center IS NOT NULL AND pi.cost_center != '' 
-            THEN CONCAT(COALESCE(pi.company, 'Unknown'), ' - ', pi.cost_center)
-            ELSE COALESCE(pi.company, 'Unknown Company')
-        END AS entity_name,
-        COALESCE(pi.company, 'Unknown Company') AS company,
-        COALESCE(pi.cost_center, 'No Branch') AS branch,
-        DATE_FORMAT(pi.posting_date, '%b %Y') AS month_year,
-        DATE_FORMAT(pi.posting_date, '%Y-%m') AS sort_date,
-        SUM(pii.amount) AS total_amount,
-        COUNT(DISTINCT pi.name) AS invoice_count,
-        SUM(pii.qty) AS total_qty
+        DATE_FORMAT(pi.posting_date, '%%Y-%%m') AS sort_date,
+        pi.company AS company,
+        pi.cost_center AS cost_center,
+        SUM(pii.amount) AS total_amount
     FROM `tabPurchase Invoice` pi
     INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
     LEFT JOIN `tabItem` i ON pii.item_code = i.name
@@ -38,48 +38,19 @@ def consolidated_total_buying():
         AND pii.item_group NOT IN ('EXPENSE', 'FIXED ASSET', 'Service', 'SERVICES')
         AND pi.posting_date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
     GROUP BY 
-        entity_name,
-        pi.company,
-        pi.cost_center,
-        DATE_FORMAT(pi.posting_date, '%Y-%m'),
-        DATE_FORMAT(pi.posting_date, '%b %Y')
-    ORDER BY 
+        DATE_FORMAT(pi.posting_date, '%%Y-%%m'),
         pi.company,
-        pi.cost_center,
-        sort_date
-    """
-    
-    # Query to get entity totals for sorting
-    entity_totals_query = """
-    SELECT
-        CASE 
-            WHEN pi.cost_center IS NOT NULL AND pi.cost_center != '' 
-            THEN CONCAT(COALESCE(pi.company, 'Unknown'), ' - ', pi.cost_center)
-            ELSE COALESCE(pi.company, 'Unknown Company')
-        END AS entity_name,
-        SUM(pii.amount) AS total_amount
-    FROM `tabPurchase Invoice` pi
-    INNER JOIN `tabPurchase Invoice Item` pii ON pi.name = pii.parent
-    LEFT JOIN `tabItem` i ON pii.item_code = i.name
-    WHERE 
-        pi.docstatus = 1
-        AND pi.status NOT IN ('Cancelled', 'Return')
-        AND (
-            i.is_stock_item = 1 
-            OR (i.is_stock_item IS NULL AND pii.item_group NOT IN ('EXPENSE', 'FIXED ASSET', 'Service', 'SERVICES'))
-        )
-        AND pii.item_group NOT IN ('EXPENSE', 'FIXED ASSET', 'Service', 'SERVICES')
-        AND pi.posting_date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
-    GROUP BY entity_name
-    ORDER BY total_amount DESC
+        pi.cost_center
+    WITH ROLLUP
     """
     
     try:
-        # Execute queries
-        consolidated_result = frappe.db.sql(consolidated_query, as_dict=True)
-        entity_totals_result = frappe.db.sql(entity_totals_query, as_dict=True)
+        # Entities are labelled and ordered in Python rather than grouped by a
+        # CONCAT() of company and branch
+        rollup = get_monthly_rollup(rollup_query, {})
+        report_progress(80, "Building datasets")
         
-        if not consolidated_result:
+        if not rollup.branches:
             return {
                 "chart_type": "bar",
                 "labels": [],
@@ -88,26 +59,11 @@ def consolidated_total_buying():
                 "success": True
             }
         
-        # Process consolidated data
-        entity_data = {}
-        all_months = set()
-        
-        for row in consolidated_result:
-            entity = row['entity_name']
-            month = row['month_year']
-            amount = float(row['total_amount']) if row['total_amount'] else 0
-            
-            if entity not in entity_data:
-                entity_data[entity] = {}
-            entity_data[entity][month] = amount
-            all_months.add(month)
+        # Process consolidated data, entities ordered by total amount (descending)
+        entity_data, entity_order = get_entity_data(rollup)
         
         # Sort months chronologically
-        sorted_months = sorted(list(all_months), 
-                              key=lambda x: frappe.utils.getdate(f"01 {x}"))
-        
-        # Get entity order by total amount (descending)
-        entity_order = [row['entity_name'] for row in entity_totals_result]
+        sorted_months = [get_month_label(sort_date) for sort_date in sorted(rollup.months)]
         
         # Color palette for different entities
         color_palette = [
@@ -142,11 +98,8 @@ def consolidated_total_buying():
         # Calculate grand total
         grand_total = sum([ds['entity_total'] for ds in datasets])
         
-        # Calculate monthly totals for additional insight
-        monthly_totals = []
-        for month in sorted_months:
-            monthly_total = sum([entity_data[entity].get(month, 0) for entity in entity_data.keys()])
-            monthly_totals.append(monthly_total)
+        # Monthly totals for additional insight, from the rollup rows
+        monthly_totals = [rollup.months[sort_date] for sort_date in sorted(rollup.months)]
         
         return {
             "chart_type": "bar",
@@ -210,6 +163,7 @@ def consolidated_total_buying():
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_entity_summary():
     """
     Get summary of all entities with their totals for a single-bar-per-entity chart
@@ -249,6 +203,7 @@ def get_entity_summary():
 
 # Main function alias for backward compatibility
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def total_buying():
     """
     Main function - calls consolidated_total_buying
@@ -3,6 +3,21 @@ from frappe import _
 from datetime import datetime, timedelta
 from frappe.utils import nowdate, add_months, add_days, getdate, today, formatdate
 import json
+import numpy as np
+from erpera_reports.comparison import compare_periods, resolve_windows
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.flows import (
+    PURCHASED_AMOUNT, PURCHASED_QTY, SOLD_AMOUNT, SOLD_QTY, get_item_flows, get_item_groups,
+    get_item_totals, item_mask, purchased, rank, sold, sum_flows
+)
+from erpera_reports.items import items_in_group, sku_items
+from erpera_reports.kpis import get_kpi_card_set
+from erpera_reports.replica import read_from_replica
+from erpera_reports.sketches import apply_rolling_window, get_sketch_candidates
+from erpera_reports.trees import cost_center_condition
+
+# Doctypes whose modification watermark versions the report responses
+REPORT_SOURCES = ("Sales Invoice", "Purchase Invoice", "Purchase Order", "Item", "Item Group", "Cost Center")
 
 def apply_filters_to_query(base_query, filters):
     """
@@ -34,7 +49,7 @@ def apply_filters_to_query(base_query, filters):
     
     # Branch filter (using cost_center)
     if filters.get('branch'):
-        conditions.append("si.cost_center = %(branch)s")
+        conditions.append(cost_center_condition("si.cost_center", filters['branch']))
         params['branch'] = filters['branch']
     
     # Add existing conditions
@@ -76,8 +91,7 @@ def apply_filters_to_item_query(base_query, filters):
     
     # Item group filter
     if filters.get('item_group'):
-        conditions.append("i.item_group = %(item_group)s")
-        params['item_group'] = filters['item_group']
+        conditions.append(items_in_group("sii.item_code", filters['item_group']))
     
     # Company filter
     if filters.get('company'):
@@ -86,7 +100,7 @@ def apply_filters_to_item_query(base_query, filters):
     
     # Branch filter (using cost_center)
     if filters.get('branch'):
-        conditions.append("si.cost_center = %(branch)s")
+        conditions.append(cost_center_condition("si.cost_center", filters['branch']))
         params['branch'] = filters['branch']
     
     # Custom filters
@@ -139,6 +153,7 @@ def test_dashboard_connection():
 
 # Branch-Wise Performance Report functions
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_revenue_comparison(filters=None):
     """Get branch revenue comparison"""
     base_query = """
@@ -182,6 +197,7 @@ def get_branch_revenue_comparison(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_profit_comparison(filters=None):
     """Get branch profit comparison (assuming 20% profit margin for demo)"""
     if not filters:
@@ -232,6 +248,7 @@ def get_branch_profit_comparison(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_footfall_comparison(filters=None):
     """Get branch footfall comparison (unique customers)"""
     if not filters:
@@ -281,6 +298,7 @@ def get_branch_footfall_comparison(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_avg_bill_value(filters=None):
     """Get average bill value by branch"""
     if not filters:
@@ -331,6 +349,7 @@ def get_branch_avg_bill_value(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_performance_matrix(filters=None):
     """Get branch performance matrix data (Revenue vs Footfall)"""
     if not filters:
@@ -381,6 +400,7 @@ def get_branch_performance_matrix(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_growth_trend(filters=None):
     """Get branch growth trend"""
     if not filters:
@@ -389,59 +409,45 @@ def get_branch_growth_trend(filters=None):
     period = filters.get('period', 'month')
     
     try:
+        current_date = getdate(today())
         if period == 'month':
-            current_start = today().replace(day=1)
+            current_start = current_date.replace(day=1)
             previous_start = add_months(current_start, -1)
             previous_end = add_days(current_start, -1)
         elif period == 'quarter':
             # Simplified quarter calculation
-            current_start = today().replace(month=((today().month-1)//3)*3+1, day=1)
+            current_start = current_date.replace(month=((current_date.month-1)//3)*3+1, day=1)
             previous_start = add_months(current_start, -3)
             previous_end = add_days(current_start, -1)
         else:  # year
-            current_start = today().replace(month=1, day=1)
+            current_start = current_date.replace(month=1, day=1)
             previous_start = current_start.replace(year=current_start.year-1)
             previous_end = add_days(current_start, -1)
         
-        # Get current period data
-        current_data = frappe.db.sql("""
-            SELECT 
-                COALESCE(branch, 'No Branch') as branch,
-                SUM(grand_total) as revenue
-            FROM `tabSales Invoice`
-            WHERE posting_date >= %s
-            AND docstatus = 1
-            GROUP BY branch
-        """, (current_start,), as_dict=True)
-        
-        # Get previous period data
-        previous_data = frappe.db.sql("""
-            SELECT 
-                COALESCE(branch, 'No Branch') as branch,
-                SUM(grand_total) as revenue
-            FROM `tabSales Invoice`
-            WHERE posting_date BETWEEN %s AND %s
-            AND docstatus = 1
-            GROUP BY branch
-        """, (previous_start, previous_end), as_dict=True)
-        
-        # Calculate growth
-        current_dict = {d['branch']: d['revenue'] for d in current_data}
-        previous_dict = {d['branch']: d['revenue'] for d in previous_data}
+        # Period to date against the full previous period, in one scan
+        windows = resolve_windows(current_start, current_date, rule='custom',
+                                  compare_from=previous_start, compare_to=previous_end)
+        rows = compare_periods(
+            "`tabSales Invoice`",
+            {
+                'revenue': ('SUM', 'grand_total'),
+                'invoices': ('COUNT', 'name')
+            },
+            windows,
+            group_by="COALESCE(branch, 'No Branch')",
+            conditions=" AND docstatus = 1"
+        )
         
+        # Calculate growth for branches active in the current period
         growth_data = []
-        for branch in current_dict:
-            current_rev = current_dict[branch]
-            previous_rev = previous_dict.get(branch, 0)
-            if previous_rev > 0:
-                growth = ((current_rev - previous_rev) / previous_rev) * 100
+        for row in rows:
+            if not row.invoices.value:
+                continue
+            if row.revenue.previous > 0:
+                growth = row.revenue.change
             else:
-                growth = 100 if current_rev > 0 else 0
-            growth_data.append({'branch': branch, 'growth': growth})
-        
-        # If no data, return sample data
-        if not growth_data:
-            growth_data = []
+                growth = 100 if row.revenue.value > 0 else 0
+            growth_data.append({'branch': row.entity, 'growth': growth})
         
         # Sort by growth
         growth_data.sort(key=lambda x: x['growth'], reverse=True)
@@ -461,6 +467,7 @@ def get_branch_growth_trend(filters=None):
     }
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
 def get_daily_sales_snapshot(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -512,6 +519,7 @@ def get_daily_sales_snapshot(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_sales_by_branch(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -556,6 +564,7 @@ def get_sales_by_branch(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_payment_mode_breakdown(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -607,6 +616,7 @@ def get_payment_mode_breakdown(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_hourly_sales_trend(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -669,6 +679,7 @@ def get_hourly_sales_trend(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_daily_sales_stats(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -735,6 +746,7 @@ def get_daily_sales_stats(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_monthly_purchase_trend(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -778,30 +790,36 @@ def get_monthly_purchase_trend(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_suppliers(filters=None):
-    if isinstance(filters, str):
-        filters = json.loads(filters)
-    filters = filters or {}
     """Get top suppliers data"""
-    if not filters:
-        filters = {}
+    filters = apply_rolling_window(filters)
     
     from_date = filters.get('from_date', add_months(today(), -1))
     to_date = filters.get('to_date', today())
     limit = int(filters.get('limit', 10))
+    params = {'from_date': from_date, 'to_date': to_date, 'limit': limit}
     
-    data = frappe.db.sql("""
+    # Exact re-rank of the heavy hitter candidates only, when the sketches cover the window
+    candidates = get_sketch_candidates('supplier_amount', {'from_date': from_date, 'to_date': to_date}, limit, filters)
+    candidate_condition = ""
+    if candidates:
+        candidate_condition = "AND supplier IN %(candidates)s"
+        params['candidates'] = candidates
+    
+    data = frappe.db.sql(f"""
         SELECT 
             supplier,
             SUM(grand_total) as total_amount,
             COUNT(*) as invoice_count
         FROM `tabPurchase Invoice`
-        WHERE posting_date BETWEEN %s AND %s
+        WHERE posting_date BETWEEN %(from_date)s AND %(to_date)s
         AND docstatus = 1
+        {candidate_condition}
         GROUP BY supplier
         ORDER BY total_amount DESC
-        LIMIT %s
-    """, (from_date, to_date, limit), as_dict=True)
+        LIMIT %(limit)s
+    """, params, as_dict=True)
     
     return {
         'labels': [d.supplier for d in data],
@@ -813,6 +831,7 @@ def get_top_suppliers(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_purchase_by_status(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -846,6 +865,7 @@ def get_purchase_by_status(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_outstanding_by_supplier(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -879,6 +899,7 @@ def get_outstanding_by_supplier(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_aging_analysis(filters=None):
     """Get outstanding aging analysis"""
     data = frappe.db.sql("""
@@ -915,6 +936,7 @@ def get_aging_analysis(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_company_wise_purchases(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -959,6 +981,7 @@ def get_company_wise_purchases(filters=None):
 
 # Top Selling & Low Performing SKUs functions
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_selling_skus(filters=None):
     """Get top 20 fast-moving items by quantity"""
     base_query = """
@@ -971,11 +994,15 @@ def get_top_selling_skus(filters=None):
             COUNT(DISTINCT si.name) as invoice_count
         FROM `tabSales Invoice Item` sii
         INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     """
     try:
+        filters = apply_rolling_window(filters)
         query, params = apply_filters_to_item_query(base_query, filters)
+        # Exact re-rank of the heavy hitter candidates only, when the sketches cover the filters
+        candidates = get_sketch_candidates('sku_qty', params, 20, filters)
+        if candidates:
+            query += " AND sii.item_code IN %(candidates)s"
+            params['candidates'] = candidates
         query += """
         GROUP BY sii.item_code, sii.item_name
         ORDER BY total_qty DESC
@@ -997,6 +1024,7 @@ def get_top_selling_skus(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_low_performing_skus(filters=None):
     """Get bottom 20 slow-moving items by quantity"""
     base_query = """
@@ -1009,8 +1037,6 @@ def get_low_performing_skus(filters=None):
             COUNT(DISTINCT si.name) as invoice_count
         FROM `tabSales Invoice Item` sii
         INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     """
     try:
         query, params = apply_filters_to_item_query(base_query, filters)
@@ -1036,9 +1062,10 @@ def get_low_performing_skus(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_revenue_items(filters=None):
     try:
-        base_query = """
+        base_query = f"""
             SELECT 
                 sii.item_code,
                 sii.item_name,
@@ -1048,11 +1075,15 @@ def get_top_revenue_items(filters=None):
                 COUNT(DISTINCT si.name) as invoice_count
             FROM `tabSales Invoice Item` sii
             INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-            INNER JOIN `tabItem` i ON sii.item_code = i.name
-            INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-            AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            WHERE {sku_items('sii.item_code')}
         """
+        filters = apply_rolling_window(filters)
         query, params = apply_filters_to_item_query(base_query, filters)
+        # Exact re-rank of the heavy hitter candidates only, when the sketches cover the filters
+        candidates = get_sketch_candidates('item_revenue', params, 20, filters)
+        if candidates:
+            query += " AND sii.item_code IN %(candidates)s"
+            params['candidates'] = candidates
         query += """
         GROUP BY sii.item_code, sii.item_name
         HAVING total_qty > 0
@@ -1075,6 +1106,7 @@ def get_top_revenue_items(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_item_category_performance(filters=None):
     base_query = """
         SELECT 
@@ -1085,7 +1117,6 @@ def get_item_category_performance(filters=None):
         FROM `tabSales Invoice Item` sii
         INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
         INNER JOIN `tabItem` i ON i.name = sii.item_code
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     """
     try:
         query, params = apply_filters_to_item_query(base_query, filters)
@@ -1110,6 +1141,7 @@ def get_item_category_performance(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_sku_velocity_trend(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1127,7 +1159,7 @@ def get_sku_velocity_trend(filters=None):
     if company:
         conditions += " AND si.company = %(company)s"
     if branch:
-        conditions += " AND si.cost_center = %(branch)s"
+        conditions += f" AND {cost_center_condition('si.cost_center', branch)}"
     
     try:
         # First get top 10 items
@@ -1137,11 +1169,9 @@ def get_sku_velocity_trend(filters=None):
                 SUM(sii.qty) as total_qty
             FROM `tabSales Invoice Item` sii
             INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-            INNER JOIN `tabItem` i ON sii.item_code = i.name
-            INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
             WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
             AND si.docstatus = 1
-            AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {sku_items('sii.item_code')}
             {conditions}
             GROUP BY sii.item_code
             ORDER BY total_qty DESC
@@ -1170,12 +1200,10 @@ def get_sku_velocity_trend(filters=None):
                 SUM(sii.qty) as weekly_qty
             FROM `tabSales Invoice Item` sii
             INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-            INNER JOIN `tabItem` i ON sii.item_code = i.name
-            INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
             WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
             AND si.docstatus = 1
             AND sii.item_code IN %(item_codes)s
-            AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {sku_items('sii.item_code')}
             {conditions}
             GROUP BY sii.item_code, WEEK(si.posting_date)
             ORDER BY sii.item_code, week_num
@@ -1224,6 +1252,7 @@ def get_sku_velocity_trend(filters=None):
 
 # Purchase vs Sales Consumption Report functions
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_purchase_vs_sales_overview(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1236,52 +1265,16 @@ def get_purchase_vs_sales_overview(filters=None):
     to_date = filters.get('to_date', today())
     company = filters.get('company')
     
-    conditions = ""
-    if company:
-        conditions += " AND company = %(company)s"
-    
     try:
-        # Get purchase data
-        purchase_data = frappe.db.sql(f"""
-            SELECT 
-                DATE_FORMAT(posting_date, '%%Y-%%m') as month,
-                SUM(grand_total) as total_purchase
-            FROM `tabPurchase Invoice`
-            WHERE posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND docstatus = 1
-            {conditions}
-            GROUP BY DATE_FORMAT(posting_date, '%%Y-%%m')
-            ORDER BY month
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        # Get sales data
-        sales_data = frappe.db.sql(f"""
-            SELECT 
-                DATE_FORMAT(posting_date, '%%Y-%%m') as month,
-                SUM(grand_total) as total_sales
-            FROM `tabSales Invoice`
-            WHERE posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND docstatus = 1
-            {conditions}
-            GROUP BY DATE_FORMAT(posting_date, '%%Y-%%m')
-            ORDER BY month
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        # Combine data
-        purchase_dict = {d['month']: d['total_purchase'] for d in purchase_data}
-        sales_dict = {d['month']: d['total_sales'] for d in sales_data}
+        # Purchase and sales amounts per month from the item flows
+        flows = get_item_flows(from_date, to_date, company)
+        months, totals = sum_flows(flows.month, flows.data)
         
         # Get all months from data or generate empty months for the period
-        if purchase_data or sales_data:
-            all_months = sorted(list(set(list(purchase_dict.keys()) + list(sales_dict.keys()))))
+        if len(months):
+            all_months = months.tolist()
+            purchase_amounts = totals[:, PURCHASED_AMOUNT].tolist()
+            sales_amounts = totals[:, SOLD_AMOUNT].tolist()
         else:
             # Generate month range from from_date to to_date
             import datetime
@@ -1295,9 +1288,8 @@ def get_purchase_vs_sales_overview(filters=None):
                     current = current.replace(year=current.year + 1, month=1)
                 else:
                     current = current.replace(month=current.month + 1)
-        
-        purchase_amounts = [purchase_dict.get(month, 0) for month in all_months]
-        sales_amounts = [sales_dict.get(month, 0) for month in all_months]
+            purchase_amounts = [0] * len(all_months)
+            sales_amounts = [0] * len(all_months)
         
     except Exception as e:
         frappe.log_error(f"Error in get_purchase_vs_sales_overview: {str(e)}")
@@ -1327,6 +1319,7 @@ def get_purchase_vs_sales_overview(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_item_wise_consumption(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1340,73 +1333,28 @@ def get_item_wise_consumption(filters=None):
     company = filters.get('company')
     item_group = filters.get('item_group')
     
-    conditions = ""
-    if company:
-        conditions += " AND pi.company = %(company)s"
-    
-    item_conditions = ""
-    if item_group:
-        item_conditions += " AND i.item_group = %(item_group)s"
-    
     try:
-        # Get top 20 items by purchase value first
-        purchase_data = frappe.db.sql(f"""
-            SELECT 
-                pii.item_code,
-                SUM(pii.qty) as purchased_qty,
-                SUM(pii.amount) as purchase_amount
-            FROM `tabPurchase Invoice Item` pii
-            INNER JOIN `tabPurchase Invoice` pi ON pi.name = pii.parent
-            LEFT JOIN `tabItem` i ON i.name = pii.item_code
-            WHERE pi.posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND pi.docstatus = 1
-            {conditions}
-            {item_conditions}
-            GROUP BY pii.item_code
-            ORDER BY purchase_amount DESC
-            LIMIT 20
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company,
-            'item_group': item_group
-        }, as_dict=True)
+        item_codes, totals = get_item_totals(from_date, to_date, company)
         
-        if purchase_data:
-            # Get sales data for these items
-            item_codes = [d['item_code'] for d in purchase_data]
-            sales_data = frappe.db.sql(f"""
-                SELECT 
-                    sii.item_code,
-                    SUM(sii.amount) as sales_amount
-                FROM `tabSales Invoice Item` sii
-                INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-                INNER JOIN `tabItem` i ON i.name = sii.item_code
-                INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-                WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
-                AND si.docstatus = 1
-                AND sii.item_code IN %(item_codes)s
-                AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-                {conditions.replace('pi.', 'si.')}
-                GROUP BY sii.item_code
-            """, {
-                'from_date': from_date,
-                'to_date': to_date,
-                'company': company,
-                'item_codes': item_codes
-            }, as_dict=True)
-            
-            sales_dict = {d['item_code']: d['sales_amount'] for d in sales_data}
-            
-            data = []
-            for d in purchase_data:
-                data.append({
-                    'item_code': d['item_code'],
-                    'purchased_qty': d['purchased_qty'],
-                    'sold_qty': sales_dict.get(d['item_code'], 0)
-                })
-        else:
-            data = []
+        # Top 20 purchased items by purchase value
+        candidates = purchased(totals)
+        if item_group:
+            candidates &= item_mask(item_codes, item_group=item_group)
+        top = rank(totals[:, PURCHASED_AMOUNT], candidates, 20)
+        
+        # Sales are counted for SKU items only
+        sold_qty = np.where(item_mask(item_codes[top], 'sku'), totals[top, SOLD_QTY], 0)
+        
+        data = [
+            {
+                'item_code': item_code,
+                'purchased_qty': purchased_qty,
+                'sold_qty': sold_units
+            }
+            for item_code, purchased_qty, sold_units in zip(
+                item_codes[top].tolist(), totals[top, PURCHASED_QTY].tolist(), sold_qty.tolist()
+            )
+        ]
                 
     except Exception as e:
         frappe.log_error(f"Error in get_item_wise_consumption: {str(e)}")
@@ -1429,6 +1377,7 @@ def get_item_wise_consumption(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_overconsumption_items(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1441,72 +1390,34 @@ def get_overconsumption_items(filters=None):
     to_date = filters.get('to_date', today())
     company = filters.get('company')
     
-    conditions = ""
-    if company:
-        conditions += " AND pi.company = %(company)s"
-    
     try:
-        # Find items where sales quantity exceeds purchased quantity
-        data = frappe.db.sql(f"""
-            SELECT 
-                item_code,
-                purchased_qty,
-                sold_qty,
-                (sold_qty - purchased_qty) as excess_consumption
-            FROM (
-                SELECT 
-                    COALESCE(p.item_code, s.item_code) as item_code,
-                    COALESCE(p.purchased_qty, 0) as purchased_qty,
-                    COALESCE(s.sold_qty, 0) as sold_qty
-                FROM (
-                    SELECT 
-                        pii.item_code,
-                        SUM(pii.qty) as purchased_qty
-                    FROM `tabPurchase Invoice Item` pii
-                    INNER JOIN `tabPurchase Invoice` pi ON pi.name = pii.parent
-                    WHERE pi.posting_date BETWEEN %(from_date)s AND %(to_date)s
-                    AND pi.docstatus = 1
-                    {conditions}
-                    GROUP BY pii.item_code
-                ) p
-                RIGHT JOIN (
-                    SELECT 
-                        sii.item_code,
-                        SUM(sii.qty) as sold_qty
-                    FROM `tabSales Invoice Item` sii
-                    INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-                    INNER JOIN `tabItem` i ON sii.item_code = i.name
-                    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-                    WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
-                    AND si.docstatus = 1
-                    AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-                    {conditions.replace('pi.', 'si.')}
-                    GROUP BY sii.item_code
-                ) s ON p.item_code = s.item_code
-            ) combined
-            WHERE sold_qty > purchased_qty
-            ORDER BY excess_consumption DESC
-            LIMIT 20
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
+        # Find SKU items where sales quantity exceeds purchased quantity
+        item_codes, totals = get_item_totals(from_date, to_date, company)
+        excess_consumption = totals[:, SOLD_QTY] - totals[:, PURCHASED_QTY]
+        top = rank(
+            excess_consumption,
+            sold(totals) & item_mask(item_codes, 'sku') & (excess_consumption > 0),
+            20
+        )
+        labels = item_codes[top].tolist()
+        data = excess_consumption[top].tolist()
         
     except Exception as e:
         frappe.log_error(f"Error in get_overconsumption_items: {str(e)}")
+        labels = []
         data = []
     
     return {
-        'labels': [d['item_code'] for d in data],
+        'labels': labels,
         'datasets': [{
             'label': 'Excess Consumption Risk',
-            'data': [d['excess_consumption'] for d in data],
+            'data': data,
             'backgroundColor': '#ef4444'
         }]
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_understock_risk_items(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1519,70 +1430,38 @@ def get_understock_risk_items(filters=None):
     to_date = filters.get('to_date', today())
     company = filters.get('company')
     
-    conditions = ""
-    if company:
-        conditions += " AND pi.company = %(company)s"
-    
     try:
         # Find items where purchased quantity significantly exceeds sales
-        data = frappe.db.sql(f"""
-            SELECT 
-                item_code,
-                purchased_qty,
-                sold_qty,
-                (purchased_qty - sold_qty) as excess_stock
-            FROM (
-                SELECT 
-                    COALESCE(p.item_code, s.item_code) as item_code,
-                    COALESCE(p.purchased_qty, 0) as purchased_qty,
-                    COALESCE(s.sold_qty, 0) as sold_qty
-                FROM (
-                    SELECT 
-                        pii.item_code,
-                        SUM(pii.qty) as purchased_qty
-                    FROM `tabPurchase Invoice Item` pii
-                    INNER JOIN `tabPurchase Invoice` pi ON pi.name = pii.parent
-                    WHERE pi.posting_date BETWEEN %(from_date)s AND %(to_date)s
-                    AND pi.docstatus = 1
-                    {conditions}
-                    GROUP BY pii.item_code
-                ) p
-                LEFT JOIN (
-                    SELECT 
-                        sii.item_code,
-                        SUM(sii.qty) as sold_qty
-                    FROM `tabSales Invoice Item` sii
-                    INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-                    WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
-                    AND si.docstatus = 1
-                    {conditions.replace('pi.', 'si.')}
-                    GROUP BY sii.item_code
-                ) s ON p.item_code = s.item_code
-            ) combined
-            WHERE purchased_qty > (sold_qty * 1.5)  -- 50% more purchases than sales
-            AND purchased_qty > 10  -- Minimum threshold to avoid noise
-            ORDER BY excess_stock DESC
-            LIMIT 20
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
+        item_codes, totals = get_item_totals(from_date, to_date, company)
+        purchased_qty = totals[:, PURCHASED_QTY]
+        sold_qty = totals[:, SOLD_QTY]
+        excess_stock = purchased_qty - sold_qty
+        top = rank(
+            excess_stock,
+            purchased(totals)
+            & (purchased_qty > sold_qty * 1.5)  # 50% more purchases than sales
+            & (purchased_qty > 10),  # Minimum threshold to avoid noise
+            20
+        )
+        labels = item_codes[top].tolist()
+        data = excess_stock[top].tolist()
         
     except Exception as e:
         frappe.log_error(f"Error in get_understock_risk_items: {str(e)}")
+        labels = []
         data = []
     
     return {
-        'labels': [d['item_code'] for d in data],
+        'labels': labels,
         'datasets': [{
             'label': 'Excess Stock Risk',
-            'data': [d['excess_stock'] for d in data],
+            'data': data,
             'backgroundColor': '#f59e0b'
         }]
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_consumption_ratio(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1595,77 +1474,34 @@ def get_consumption_ratio(filters=None):
     to_date = filters.get('to_date', today())
     company = filters.get('company')
     
-    conditions = ""
-    if company:
-        conditions += " AND pi.company = %(company)s"
-    
     try:
-        # Get purchase data by item group
-        purchase_data = frappe.db.sql(f"""
-            SELECT 
-                COALESCE(i.item_group, 'Others') as item_group,
-                SUM(pii.amount) as purchased_amount
-            FROM `tabPurchase Invoice Item` pii
-            INNER JOIN `tabPurchase Invoice` pi ON pi.name = pii.parent
-            LEFT JOIN `tabItem` i ON i.name = pii.item_code
-            WHERE pi.posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND pi.docstatus = 1
-            {conditions}
-            GROUP BY i.item_group
-            ORDER BY purchased_amount DESC
-            LIMIT 10
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        if purchase_data:
-            item_groups = [d['item_group'] for d in purchase_data]
-            sales_data = frappe.db.sql(f"""
-                SELECT 
-                    COALESCE(i.item_group, 'Others') as item_group,
-                    SUM(sii.amount) as sales_amount
-                FROM `tabSales Invoice Item` sii
-                INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-                INNER JOIN `tabItem` i ON i.name = sii.item_code
-                INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-                WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
-                AND si.docstatus = 1
-                AND i.item_group IN %(item_groups)s
-                AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-                {conditions.replace('pi.', 'si.')}
-                GROUP BY i.item_group
-            """, {
-                'from_date': from_date,
-                'to_date': to_date,
-                'company': company,
-                'item_groups': item_groups
-            }, as_dict=True)
-            
-            sales_dict = {d['item_group']: d['sales_amount'] for d in sales_data}
-            
-            data = []
-            ratio_data = []
-            for d in purchase_data:
-                sales_amount = sales_dict.get(d['item_group'], 0)
-                ratio = (d['purchased_amount'] / sales_amount * 100) if sales_amount > 0 else 0
-                data.append({
-                    'item_group': d['item_group'],
-                    'ratio': ratio / 100
-                })
-                ratio_data.append(ratio)
-        else:
-            data = []
-            ratio_data = []
+        item_codes, totals = get_item_totals(from_date, to_date, company)
+        is_purchased = purchased(totals)
+        
+        # Per item group: purchased items, their purchase amount, and the sales of its SKU items
+        item_groups, group_totals = sum_flows(get_item_groups(item_codes), np.column_stack((
+            is_purchased,
+            np.where(is_purchased, totals[:, PURCHASED_AMOUNT], 0),
+            np.where(item_mask(item_codes, 'sku'), totals[:, SOLD_AMOUNT], 0)
+        )))
+        
+        # Top 10 item groups by purchase value
+        top = rank(group_totals[:, 1], group_totals[:, 0] > 0, 10)
+        purchased_amount = group_totals[top, 1]
+        sales_amount = group_totals[top, 2]
+        ratio_data = np.divide(
+            purchased_amount * 100, sales_amount,
+            out=np.zeros_like(purchased_amount), where=sales_amount > 0
+        ).tolist()
+        labels = item_groups[top].tolist()
         
     except Exception as e:
         frappe.log_error(f"Error in get_consumption_ratio: {str(e)}")
-        data = []
+        labels = []
         ratio_data = []
     
     return {
-        'labels': [d['item_group'] for d in data],
+        'labels': labels,
         'datasets': [{
             'label': 'Purchase/Sales Ratio (%)',
             'data': ratio_data,
@@ -1674,6 +1510,7 @@ def get_consumption_ratio(filters=None):
     }
 
 @frappe.whitelist(allow_guest=True)
+@read_from_replica
 def get_inventory_turnover_analysis(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1715,10 +1552,9 @@ def get_inventory_turnover_analysis(filters=None):
                     FROM `tabSales Invoice Item` sii
                     INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
                     INNER JOIN `tabItem` i ON i.name = sii.item_code
-                    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
                     WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
                     AND si.docstatus = 1
-                    AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+                    AND {sku_items('sii.item_code')}
                     {conditions}
                     GROUP BY i.item_group
                 ) s
@@ -1758,6 +1594,7 @@ def get_inventory_turnover_analysis(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_stock_efficiency_score(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1779,81 +1616,27 @@ def get_stock_efficiency_score(filters=None):
     
     to_date = today()
     
-    conditions = ""
-    if company:
-        conditions += " AND pi.company = %(company)s"
-    
     try:
-        # Get purchase data first
-        purchase_data = frappe.db.sql(f"""
-            SELECT 
-                pii.item_code,
-                SUM(pii.amount) as purchase_amount
-            FROM `tabPurchase Invoice Item` pii
-            INNER JOIN `tabPurchase Invoice` pi ON pi.name = pii.parent
-            WHERE pi.posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND pi.docstatus = 1
-            {conditions}
-            GROUP BY pii.item_code
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        if purchase_data:
-            item_codes = [d['item_code'] for d in purchase_data]
-            
-            # Get sales data for purchased items
-            sales_data = frappe.db.sql(f"""
-                SELECT 
-                    sii.item_code,
-                    SUM(sii.amount) as sales_amount
-                FROM `tabSales Invoice Item` sii
-                INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-                WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
-                AND si.docstatus = 1
-                AND sii.item_code IN %(item_codes)s
-                {conditions.replace('pi.', 'si.')}
-                GROUP BY sii.item_code
-            """, {
-                'from_date': from_date,
-                'to_date': to_date,
-                'company': company,
-                'item_codes': item_codes
-            }, as_dict=True)
-            
-            sales_dict = {d['item_code']: d['sales_amount'] for d in sales_data}
-            
-            # Calculate efficiency ratios
-            optimal_count = 0
-            overstock_count = 0
-            understock_count = 0
-            
-            for d in purchase_data:
-                sales_amount = sales_dict.get(d['item_code'], 0)
-                if sales_amount > 0:
-                    ratio = d['purchase_amount'] / sales_amount
-                    if 0.8 <= ratio <= 1.2:
-                        optimal_count += 1
-                    elif ratio > 1.2:
-                        overstock_count += 1
-                    else:
-                        understock_count += 1
-                else:
-                    # Items with no sales are considered overstock
-                    overstock_count += 1
-            
-            total_items = optimal_count + overstock_count + understock_count
-            
-            if total_items > 0:
-                efficiency_data = [
-                    {'metric': 'Optimal Stock', 'percentage': (optimal_count / total_items) * 100},
-                    {'metric': 'Overstock', 'percentage': (overstock_count / total_items) * 100},
-                    {'metric': 'Understock', 'percentage': (understock_count / total_items) * 100}
-                ]
-            else:
-                efficiency_data = []
+        # Purchase to sales value ratio of every purchased item
+        item_codes, totals = get_item_totals(from_date, to_date, company)
+        is_purchased = purchased(totals)
+        purchase_amount = totals[is_purchased, PURCHASED_AMOUNT]
+        sales_amount = totals[is_purchased, SOLD_AMOUNT]
+        has_sales = sales_amount > 0
+        ratio = np.divide(purchase_amount, sales_amount, out=np.zeros_like(purchase_amount), where=has_sales)
+        
+        # Items with no sales are considered overstock
+        optimal_count = int(np.count_nonzero(has_sales & (ratio >= 0.8) & (ratio <= 1.2)))
+        understock_count = int(np.count_nonzero(has_sales & (ratio < 0.8)))
+        total_items = len(ratio)
+        overstock_count = total_items - optimal_count - understock_count
+        
+        if total_items > 0:
+            efficiency_data = [
+                {'metric': 'Optimal Stock', 'percentage': (optimal_count / total_items) * 100},
+                {'metric': 'Overstock', 'percentage': (overstock_count / total_items) * 100},
+                {'metric': 'Understock', 'percentage': (understock_count / total_items) * 100}
+            ]
         else:
             efficiency_data = []
             
@@ -1872,6 +1655,7 @@ def get_stock_efficiency_score(filters=None):
 
 # KPI Functions for Number Cards
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="light")
 def get_branch_performance_kpis(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1880,83 +1664,9 @@ def get_branch_performance_kpis(filters=None):
     if not filters:
         filters = {}
     
-    from_date = filters.get('from_date', add_months(today(), -1))
-    to_date = filters.get('to_date', today())
-    company = filters.get('company')
-    
-    conditions = ""
-    if company:
-        conditions += " AND company = %(company)s"
-    
     try:
-        # Current period data
-        current_data = frappe.db.sql(f"""
-            SELECT 
-                COUNT(name) as total_invoices,
-                SUM(grand_total) as total_revenue,
-                AVG(grand_total) as avg_invoice_value,
-                COUNT(DISTINCT customer) as unique_customers,
-                COUNT(DISTINCT branch) as active_branches
-            FROM `tabSales Invoice`
-            WHERE posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND docstatus = 1
-            {conditions}
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        # Previous period for comparison
-        prev_from = add_months(getdate(from_date), -1)
-        prev_to = add_days(getdate(from_date), -1)
-        
-        prev_data = frappe.db.sql(f"""
-            SELECT 
-                COUNT(name) as total_invoices,
-                SUM(grand_total) as total_revenue,
-                AVG(grand_total) as avg_invoice_value,
-                COUNT(DISTINCT customer) as unique_customers
-            FROM `tabSales Invoice`
-            WHERE posting_date BETWEEN %(prev_from)s AND %(prev_to)s
-            AND docstatus = 1
-            {conditions}
-        """, {
-            'prev_from': prev_from,
-            'prev_to': prev_to,
-            'company': company
-        }, as_dict=True)
-        
-        current = current_data[0] if current_data else {}
-        previous = prev_data[0] if prev_data else {}
-        
-        def calculate_change(current_val, prev_val):
-            if prev_val and prev_val > 0:
-                return round(((current_val - prev_val) / prev_val) * 100, 1)
-            return 0
-        
-        return {
-            'total_revenue': {
-                'value': current.get('total_revenue', 0),
-                'change': calculate_change(current.get('total_revenue', 0), previous.get('total_revenue', 0))
-            },
-            'total_invoices': {
-                'value': current.get('total_invoices', 0),
-                'change': calculate_change(current.get('total_invoices', 0), previous.get('total_invoices', 0))
-            },
-            'avg_invoice_value': {
-                'value': current.get('avg_invoice_value', 0),
-                'change': calculate_change(current.get('avg_invoice_value', 0), previous.get('avg_invoice_value', 0))
-            },
-            'unique_customers': {
-                'value': current.get('unique_customers', 0),
-                'change': calculate_change(current.get('unique_customers', 0), previous.get('unique_customers', 0))
-            },
-            'active_branches': {
-                'value': current.get('active_branches', 0),
-                'change': 0
-            }
-        }
+        # Measures are planned with the other card sets, see erpera_reports.kpis
+        return get_kpi_card_set('branch_performance', filters)
         
     except Exception as e:
         frappe.log_error(f"Error in get_branch_performance_kpis: {str(e)}")
@@ -1969,6 +1679,7 @@ def get_branch_performance_kpis(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="light")
 def get_sku_performance_kpis(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -1977,84 +1688,9 @@ def get_sku_performance_kpis(filters=None):
     if not filters:
         filters = {}
     
-    from_date = filters.get('from_date', add_months(today(), -1))
-    to_date = filters.get('to_date', today())
-    company = filters.get('company')
-    
-    conditions = ""
-    if company:
-        conditions += " AND si.company = %(company)s"
-    
     try:
-        # Current period data
-        current_data = frappe.db.sql(f"""
-            SELECT 
-                COUNT(DISTINCT sii.item_code) as total_skus,
-                SUM(sii.qty) as total_qty_sold,
-                SUM(sii.amount) as total_sales_amount,
-                COUNT(DISTINCT si.name) as total_transactions
-            FROM `tabSales Invoice Item` sii
-            INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-            INNER JOIN `tabItem` i ON sii.item_code = i.name
-            INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-            WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND si.docstatus = 1
-            AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-            {conditions}
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        # Get top performing SKU
-        top_sku = frappe.db.sql(f"""
-            SELECT 
-                sii.item_code,
-                SUM(sii.qty) as total_qty
-            FROM `tabSales Invoice Item` sii
-            INNER JOIN `tabSales Invoice` si ON si.name = sii.parent
-            INNER JOIN `tabItem` i ON sii.item_code = i.name
-            INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-            WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND si.docstatus = 1
-            AND ig.name NOT IN ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-            {conditions}
-            GROUP BY sii.item_code
-            ORDER BY total_qty DESC
-            LIMIT 1
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        current = current_data[0] if current_data else {}
-        top_item = top_sku[0] if top_sku else {}
-        
-        return {
-            'total_skus': {
-                'value': current.get('total_skus', 0),
-                'change': 0
-            },
-            'total_qty_sold': {
-                'value': current.get('total_qty_sold', 0),
-                'change': 0
-            },
-            'total_sales_amount': {
-                'value': current.get('total_sales_amount', 0),
-                'change': 0
-            },
-            'top_sku_qty': {
-                'value': top_item.get('total_qty', 0),
-                'change': 0,
-                'item_code': top_item.get('item_code', 'N/A')
-            },
-            'avg_qty_per_sku': {
-                'value': round(current.get('total_qty_sold', 0) / max(current.get('total_skus', 1), 1), 2),
-                'change': 0
-            }
-        }
+        # Measures are planned with the other card sets, see erpera_reports.kpis
+        return get_kpi_card_set('sku_performance', filters)
         
     except Exception as e:
         frappe.log_error(f"Error in get_sku_performance_kpis: {str(e)}")
@@ -2067,6 +1703,7 @@ def get_sku_performance_kpis(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="light")
 def get_purchase_sales_kpis(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -2075,76 +1712,9 @@ def get_purchase_sales_kpis(filters=None):
     if not filters:
         filters = {}
     
-    from_date = filters.get('from_date', add_months(today(), -3))
-    to_date = filters.get('to_date', today())
-    company = filters.get('company')
-    
-    conditions = ""
-    if company:
-        conditions += " AND company = %(company)s"
-    
     try:
-        # Purchase data
-        purchase_data = frappe.db.sql(f"""
-            SELECT 
-                SUM(grand_total) as total_purchases,
-                COUNT(name) as purchase_count
-            FROM `tabPurchase Invoice`
-            WHERE posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND docstatus = 1
-            {conditions}
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        # Sales data
-        sales_data = frappe.db.sql(f"""
-            SELECT 
-                SUM(grand_total) as total_sales,
-                COUNT(name) as sales_count
-            FROM `tabSales Invoice`
-            WHERE posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND docstatus = 1
-            {conditions}
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        purchase = purchase_data[0] if purchase_data else {}
-        sales = sales_data[0] if sales_data else {}
-        
-        total_purchases = purchase.get('total_purchases', 0)
-        total_sales = sales.get('total_sales', 0)
-        
-        # Calculate efficiency ratio
-        efficiency_ratio = (total_sales / total_purchases * 100) if total_purchases > 0 else 0
-        
-        return {
-            'total_purchases': {
-                'value': total_purchases,
-                'change': 0
-            },
-            'total_sales': {
-                'value': total_sales,
-                'change': 0
-            },
-            'purchase_count': {
-                'value': purchase.get('purchase_count', 0),
-                'change': 0
-            },
-            'sales_count': {
-                'value': sales.get('sales_count', 0),
-                'change': 0
-            },
-            'efficiency_ratio': {
-                'value': round(efficiency_ratio, 1),
-                'change': 0
-            }
-        }
+        # Measures are planned with the other card sets, see erpera_reports.kpis
+        return get_kpi_card_set('purchase_sales', filters)
         
     except Exception as e:
         frappe.log_error(f"Error in get_purchase_sales_kpis: {str(e)}")
@@ -2157,6 +1727,7 @@ def get_purchase_sales_kpis(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="light")
 def get_daily_sales_kpis(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -2165,78 +1736,9 @@ def get_daily_sales_kpis(filters=None):
     if not filters:
         filters = {}
     
-    date = filters.get('date', today())
-    company = filters.get('company')
-    
-    conditions = ""
-    if company:
-        conditions += " AND company = %(company)s"
-    
     try:
-        # Today's data
-        today_data = frappe.db.sql(f"""
-            SELECT 
-                COUNT(name) as total_invoices,
-                SUM(grand_total) as total_sales,
-                AVG(grand_total) as avg_invoice_value,
-                COUNT(DISTINCT customer) as unique_customers,
-                COUNT(DISTINCT branch) as active_branches
-            FROM `tabSales Invoice`
-            WHERE posting_date = %(date)s
-            AND docstatus = 1
-            {conditions}
-        """, {
-            'date': date,
-            'company': company
-        }, as_dict=True)
-        
-        # Yesterday's data for comparison
-        yesterday = add_days(getdate(date), -1)
-        yesterday_data = frappe.db.sql(f"""
-            SELECT 
-                COUNT(name) as total_invoices,
-                SUM(grand_total) as total_sales,
-                AVG(grand_total) as avg_invoice_value,
-                COUNT(DISTINCT customer) as unique_customers
-            FROM `tabSales Invoice`
-            WHERE posting_date = %(yesterday)s
-            AND docstatus = 1
-            {conditions}
-        """, {
-            'yesterday': yesterday,
-            'company': company
-        }, as_dict=True)
-        
-        today_stats = today_data[0] if today_data else {}
-        yesterday_stats = yesterday_data[0] if yesterday_data else {}
-        
-        def calculate_change(current_val, prev_val):
-            if prev_val and prev_val > 0:
-                return round(((current_val - prev_val) / prev_val) * 100, 1)
-            return 0
-        
-        return {
-            'total_sales': {
-                'value': today_stats.get('total_sales', 0),
-                'change': calculate_change(today_stats.get('total_sales', 0), yesterday_stats.get('total_sales', 0))
-            },
-            'total_invoices': {
-                'value': today_stats.get('total_invoices', 0),
-                'change': calculate_change(today_stats.get('total_invoices', 0), yesterday_stats.get('total_invoices', 0))
-            },
-            'avg_invoice_value': {
-                'value': today_stats.get('avg_invoice_value', 0),
-                'change': calculate_change(today_stats.get('avg_invoice_value', 0), yesterday_stats.get('avg_invoice_value', 0))
-            },
-            'unique_customers': {
-                'value': today_stats.get('unique_customers', 0),
-                'change': calculate_change(today_stats.get('unique_customers', 0), yesterday_stats.get('unique_customers', 0))
-            },
-            'active_branches': {
-                'value': today_stats.get('active_branches', 0),
-                'change': 0
-            }
-        }
+        # Measures are planned with the other card sets, see erpera_reports.kpis
+        return get_kpi_card_set('daily_sales', filters)
         
     except Exception as e:
         frappe.log_error(f"Error in get_daily_sales_kpis: {str(e)}")
@@ -2249,6 +1751,7 @@ def get_daily_sales_kpis(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="light")
 def get_purchase_kpis(filters=None):
     if isinstance(filters, str):
         filters = json.loads(filters)
@@ -2257,77 +1760,9 @@ def get_purchase_kpis(filters=None):
     if not filters:
         filters = {}
     
-    from_date = filters.get('from_date', add_months(today(), -1))
-    to_date = filters.get('to_date', today())
-    company = filters.get('company')
-    
-    conditions = ""
-    if company:
-        conditions += " AND company = %(company)s"
-    
     try:
-        # Purchase Invoice data
-        purchase_data = frappe.db.sql(f"""
-            SELECT 
-                COUNT(name) as total_invoices,
-                SUM(grand_total) as total_amount,
-                AVG(grand_total) as avg_invoice_value,
-                COUNT(DISTINCT supplier) as unique_suppliers,
-                SUM(outstanding_amount) as total_outstanding
-            FROM `tabPurchase Invoice`
-            WHERE posting_date BETWEEN %(from_date)s AND %(to_date)s
-            AND docstatus = 1
-            {conditions}
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        # Purchase Order data
-        po_data = frappe.db.sql(f"""
-            SELECT 
-                COUNT(name) as total_orders,
-                SUM(grand_total) as total_po_amount
-            FROM `tabPurchase Order`
-            WHERE transaction_date BETWEEN %(from_date)s AND %(to_date)s
-            AND docstatus = 1
-            {conditions.replace('posting_date', 'transaction_date')}
-        """, {
-            'from_date': from_date,
-            'to_date': to_date,
-            'company': company
-        }, as_dict=True)
-        
-        purchase = purchase_data[0] if purchase_data else {}
-        po = po_data[0] if po_data else {}
-        
-        return {
-            'total_amount': {
-                'value': purchase.get('total_amount', 0),
-                'change': 0
-            },
-            'total_invoices': {
-                'value': purchase.get('total_invoices', 0),
-                'change': 0
-            },
-            'avg_invoice_value': {
-                'value': purchase.get('avg_invoice_value', 0),
-                'change': 0
-            },
-            'unique_suppliers': {
-                'value': purchase.get('unique_suppliers', 0),
-                'change': 0
-            },
-            'total_outstanding': {
-                'value': purchase.get('total_outstanding', 0),
-                'change': 0
-            },
-            'total_orders': {
-                'value': po.get('total_orders', 0),
-                'change': 0
-            }
-        }
+        # Measures are planned with the other card sets, see erpera_reports.kpis
+        return get_kpi_card_set('purchase', filters)
         
     except Exception as e:
         frappe.log_error(f"Error in get_purchase_kpis: {str(e)}")
@@ -2341,6 +1776,7 @@ def get_purchase_kpis(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_revenue_comparison_detailed(filters=None):
     """Get branch revenue, profit, margin, and region for franchise performance chart"""
     base_query = """
@@ -2386,6 +1822,7 @@ def get_branch_revenue_comparison_detailed(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_franchise_monthly_trend(filters=None):
     """
     Returns monthly revenue, profit, and margin for all branches combined.
@@ -2427,6 +1864,7 @@ def get_franchise_monthly_trend(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_sales_velocity_trends(filters=None):
     """
     Returns monthly sales velocity and growth rate for the chart.
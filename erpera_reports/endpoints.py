@@ -0,0 +1,175 @@
+import functools
+import hashlib
+import json
+from contextlib import ExitStack
+
+import frappe
+from frappe.utils import cint, today
+from werkzeug.wrappers import Response
+
+from erpera_reports.admission import admit, can_queue, get_cost_tier, get_throttled_response, release
+from erpera_reports.cancellation import register_request, unregister_request
+from erpera_reports.compact import compact_response
+from erpera_reports.jobs import enqueue_report_job, has_report_worker
+from erpera_reports.replica import get_data_source_headers, report_connection
+
+# Registry of chart/report endpoints keyed by dotted method path
+REPORT_ENDPOINTS = {}
+
+
+def report_endpoint(schema=None, precision=2, sources=None, background=False, cost=None):
+    """
+    Register a whitelisted report endpoint.
+
+    Place below @frappe.whitelist(). When the endpoint is the method being
+    called over HTTP:
+    - `compact=1` returns the compact columnar format (see erpera_reports.compact)
+    - if `sources` (doctypes the report reads) are given, the response carries
+      an ETag and a matching If-None-Match is answered with 304 Not Modified
+    - `background=1` on an endpoint registered with `background=True` queues
+      the report (see erpera_reports.jobs) and returns the job id instead;
+      without a worker on the reports queue the report runs inline
+    - a request carrying a client request id can be cancelled while its
+      queries run (see erpera_reports.cancellation)
+    - the request is admitted by its `cost` tier (default "heavy" with
+      `background`, else "standard") before the report runs: a request over
+      the limits is queued as a background job or turned away with 429 and
+      Retry-After (see erpera_reports.admission); 304 and background
+      responses skip this. Without `sources` no report connection is open
+      while a request waits; with them, the connection the ETag was
+      checked on is held and reused for the report
+    - the report reads from the read replica when one is configured and
+      healthy; `data_source` in the response (and the X-Report-Data-*
+      headers) tells the source and its staleness (see erpera_reports.replica)
+    Direct Python calls are never transformed.
+    """
+    def decorator(fn):
+        path = f"{fn.__module__}.{fn.__name__}"
+        REPORT_ENDPOINTS[path] = frappe._dict(
+            path=path,
+            schema=schema,
+            precision=precision,
+            sources=tuple(sources or ()),
+            background=background,
+            cost=cost or ("heavy" if background else "standard")
+        )
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not is_request_target(path):
+                return fn(*args, **kwargs)
+
+            with ExitStack() as stack:
+                if sources:
+                    # Versioned against the data the report will read: the
+                    # connection stays open and the report runs on it
+                    stack.enter_context(report_connection())
+                    etag = get_version_tag(path, sources)
+                    frappe.local.report_etag = etag
+                    if etag in get_if_none_match():
+                        return Response(status=304, headers=get_cache_headers(etag))
+
+                if background and cint(frappe.form_dict.get("background")) and has_report_worker():
+                    return enqueue_report_job(REPORT_ENDPOINTS[path], kwargs)
+
+                lease = admit(get_cost_tier(REPORT_ENDPOINTS[path]))
+                if not lease.admitted:
+                    if can_queue(lease, background) and has_report_worker():
+                        return enqueue_report_job(REPORT_ENDPOINTS[path], kwargs)
+                    return get_throttled_response(lease)
+
+                try:
+                    with report_connection() as data_source:
+                        request_id = register_request()
+                        try:
+                            result = fn(*args, **kwargs)
+                        finally:
+                            if request_id:
+                                unregister_request(request_id)
+                finally:
+                    release(lease)
+
+            frappe.response["data_source"] = data_source
+
+            if cint(frappe.form_dict.get("compact")):
+                return compact_response(result, schema=schema, precision=precision)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def is_request_target(path):
+    """True when `path` is the method requested by the current HTTP call."""
+    if not getattr(frappe.local, "request", None):
+        return False
+    return frappe.form_dict.get("cmd") == path
+
+
+def get_canonical_args():
+    """Request arguments with `filters` parsed, empty values dropped and keys sorted."""
+    args = {}
+    for key, value in frappe.form_dict.items():
+        if key == "cmd" or value in (None, "", [], {}):
+            continue
+        if key == "filters":
+            value = get_canonical_filters(value)
+        args[key] = value
+    return json.dumps(args, sort_keys=True, default=str)
+
+
+def get_canonical_filters(filters):
+    if isinstance(filters, str):
+        try:
+            filters = json.loads(filters)
+        except ValueError:
+            return filters
+    if not isinstance(filters, dict):
+        return filters
+    return {key: value for key, value in sorted(filters.items()) if value not in (None, "", [])}
+
+
+def get_data_watermark(sources):
+    """Latest `modified` timestamp across the given source doctypes."""
+    watermarks = []
+    for doctype in sources:
+        value = frappe.db.sql(f"SELECT MAX(modified) FROM `tab{doctype}`")[0][0]
+        watermarks.append(f"{doctype}:{value}")
+    return "|".join(watermarks)
+
+
+def get_version_tag(path, sources):
+    """
+    Cheap version tag for a report response. Changes when the endpoint,
+    the canonical request args, the user, the day (reports default their
+    date range relative to today) or the source data watermark change.
+    """
+    key = "\n".join([
+        path,
+        get_canonical_args(),
+        frappe.session.user,
+        today(),
+        get_data_watermark(sources)
+    ])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def get_if_none_match():
+    header = frappe.request.headers.get("If-None-Match") or ""
+    return {tag.strip().removeprefix("W/").strip('"') for tag in header.split(",") if tag.strip()}
+
+
+def get_cache_headers(etag):
+    return {
+        "ETag": f'"{etag}"',
+        "Cache-Control": "private, no-cache"
+    }
+
+
+def set_report_headers(response, request):
+    """after_request hook: attach the version tag and data source to report responses."""
+    etag = getattr(frappe.local, "report_etag", None)
+    if etag and response.status_code == 200:
+        response.headers.update(get_cache_headers(etag))
+    response.headers.update(get_data_source_headers())
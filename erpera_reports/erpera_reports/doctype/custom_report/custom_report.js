@@ -1,8 +1,60 @@
 // Copyright (c) 2025, erpera and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("Custom Report", {
-// 	refresh(frm) {
+frappe.ui.form.on("Custom Report", {
+	refresh(frm) {
+		if (frm.is_new()) {
+			return;
+		}
 
-// 	},
-// });
+		frm.add_custom_button(__("Refresh Snapshot"), () => {
+			frm.call({
+				doc: frm.doc,
+				method: "refresh_snapshot",
+				freeze: true,
+				freeze_message: __("Running report..."),
+			}).then(() => frm.reload_doc());
+		});
+
+		frm.add_custom_button(__("Compare Latest Snapshots"), () => {
+			frappe
+				.call({
+					method: "erpera_reports.erpera_reports.doctype.custom_report.custom_report.diff_snapshots",
+					args: { report: frm.doc.name },
+				})
+				.then((r) => {
+					const result = r.message || {};
+					if (!result.success) {
+						frappe.msgprint(result.error || __("Nothing to compare"));
+						return;
+					}
+					if (!result.changes.length) {
+						frappe.msgprint(__("No changes between the latest two snapshots."));
+						return;
+					}
+					const rows = result.changes
+						.map(
+							(c) => `<tr>
+								<td>${frappe.utils.escape_html(c.series || "")}</td>
+								<td>${frappe.utils.escape_html(c.label || "")}</td>
+								<td class="text-right">${c.old_value ?? "-"}</td>
+								<td class="text-right">${c.new_value ?? "-"}</td>
+								<td class="text-right">${format_number(c.change)}</td>
+							</tr>`
+						)
+						.join("");
+					frappe.msgprint({
+						title: __("{0} vs {1}", [result.new_snapshot.generated_on, result.old_snapshot.generated_on]),
+						message: `<table class="table table-bordered">
+							<thead><tr>
+								<th>${__("Series")}</th><th>${__("Label")}</th>
+								<th>${__("Previous")}</th><th>${__("Latest")}</th><th>${__("Change")}</th>
+							</tr></thead>
+							<tbody>${rows}</tbody>
+						</table>`,
+						wide: true,
+					});
+				});
+		});
+	},
+});
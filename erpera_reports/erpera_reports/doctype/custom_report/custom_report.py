@@ -1,9 +1,229 @@
 # Copyright (c) 2025, erpera and contributors
 # For license information, please see license.txt
 
-# import frappe
+import json
+import re
+
+import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.utils import add_to_date, cint, flt, get_datetime, now_datetime
+
+from erpera_reports.admission import admitted, get_cost_tier
+from erpera_reports.compact import compact_response
+from erpera_reports.endpoints import REPORT_ENDPOINTS
+from erpera_reports.jobs import REPORT_QUEUE, has_report_worker
+from erpera_reports.replica import report_connection
+
+# Minimum age of the latest snapshot before the scheduler refreshes it again
+REFRESH_INTERVALS = {
+	"Hourly": {"hours": 1},
+	"Daily": {"days": 1},
+	"Weekly": {"weeks": 1},
+}
 
 
 class CustomReport(Document):
-	pass
+	def validate(self):
+		self.validate_endpoint()
+		self.validate_filters()
+
+	def validate_endpoint(self):
+		# Importing the module registers its endpoints
+		try:
+			frappe.get_attr(self.endpoint)
+		except Exception:
+			frappe.throw(_("Endpoint {0} does not exist").format(self.endpoint))
+		if self.endpoint not in REPORT_ENDPOINTS:
+			frappe.throw(_("{0} is not a report endpoint").format(self.endpoint))
+
+	def validate_filters(self):
+		if not self.filters:
+			return
+		try:
+			filters = json.loads(self.filters)
+		except ValueError:
+			frappe.throw(_("Filters must be valid JSON"))
+		if not isinstance(filters, dict):
+			frappe.throw(_("Filters must be a JSON object"))
+
+	def on_trash(self):
+		# The report and its snapshots link to each other: unlink the latest first
+		self.db_set("latest_snapshot", None)
+		for name in frappe.get_all("Custom Report Snapshot", filters={"custom_report": self.name}, pluck="name"):
+			frappe.delete_doc("Custom Report Snapshot", name, ignore_permissions=True)
+
+	def is_refresh_due(self):
+		interval = REFRESH_INTERVALS.get(self.refresh_schedule)
+		if not interval:
+			return False
+		if not self.last_refreshed:
+			return True
+		# Small margin so an hourly scheduler tick does not skip a run by seconds
+		return add_to_date(get_datetime(self.last_refreshed), **interval, minutes=-5) <= now_datetime()
+
+	def get_endpoint_tier(self):
+		frappe.get_attr(self.endpoint)  # importing the module registers its endpoint
+		return get_cost_tier(REPORT_ENDPOINTS[self.endpoint])
+
+	@frappe.whitelist()
+	def refresh_snapshot(self):
+		"""Refresh on request: needs write permission and is admitted like the endpoint itself."""
+		self.check_permission("write")
+		with admitted(self.get_endpoint_tier()):
+			return self.make_snapshot()
+
+	def make_snapshot(self):
+		"""Run the endpoint with the saved filter preset and store the payload as a new snapshot."""
+		# Read from the replica, but store the snapshot on the primary
+		with report_connection():
+			data = frappe.call(self.endpoint, filters=self.filters or "{}")
+
+		snapshot = frappe.get_doc({
+			"doctype": "Custom Report Snapshot",
+			"custom_report": self.name,
+			"endpoint": self.endpoint,
+			"filters": self.filters,
+			"generated_on": now_datetime(),
+			"data": frappe.as_json(data, indent=None),
+		}).insert(ignore_permissions=True)
+
+		self.db_set({"last_refreshed": snapshot.generated_on, "latest_snapshot": snapshot.name})
+		self.prune_snapshots()
+		return snapshot.name
+
+	def prune_snapshots(self):
+		keep = max(cint(self.keep_snapshots), 2)
+		stale = frappe.get_all(
+			"Custom Report Snapshot",
+			filters={"custom_report": self.name},
+			order_by="generated_on desc",
+			pluck="name",
+			start=keep,
+			page_length=1000,
+		)
+		for name in stale:
+			frappe.delete_doc("Custom Report Snapshot", name, ignore_permissions=True)
+
+	def get_latest_snapshots(self, limit=1):
+		return frappe.get_all(
+			"Custom Report Snapshot",
+			filters={"custom_report": self.name},
+			fields=["name", "generated_on", "data"],
+			order_by="generated_on desc",
+			limit=limit,
+		)
+
+
+def refresh_due_snapshots():
+	"""
+	Scheduler (hourly): queue a snapshot refresh for every saved report that
+	is due and has none pending, on the reports queue when a worker listens
+	on it, else on the long queue.
+	"""
+	queue = REPORT_QUEUE if has_report_worker() else "long"
+	for name in frappe.get_all("Custom Report", filters={"refresh_schedule": ("!=", "Manual")}, pluck="name"):
+		if frappe.get_doc("Custom Report", name).is_refresh_due():
+			frappe.enqueue(
+				"erpera_reports.erpera_reports.doctype.custom_report.custom_report.refresh_report_snapshot",
+				queue=queue,
+				job_id=f"custom_report_snapshot::{name}",
+				deduplicate=True,
+				report=name,
+			)
+
+
+def refresh_report_snapshot(report):
+	try:
+		frappe.get_doc("Custom Report", report).make_snapshot()
+		frappe.db.commit()
+	except Exception as e:
+		frappe.log_error(f"Error refreshing snapshot for {report}: {str(e)}")
+
+
+@frappe.whitelist()
+def get_snapshot(report, compact=0):
+	"""
+	Latest precomputed payload of a saved report, without running live queries.
+	Only when no snapshot exists yet is one computed on the spot.
+	"""
+	doc = frappe.get_doc("Custom Report", report)
+	doc.check_permission("read")
+
+	snapshots = doc.get_latest_snapshots()
+	if not snapshots:
+		with admitted(doc.get_endpoint_tier()):
+			doc.make_snapshot()
+		snapshots = doc.get_latest_snapshots()
+
+	data = json.loads(snapshots[0].data)
+	if isinstance(data, dict):
+		data["snapshot"] = {"name": snapshots[0].name, "generated_on": snapshots[0].generated_on}
+
+	if cint(compact):
+		frappe.get_attr(doc.endpoint)  # make sure the endpoint module is imported and registered
+		endpoint = REPORT_ENDPOINTS.get(doc.endpoint) or frappe._dict()
+		return compact_response(data, schema=endpoint.schema, precision=endpoint.precision or 2)
+	return data
+
+
+@frappe.whitelist()
+def diff_snapshots(report):
+	"""Compare the two latest snapshots of a saved report series by series, label by label."""
+	doc = frappe.get_doc("Custom Report", report)
+	doc.check_permission("read")
+
+	snapshots = doc.get_latest_snapshots(limit=2)
+	if len(snapshots) < 2:
+		return {"success": False, "error": _("At least two snapshots are needed for a comparison")}
+
+	new, old = snapshots
+	new_values = flatten_series(json.loads(new.data))
+	old_values = flatten_series(json.loads(old.data))
+
+	changes = []
+	for key in sorted(set(new_values) | set(old_values), key=lambda k: (str(k[0]), str(k[1]))):
+		new_value = new_values.get(key)
+		old_value = old_values.get(key)
+		if new_value == old_value:
+			continue
+		changes.append({
+			"series": key[0],
+			"label": key[1],
+			"old_value": old_value,
+			"new_value": new_value,
+			"change": flt(new_value) - flt(old_value),
+			"status": "added" if old_value is None else "removed" if new_value is None else "changed",
+		})
+
+	return {
+		"success": True,
+		"new_snapshot": {"name": new.name, "generated_on": new.generated_on},
+		"old_snapshot": {"name": old.name, "generated_on": old.generated_on},
+		"changes": changes,
+	}
+
+
+def flatten_series(payload):
+	"""Map (series, label) -> value for the chart shapes returned by the report endpoints."""
+	values = {}
+	if not isinstance(payload, dict):
+		return values
+
+	labels = payload.get("labels") or []
+	if isinstance(payload.get("datasets"), list):
+		for dataset in payload["datasets"]:
+			# Dataset labels often carry their total, e.g. "Branch - IN (1,234)"
+			series = re.sub(r"\s*\([^()]*\)$", "", dataset.get("label") or "")
+			for label, value in zip(labels, dataset.get("data") or []):
+				values[(series, label)] = value
+	elif isinstance(payload.get("datasets"), dict):
+		# multi-pie payloads: {entity: {labels, data}}
+		for entity, entity_data in payload["datasets"].items():
+			for label, value in zip(entity_data.get("labels") or [], entity_data.get("data") or []):
+				values[(entity, label)] = value
+	elif isinstance(payload.get("data"), list):
+		for label, value in zip(labels, payload["data"]):
+			values[(None, label)] = value
+
+	return values
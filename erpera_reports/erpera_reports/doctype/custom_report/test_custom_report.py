@@ -1,9 +1,22 @@
 # Copyright (c) 2025, erpera and Contributors
 # See license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
 
 class TestCustomReport(FrappeTestCase):
-	pass
+	def test_delete_refreshed_report(self):
+		report = frappe.get_doc({
+			"doctype": "Custom Report",
+			"report_title": "Top Suppliers",
+			"endpoint": "erpera_reports.dashboard.get_top_suppliers",
+			"filters": "{}",
+		}).insert()
+		snapshot = report.refresh_snapshot()
+		self.assertEqual(frappe.db.get_value("Custom Report", report.name, "latest_snapshot"), snapshot)
+
+		frappe.delete_doc("Custom Report", report.name)
+
+		self.assertFalse(frappe.db.exists("Custom Report", report.name))
+		self.assertFalse(frappe.db.exists("Custom Report Snapshot", {"custom_report": report.name}))
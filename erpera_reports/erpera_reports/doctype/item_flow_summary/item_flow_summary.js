@@ -0,0 +1,8 @@
+// Copyright (c) 2026, erpera and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Item Flow Summary", {
+// 	refresh(frm) {
+
+// 	},
+// });
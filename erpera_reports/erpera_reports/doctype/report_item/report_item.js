@@ -0,0 +1,8 @@
+// Copyright (c) 2026, erpera and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Report Item", {
+// 	refresh(frm) {
+
+// 	},
+// });
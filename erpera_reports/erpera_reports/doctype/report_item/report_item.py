@@ -0,0 +1,14 @@
+# Copyright (c) 2026, erpera and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class ReportItem(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Report Item", ["reportable", "is_stock_item"])
+	frappe.db.add_index("Report Item", ["sku"])
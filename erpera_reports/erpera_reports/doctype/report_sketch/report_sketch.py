@@ -0,0 +1,13 @@
+# Copyright (c) 2026, erpera and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+
+class ReportSketch(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Report Sketch", ["metric", "day"])
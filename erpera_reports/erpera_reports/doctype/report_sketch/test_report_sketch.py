@@ -0,0 +1,63 @@
+# Copyright (c) 2026, erpera and Contributors
+# See license.txt
+
+import json
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import today
+
+from erpera_reports.dashboard import get_top_selling_skus
+from erpera_reports.sketches import (
+	bump_sketch_version,
+	get_candidates,
+	get_sketch_candidates,
+	get_sketch_targets,
+	merge_sketches,
+	SpaceSaving,
+	update_sketch,
+)
+
+
+class TestReportSketch(FrappeTestCase):
+	def setUp(self):
+		for target in get_sketch_targets(None, None, today()):
+			update_sketch("sku_qty", *target, lambda counters: {"_Test SKU": [10, 0]})
+		bump_sketch_version("sku_qty")
+
+	def test_item_group_filter_skips_sketch(self):
+		params = {"from_date": today(), "to_date": today()}
+		self.assertEqual(get_sketch_candidates("sku_qty", params, 20, params), ["_Test SKU"])
+
+		filters = dict(params, item_group="All Item Groups")
+		self.assertIsNone(get_sketch_candidates("sku_qty", params, 20, filters))
+
+	def test_group_filtered_top_skus_skip_sketch(self):
+		candidates = []
+
+		def record_candidates(*args):
+			candidates.append(get_sketch_candidates(*args))
+			return candidates[-1]
+
+		filters = {"from_date": today(), "to_date": today(), "item_group": "All Item Groups"}
+		with patch("erpera_reports.dashboard.get_sketch_candidates", side_effect=record_candidates):
+			get_top_selling_skus(filters=json.dumps(filters))
+
+		self.assertEqual(candidates, [None])
+
+	def test_unmonitored_keys_rule_out_candidates(self):
+		# Two full sketches: a key missing from both may weigh up to 5 + 5
+		sketches = [SpaceSaving({"a": [12, 0], "b": [5, 0]}, capacity=2), SpaceSaving({"c": [6, 0], "d": [5, 0]}, capacity=2)]
+		merged, total_floor = merge_sketches(sketches)
+		self.assertIsNone(get_candidates(merged, total_floor, 2))
+
+	def test_lagging_replica_read_is_not_cached(self):
+		params = {"from_date": today(), "to_date": today()}
+		frappe.local.report_data_source = frappe._dict(source="replica", staleness=5, reason=None)
+		try:
+			with patch.object(frappe.cache(), "set_value") as set_value:
+				self.assertEqual(get_sketch_candidates("sku_qty", params, 20, params), ["_Test SKU"])
+		finally:
+			frappe.local.report_data_source = None
+		set_value.assert_not_called()
@@ -0,0 +1,9 @@
+# Copyright (c) 2026, erpera and Contributors
+# See license.txt
+
+# import frappe
+from frappe.tests.utils import FrappeTestCase
+
+
+class TestStockMovementSummary(FrappeTestCase):
+	pass
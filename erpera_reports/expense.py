@@ -1,9 +1,14 @@
 import frappe
 from frappe import _
 from frappe import whitelist
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.trees import cost_center_condition
 
 EXPENSE_GROUPS = ("EXPENSE", "Expense", "Expenses", "Expenses Head")
 
+# Doctypes whose modification watermark versions the report responses
+REPORT_SOURCES = ("GL Entry", "Purchase Invoice", "Account", "Cost Center")
+
 def get_expense_stats(fy_from=None, fy_to=None, month_from=None, month_to=None, company=None, branch=None):
     """
     Returns a dict with total_expense, total_salaries, total_rents, total_electric_bill
@@ -27,7 +32,7 @@ def get_expense_stats(fy_from=None, fy_to=None, month_from=None, month_to=None,
         where_conditions.append("gle.company = %(company)s")
         args['company'] = company
     if branch:
-        where_conditions.append("gle.cost_center = %(branch)s")
+        where_conditions.append(cost_center_condition("gle.cost_center", branch))
         args['branch'] = branch
 
     where_clause = " AND ".join(where_conditions)
@@ -119,7 +124,7 @@ def get_cost_center_expense_details(fy_start, fy_end, month_start, month_end, co
         where_conditions.append("gle.company = %(company)s")
         args['company'] = company
     if branch:
-        where_conditions.append("gle.cost_center = %(branch)s")
+        where_conditions.append(cost_center_condition("gle.cost_center", branch))
         args['branch'] = branch
 
     where_clause = " AND ".join(where_conditions)
@@ -277,6 +282,7 @@ def get_cost_center_expense_details(fy_start, fy_end, month_start, month_end, co
     return result
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_expense_by_branch(filters=None):
     """
     Returns expense totals by branch for item group 'EXPENSE'.
@@ -297,7 +303,7 @@ def get_expense_by_branch(filters=None):
         where.append("gl.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("gl.cost_center = %(branch)s")
+        where.append(cost_center_condition("gl.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     accounts = frappe.db.get_list('Account', {'account_name': ['like', '%electric%', '%rent%', '%salary%', '%expense%']}, pluck='name')
     for account in accounts:
@@ -322,6 +328,7 @@ def get_expense_by_branch(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_expense_by_company(filters=None):
     """
     Returns expense totals by company for item group 'EXPENSE'.
@@ -363,6 +370,7 @@ def get_expense_by_company(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_expense_summary(filters=None):
     """
     Returns expense summary by expense head (item group = 'EXPENSE') for the given filters.
@@ -383,7 +391,7 @@ def get_expense_summary(filters=None):
         where.append("gl.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("gl.cost_center = %(branch)s")
+        where.append(cost_center_condition("gl.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     accounts = frappe.db.get_list('Account', {'account_name': ['like', '%electric%', '%rent%', '%salary%', '%expense%']}, pluck='name')
     for account in accounts:
@@ -407,6 +415,7 @@ def get_expense_summary(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="heavy")
 def get_consolidated_expense(filters=None):
     """
     Returns consolidated expense data across all companies and branches.
@@ -427,7 +436,7 @@ def get_consolidated_expense(filters=None):
         where.append("pi.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("pi.cost_center = %(branch)s")
+        where.append(cost_center_condition("pi.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     sql = f"""
         SELECT 
@@ -453,6 +462,7 @@ def get_consolidated_expense(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_entity_wise_expense(filters=None):
     """
     Returns expense data by entity (company-branch combination).
@@ -460,6 +470,7 @@ def get_entity_wise_expense(filters=None):
     return get_consolidated_expense(filters)
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="heavy")
 def get_consolidated_expiry_expense(filters=None):
     """
     Returns consolidated expiry expense data.
@@ -480,7 +491,7 @@ def get_consolidated_expiry_expense(filters=None):
         where.append("pi.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("pi.cost_center = %(branch)s")
+        where.append(cost_center_condition("pi.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     sql = f"""
         SELECT 
@@ -506,6 +517,7 @@ def get_consolidated_expiry_expense(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_wise_expiry_expense(filters=None):
     """
     Returns branch-wise expiry expense data.
@@ -526,7 +538,7 @@ def get_branch_wise_expiry_expense(filters=None):
         where.append("pi.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("pi.cost_center = %(branch)s")
+        where.append(cost_center_condition("pi.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     sql = f"""
         SELECT pi.cost_center, cc.cost_center_name, SUM(pii.amount) as total
@@ -547,6 +559,7 @@ def get_branch_wise_expiry_expense(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_company_wise_expiry_expense(filters=None):
     """
     Returns company-wise expiry expense data.
@@ -584,6 +597,7 @@ def get_company_wise_expiry_expense(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_expiry_expense_summary(filters=None):
     """
     Returns expiry expense summary data.
@@ -604,7 +618,7 @@ def get_expiry_expense_summary(filters=None):
         where.append("pi.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("pi.cost_center = %(branch)s")
+        where.append(cost_center_condition("pi.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     sql = f"""
         SELECT pii.item_group, SUM(pii.amount) as total
@@ -624,6 +638,7 @@ def get_expiry_expense_summary(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_expiry_demand_comparison(filters=None):
     """
     Returns expiry vs demand comparison data.
@@ -644,7 +659,7 @@ def get_expiry_demand_comparison(filters=None):
         where.append("pi.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("pi.cost_center = %(branch)s")
+        where.append(cost_center_condition("pi.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     sql = f"""
         SELECT pii.item_group, SUM(pii.amount) as total
@@ -664,6 +679,7 @@ def get_expiry_demand_comparison(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="heavy")
 def get_consolidated_expired_items(filters=None):
     """
     Returns consolidated expired items data.
@@ -684,7 +700,7 @@ def get_consolidated_expired_items(filters=None):
         where.append("pi.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("pi.cost_center = %(branch)s")
+        where.append(cost_center_condition("pi.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     sql = f"""
         SELECT 
@@ -710,6 +726,7 @@ def get_consolidated_expired_items(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_wise_in_out_quantity(filters=None):
     """
     Returns branch-wise in/out quantity data.
@@ -730,7 +747,7 @@ def get_branch_wise_in_out_quantity(filters=None):
         where.append("pi.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("pi.cost_center = %(branch)s")
+        where.append(cost_center_condition("pi.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     sql = f"""
         SELECT pi.cost_center, cc.cost_center_name, SUM(pii.amount) as total
@@ -751,6 +768,7 @@ def get_branch_wise_in_out_quantity(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_company_wise_in_out_quantity(filters=None):
     """
     Returns company-wise in/out quantity data.
@@ -788,6 +806,7 @@ def get_company_wise_in_out_quantity(filters=None):
     }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_consolidate_in_out_quantity(filters=None):
     """
     Returns consolidated in/out quantity data.
@@ -808,7 +827,7 @@ def get_consolidate_in_out_quantity(filters=None):
         where.append("pi.company = %(company)s")
         args['company'] = filters['company']
     if filters.get('branch'):
-        where.append("pi.cost_center = %(branch)s")
+        where.append(cost_center_condition("pi.cost_center", filters['branch']))
         args['branch'] = filters['branch']
     sql = f"""
         SELECT 
@@ -0,0 +1,138 @@
+import csv
+import io
+import os
+import tempfile
+
+import frappe
+import pymysql
+from frappe.utils import cstr
+from werkzeug.wrappers import Response
+
+from erpera_reports.replica import get_replica_credentials, is_replica_active
+
+# Rows fetched from the server-side cursor per round trip
+FETCH_SIZE = 2000
+# Bytes per chunk when streaming a finished XLSX file
+FILE_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+}
+
+
+def stream_export(drill, file_format="csv", filename="export"):
+    """
+    Stream a drill-down query (see api.build_*_drill_down_query) as CSV or XLSX.
+
+    Rows come from an unbuffered server-side cursor and are written out as they
+    arrive, so memory use does not grow with the size of the export. The body is
+    sent without a Content-Length, i.e. with chunked transfer encoding.
+    """
+    file_format = (file_format or "csv").lower()
+    if file_format not in EXPORT_FORMATS:
+        frappe.throw(f"Unsupported export format: {file_format}")
+
+    query = f"{drill.query} ORDER BY {drill.order_by}"
+    # frappe.db is closed before the response body is consumed, so the
+    # generator opens its own connection with the site's credentials.
+    connection_args = get_connection_args()
+    rows = iter_rows(connection_args, query, drill.params, drill.columns)
+
+    if file_format == "csv":
+        body = iter_csv(drill.columns, rows)
+    else:
+        body = iter_xlsx(drill.columns, rows)
+
+    return Response(
+        body,
+        mimetype=EXPORT_FORMATS[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{frappe.scrub(filename)}.{file_format}"'},
+        direct_passthrough=True
+    )
+
+
+def get_connection_args():
+    conf = frappe.conf
+    args = {
+        "user": conf.db_user or conf.db_name,
+        "password": conf.db_password,
+        "database": conf.db_name,
+        "charset": "utf8mb4",
+        "cursorclass": pymysql.cursors.SSCursor
+    }
+    if is_replica_active():
+        # The request was routed to the read replica (see erpera_reports.replica)
+        args["user"], args["password"] = get_replica_credentials()
+        args["host"] = conf.replica_host
+        args["port"] = int(conf.replica_db_port or 3306)
+    elif conf.db_socket:
+        args["unix_socket"] = conf.db_socket
+    else:
+        args["host"] = conf.db_host or "127.0.0.1"
+        args["port"] = int(conf.db_port or 3306)
+    return args
+
+
+def iter_rows(connection_args, query, params, columns):
+    """Yield tuples for `columns` from an unbuffered cursor."""
+    connection = pymysql.connect(**connection_args)
+    try:
+        with connection.cursor() as cursor:
+            # Slow clients must not trip the server-side write timeout mid-stream
+            cursor.execute("SET SESSION net_write_timeout = 3600")
+            cursor.execute(query, params)
+            names = [d[0] for d in cursor.description]
+            positions = [names.index(column) for column in columns]
+            while True:
+                batch = cursor.fetchmany(FETCH_SIZE)
+                if not batch:
+                    break
+                for row in batch:
+                    yield tuple(row[i] for i in positions)
+    finally:
+        connection.close()
+
+
+def iter_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([label_for(column) for column in columns])
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow([cstr(value) for value in row])
+        if count % FETCH_SIZE == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode("utf-8")
+
+
+def iter_xlsx(columns, rows):
+    from openpyxl import Workbook
+
+    # A write-only workbook keeps rows on disk; the zip container can only be
+    # produced once all rows are written, so it is streamed from a temp file.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Export")
+    sheet.append([label_for(column) for column in columns])
+    for row in rows:
+        sheet.append(list(row))
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(FILE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def label_for(column):
+    return column.replace("_", " ").title()
@@ -0,0 +1,265 @@
+import hashlib
+
+import frappe
+import numpy as np
+from frappe.utils import cint, flt, get_first_day, getdate, now
+
+from erpera_reports.items import get_item_codes, get_item_map
+from erpera_reports.rollup import split_whole_months
+
+# Queue of the after-commit summary update of each invoice
+FLOW_QUEUE = "short"
+
+FLOW_FIELDS = ("purchased_qty", "purchased_amount", "sold_qty", "sold_amount")
+# Columns of the `data` and totals arrays, in FLOW_FIELDS order
+PURCHASED_QTY, PURCHASED_AMOUNT, SOLD_QTY, SOLD_AMOUNT = range(len(FLOW_FIELDS))
+
+# (qty field, amount field) fed by each invoice doctype
+FLOW_SOURCES = {
+    "Purchase Invoice": ("purchased_qty", "purchased_amount"),
+    "Sales Invoice": ("sold_qty", "sold_amount")
+}
+
+
+def get_flow_name(company, item_code, month):
+    key = f"{company}\n{item_code}\n{getdate(month)}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def add_flow(company, item_code, month, flow):
+    """Add purchased and sold quantities and amounts to a month's summary row, creating it first."""
+    month = get_first_day(month)
+    timestamp = now()
+    frappe.db.sql("""
+        INSERT INTO `tabItem Flow Summary`
+            (name, creation, modified, owner, modified_by, docstatus, idx,
+            month, company, item_code, purchased_qty, purchased_amount, sold_qty, sold_amount)
+        VALUES
+            (%(name)s, %(timestamp)s, %(timestamp)s, 'Administrator', 'Administrator', 0, 0,
+            %(month)s, %(company)s, %(item_code)s, %(purchased_qty)s, %(purchased_amount)s, %(sold_qty)s, %(sold_amount)s)
+        ON DUPLICATE KEY UPDATE
+            purchased_qty = purchased_qty + VALUES(purchased_qty),
+            purchased_amount = purchased_amount + VALUES(purchased_amount),
+            sold_qty = sold_qty + VALUES(sold_qty),
+            sold_amount = sold_amount + VALUES(sold_amount),
+            modified = VALUES(modified)
+    """, dict(
+        flow,
+        name=get_flow_name(company, item_code, month),
+        timestamp=timestamp,
+        month=month,
+        company=company,
+        item_code=item_code
+    ))
+
+
+def update_item_flows(doc, method=None):
+    """
+    doc_events hook on Sales Invoice and Purchase Invoice: queue adding the
+    invoice items to their (company, item, month) summary rows on submit, and
+    taking them off again on cancel, once the submit or cancel commits.
+    """
+    frappe.enqueue(
+        "erpera_reports.flows.update_invoice_flows",
+        queue=FLOW_QUEUE,
+        enqueue_after_commit=True,
+        doctype=doc.doctype,
+        invoice=doc.name,
+        company=doc.company,
+        posting_date=doc.posting_date,
+        cancel=cint(method == "on_cancel")
+    )
+
+
+def update_invoice_flows(doctype, invoice, company, posting_date, cancel=0):
+    """
+    Background job: add or take back (`cancel`) a committed invoice's items in
+    its summary rows, in item code order so concurrent jobs lock shared rows
+    in the same order.
+    """
+    sign = -1 if cint(cancel) else 1
+    qty_field, amount_field = FLOW_SOURCES[doctype]
+    items = frappe.db.sql(f"""
+        SELECT item_code, SUM(qty) AS qty, SUM(amount) AS amount
+        FROM `tab{doctype} Item`
+        WHERE parent = %(invoice)s AND parenttype = %(doctype)s
+        GROUP BY item_code
+        ORDER BY item_code
+    """, {"invoice": invoice, "doctype": doctype}, as_dict=True)
+
+    for item in items:
+        flow = dict.fromkeys(FLOW_FIELDS, 0)
+        flow[qty_field] = sign * flt(item.qty)
+        flow[amount_field] = sign * flt(item.amount)
+        add_flow(company, item.item_code, posting_date, flow)
+
+
+def get_invoice_flows(conditions, values):
+    """
+    Purchased and sold quantities and amounts of the submitted invoices per
+    company, item and month. `conditions` apply to both invoice doctypes as `inv`.
+    """
+    return frappe.db.sql(f"""
+        SELECT
+            company,
+            item_code,
+            month,
+            SUM(purchased_qty) AS purchased_qty,
+            SUM(purchased_amount) AS purchased_amount,
+            SUM(sold_qty) AS sold_qty,
+            SUM(sold_amount) AS sold_amount
+        FROM (
+            SELECT
+                inv.company,
+                item.item_code,
+                DATE_FORMAT(inv.posting_date, '%%Y-%%m-01') AS month,
+                item.qty AS purchased_qty,
+                item.amount AS purchased_amount,
+                0 AS sold_qty,
+                0 AS sold_amount
+            FROM `tabPurchase Invoice Item` item
+            INNER JOIN `tabPurchase Invoice` inv ON inv.name = item.parent
+            WHERE inv.docstatus = 1
+            {conditions}
+            UNION ALL
+            SELECT
+                inv.company,
+                item.item_code,
+                DATE_FORMAT(inv.posting_date, '%%Y-%%m-01') AS month,
+                0 AS purchased_qty,
+                0 AS purchased_amount,
+                item.qty AS sold_qty,
+                item.amount AS sold_amount
+            FROM `tabSales Invoice Item` item
+            INNER JOIN `tabSales Invoice` inv ON inv.name = item.parent
+            WHERE inv.docstatus = 1
+            {conditions}
+        ) flows
+        GROUP BY company, item_code, month
+    """, values, as_dict=True)
+
+
+def rebuild_item_flows(from_date=None):
+    """
+    Rebuild the summary rows from the invoices, from the month of `from_date`
+    (default: all of them).
+    """
+    conditions, values = "", {}
+    if from_date:
+        values["from_date"] = get_first_day(from_date)
+        conditions = " AND inv.posting_date >= %(from_date)s"
+        frappe.db.delete("Item Flow Summary", {"month": [">=", values["from_date"]]})
+    else:
+        frappe.db.delete("Item Flow Summary")
+
+    timestamp = now()
+    rows = get_invoice_flows(conditions, values)
+    frappe.db.bulk_insert(
+        "Item Flow Summary",
+        ("name", "creation", "modified", "owner", "modified_by", "month", "company", "item_code") + FLOW_FIELDS,
+        [
+            (
+                get_flow_name(row.company, row.item_code, row.month),
+                timestamp, timestamp, "Administrator", "Administrator",
+                row.month, row.company, row.item_code
+            ) + tuple(flt(row[field]) for field in FLOW_FIELDS)
+            for row in rows
+        ]
+    )
+    frappe.db.commit()
+
+
+def get_summary_flows(from_date, to_date, company=None):
+    conditions, values = [], {}
+    if from_date:
+        conditions.append("month >= %(from_date)s")
+        values["from_date"] = from_date
+    if to_date:
+        conditions.append("month <= %(to_date)s")
+        values["to_date"] = to_date
+    if company:
+        conditions.append("company = %(company)s")
+        values["company"] = company
+
+    return frappe.db.sql(f"""
+        SELECT item_code, month, SUM(purchased_qty) AS purchased_qty, SUM(purchased_amount) AS purchased_amount,
+            SUM(sold_qty) AS sold_qty, SUM(sold_amount) AS sold_amount
+        FROM `tabItem Flow Summary`
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        GROUP BY item_code, month
+    """, values, as_dict=True)
+
+
+def get_item_flows(from_date, to_date, company=None):
+    """
+    Purchased and sold quantities and amounts per item and month between two
+    dates, as NumPy arrays of one entry per row: `item_code`, `month`
+    ('%Y-%m') and `data`, a (rows, 4) array of the FLOW_FIELDS.
+
+    Whole months are one scan of the summary rows; the partial months at
+    either end of the range are read from the invoices.
+    """
+    from_date, to_date = getdate(from_date), getdate(to_date)
+    whole, partial = split_whole_months(from_date, to_date)
+
+    rows = get_summary_flows(*whole, company) if whole else []
+    for start, end in partial:
+        rows += get_invoice_flows(
+            " AND inv.posting_date BETWEEN %(from_date)s AND %(to_date)s"
+            + (" AND inv.company = %(company)s" if company else ""),
+            {"from_date": start, "to_date": end, "company": company}
+        )
+
+    return frappe._dict(
+        item_code=np.array([row.item_code or "" for row in rows], dtype=object),
+        month=np.array([str(row.month)[:7] for row in rows], dtype=object),
+        data=np.array(
+            [[flt(row[field]) for field in FLOW_FIELDS] for row in rows], dtype=float
+        ).reshape(-1, len(FLOW_FIELDS))
+    )
+
+
+def sum_flows(keys, values):
+    """The distinct `keys`, sorted, and the rows of `values` summed for each."""
+    keys, index = np.unique(keys, return_inverse=True)
+    totals = np.zeros((len(keys), values.shape[1]))
+    np.add.at(totals, index, values)
+    return keys, totals
+
+
+def get_item_totals(from_date, to_date, company=None):
+    """(item codes, totals) of get_item_flows() summed per item over the whole range."""
+    flows = get_item_flows(from_date, to_date, company)
+    return sum_flows(flows.item_code, flows.data)
+
+
+def purchased(totals):
+    """Mask of the items purchased in the range, as a join on their invoice items would find them."""
+    return (totals[:, PURCHASED_QTY] != 0) | (totals[:, PURCHASED_AMOUNT] != 0)
+
+
+def sold(totals):
+    """Mask of the items sold in the range."""
+    return (totals[:, SOLD_QTY] != 0) | (totals[:, SOLD_AMOUNT] != 0)
+
+
+def item_mask(item_codes, item_class=None, item_group=None):
+    """Mask of the item codes of an items.ITEM_CLASSES class and/or item group."""
+    matching = np.array(sorted(get_item_codes(item_class, item_group)), dtype=object)
+    return np.isin(item_codes, matching)
+
+
+def get_item_groups(item_codes):
+    """Item group of each item code, 'Others' for unknown items."""
+    item_map = get_item_map()
+    return np.array(
+        [(item_map[item_code][1] if item_code in item_map else None) or "Others" for item_code in item_codes],
+        dtype=object
+    )
+
+
+def rank(scores, mask, limit=None):
+    """Indices of the entries under `mask`, highest `scores` first, at most `limit` of them."""
+    index = np.flatnonzero(mask)
+    index = index[np.argsort(-scores[index], kind="stable")]
+    return index[:limit] if limit else index
@@ -0,0 +1,91 @@
+import functools
+import hashlib
+import json
+
+import frappe
+from frappe.utils import cint, today
+
+from erpera_reports.replica import is_lagging_read
+
+# Rendered filter panel / number card HTML of the /reports pages is reused for
+# at most this long; a data version bump on any source doctype retires it sooner
+FRAGMENT_TTL = 10 * 60
+FRAGMENTS = ("filter_panel", "number_cards")
+
+# Doctypes read by the page fragments; saving one bumps its data version
+VERSIONED_DOCTYPES = (
+    "Sales Invoice",
+    "Purchase Invoice",
+    "Stock Ledger Entry",
+    "GL Entry",
+    "Account",
+    "Company",
+    "Cost Center",
+    "Warehouse",
+    "Item",
+    "Item Group",
+    "Customer",
+    "Supplier"
+)
+
+
+def get_version_key(doctype):
+    # A raw Redis counter: prefixed per site like the keys of get_value/set_value
+    return frappe.cache().make_key(f"erpera_reports:data_version:{doctype}")
+
+
+def bump_data_version(doc, method=None):
+    """doc_events hook: retire cached fragments built on the document's doctype."""
+    if doc.doctype in VERSIONED_DOCTYPES:
+        # After commit: a page rendered before then must not be cached under the new version
+        frappe.db.after_commit.add(functools.partial(frappe.cache().incr, get_version_key(doc.doctype)))
+
+
+def get_data_version(sources):
+    return "|".join(f"{doctype}:{cint(frappe.cache().get(get_version_key(doctype)))}" for doctype in sources)
+
+
+def get_permission_fingerprint():
+    """Roles and user permissions of the session user; users sharing both see the same fragments."""
+    from frappe.core.doctype.user_permission.user_permission import get_user_permissions
+
+    user_permissions = {
+        doctype: sorted(perm.get("doc") for perm in perms)
+        for doctype, perms in get_user_permissions(frappe.session.user).items()
+    }
+    return json.dumps({"roles": sorted(frappe.get_roles()), "user_permissions": user_permissions}, sort_keys=True)
+
+
+def get_page_fragments(page, sources):
+    """
+    Cache keys and cached HTML of a page's fragments. Keys cover the page,
+    the canonical URL args, the permission fingerprint, the day (default
+    periods are relative to today) and the data version of `sources`.
+    `cached` is set only when every fragment is available.
+    """
+    args = {key: value for key, value in sorted(frappe.request.args.items()) if value}
+    key = hashlib.sha1("\n".join([
+        page,
+        json.dumps(args, sort_keys=True),
+        get_permission_fingerprint(),
+        today(),
+        get_data_version(sources)
+    ]).encode()).hexdigest()
+
+    cache_keys = {name: f"erpera_reports:fragment:{key}:{name}" for name in FRAGMENTS}
+    html = {name: frappe.cache().get_value(cache_key) for name, cache_key in cache_keys.items()}
+    return frappe._dict(
+        cache_keys=frappe._dict(cache_keys),
+        html=frappe._dict(html),
+        cached=all(html.values())
+    )
+
+
+def cache_fragment(cache_key, html):
+    """
+    Jinja method: store a freshly rendered fragment and output it unchanged.
+    A fragment rendered from a lagging replica is not stored.
+    """
+    if not is_lagging_read():
+        frappe.cache().set_value(cache_key, str(html), expires_in_sec=FRAGMENT_TTL)
+    return html
@@ -78,6 +78,12 @@ app_license = "MIT"
 # 	"methods": "erpera_reports.utils.jinja_methods",
 # 	"filters": "erpera_reports.utils.jinja_filters"
 # }
+jinja = {
+	"methods": [
+		"erpera_reports.fragments.cache_fragment",
+		"erpera_reports.assets.get_asset_url"
+	]
+}
 
 # Installation
 # ------------
@@ -138,31 +144,54 @@ app_license = "MIT"
 # Hook on document methods and events
 
 doc_events = {
+	"*": {
+		"on_change": "erpera_reports.fragments.bump_data_version",
+		"on_trash": "erpera_reports.fragments.bump_data_version"
+	},
+	"Item": {
+		"on_update": "erpera_reports.items.update_report_item",
+		"after_rename": "erpera_reports.items.update_report_item",
+		"on_trash": "erpera_reports.items.update_report_item"
+	},
+	"Item Group": {
+		"on_update": ["erpera_reports.items.clear_item_cache", "erpera_reports.trees.clear_tree_cache"],
+		"after_rename": ["erpera_reports.items.queue_report_item_rebuild", "erpera_reports.trees.clear_tree_cache"],
+		"on_trash": ["erpera_reports.items.queue_report_item_rebuild", "erpera_reports.trees.clear_tree_cache"]
+	},
+	"Cost Center": {
+		"on_update": "erpera_reports.trees.clear_tree_cache",
+		"after_rename": "erpera_reports.trees.clear_tree_cache",
+		"on_trash": "erpera_reports.trees.clear_tree_cache"
+	},
 	"Purchase Receipt": {
 		"validate": "erpera_reports.api.log_error"
+	},
+	"Sales Invoice": {
+		"on_submit": ["erpera_reports.sketches.update_sketches", "erpera_reports.flows.update_item_flows"],
+		"on_cancel": ["erpera_reports.sketches.update_sketches", "erpera_reports.flows.update_item_flows"]
+	},
+	"Purchase Invoice": {
+		"on_submit": ["erpera_reports.sketches.update_sketches", "erpera_reports.flows.update_item_flows"],
+		"on_cancel": ["erpera_reports.sketches.update_sketches", "erpera_reports.flows.update_item_flows"]
+	},
+	"Stock Ledger Entry": {
+		"on_submit": "erpera_reports.movements.update_stock_movement"
 	}
 }
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"erpera_reports.tasks.all"
-# 	],
-# 	"daily": [
-# 		"erpera_reports.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"erpera_reports.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"erpera_reports.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"erpera_reports.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+	"hourly": [
+		"erpera_reports.erpera_reports.doctype.custom_report.custom_report.refresh_due_snapshots"
+	],
+	"daily": [
+		"erpera_reports.sketches.purge_expired_sketches",
+		"erpera_reports.items.rebuild_report_items",
+		"erpera_reports.movements.refresh_recent_stock_movements"
+	],
+}
 
 # Testing
 # -------
@@ -195,7 +224,7 @@ doc_events = {
 # Request Events
 # ----------------
 # before_request = ["erpera_reports.utils.before_request"]
-# after_request = ["erpera_reports.utils.after_request"]
+after_request = ["erpera_reports.endpoints.set_report_headers"]
 
 # Job Events
 # ----------
@@ -246,6 +275,7 @@ whitelisted_methods = {
     "erpera_reports.selling.get_total_branch_wise_selling": "erpera_reports.selling.get_total_branch_wise_selling",
     "erpera_reports.selling.get_branch_wise_selling": "erpera_reports.selling.get_branch_wise_selling",
     "erpera_reports.selling.get_company_wise_selling": "erpera_reports.selling.get_company_wise_selling",
+    "erpera_reports.selling.get_branch_group_wise_selling": "erpera_reports.selling.get_branch_group_wise_selling",
     "erpera_reports.selling.get_selling_summary": "erpera_reports.selling.get_selling_summary",
     "erpera_reports.selling.consolidated_total_selling": "erpera_reports.selling.consolidated_total_selling",
     "erpera_reports.selling.get_entity_wise_selling": "erpera_reports.selling.get_entity_wise_selling",
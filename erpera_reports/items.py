@@ -0,0 +1,179 @@
+import frappe
+from frappe.utils import cint, now
+
+from erpera_reports.trees import get_descendants, get_tree, is_group_node
+
+# Item groups left out of the reports. Override with a list under
+# "erpera_reports_excluded_item_groups" in site_config.json; the Report Item
+# flags pick a change up on the next daily rebuild.
+EXCLUDED_ITEM_GROUPS = ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+# Item groups that are not SKUs, for the SKU cards and charts. Override with
+# "erpera_reports_non_sku_item_groups".
+NON_SKU_ITEM_GROUPS = ('Raw Material', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+
+ITEM_MAP_KEY = "erpera_reports:item_map"
+
+# Report Item flags an item code column can be restricted to, per item class
+ITEM_CLASSES = {
+    "reportable": ("reportable",),
+    "reportable_stock": ("reportable", "is_stock_item"),
+    "stock": ("is_stock_item",),
+    "sku": ("sku",)
+}
+
+
+def get_excluded_item_groups():
+    return tuple(frappe.conf.get("erpera_reports_excluded_item_groups") or EXCLUDED_ITEM_GROUPS)
+
+
+def get_non_sku_item_groups():
+    return tuple(frappe.conf.get("erpera_reports_non_sku_item_groups") or NON_SKU_ITEM_GROUPS)
+
+
+def sync_report_items(item_codes=None):
+    """
+    Rewrite the Report Item rows of `item_codes` (every item when None) from
+    Item and the configured item groups. A code no longer in Item loses its row.
+    """
+    condition = "WHERE name IN %(item_codes)s" if item_codes else ""
+    values = {
+        "item_codes": tuple(item_codes or ()),
+        "excluded": get_excluded_item_groups(),
+        "non_sku": get_non_sku_item_groups(),
+        "now": now()
+    }
+    frappe.db.sql(f"DELETE FROM `tabReport Item` {condition}", values)
+    frappe.db.sql(f"""
+        INSERT INTO `tabReport Item`
+            (name, item_code, item_group, is_stock_item, reportable, sku,
+             creation, modified, owner, modified_by, docstatus)
+        SELECT
+            name, name, item_group, is_stock_item,
+            IFNULL(item_group, '') NOT IN %(excluded)s,
+            IFNULL(item_group, '') NOT IN %(non_sku)s,
+            %(now)s, %(now)s, 'Administrator', 'Administrator', 0
+        FROM `tabItem`
+        {condition}
+    """, values)
+    clear_item_cache()
+
+
+def rebuild_report_items():
+    """Background job and daily task: every Report Item row, e.g. after the item group config changed."""
+    sync_report_items()
+
+
+def update_report_item(doc, method=None, old=None, new=None, merge=False):
+    """doc_events hook on Item: keep its Report Item row in step."""
+    if method == "on_trash":
+        frappe.db.delete("Report Item", {"name": doc.name})
+        clear_item_cache()
+    else:
+        # after_rename passes the old name, whose row goes with it
+        sync_report_items([code for code in (old, doc.name) if code])
+
+
+def queue_report_item_rebuild(doc=None, method=None):
+    """
+    doc_events hook on Item Group: a renamed or removed group can move items in
+    or out of the configured groups, so the Report Item rows are rebuilt after
+    the commit.
+    """
+    frappe.enqueue(
+        "erpera_reports.items.rebuild_report_items",
+        queue="short",
+        enqueue_after_commit=True,
+        job_id="erpera_reports::rebuild_report_items",
+        deduplicate=True
+    )
+
+
+def get_item_map():
+    """
+    item_code -> (is_stock_item, item_group, reportable, sku) of every Report
+    Item, cached until an Item or Item Group changes.
+    """
+    item_map = getattr(frappe.local, "erpera_item_map", None) or frappe.cache().get_value(ITEM_MAP_KEY)
+    if item_map is None:
+        item_map = {
+            item.name: (cint(item.is_stock_item), item.item_group, cint(item.reportable), cint(item.sku))
+            for item in frappe.db.sql(
+                "SELECT name, is_stock_item, item_group, reportable, sku FROM `tabReport Item`",
+                as_dict=True
+            )
+        }
+        frappe.cache().set_value(ITEM_MAP_KEY, item_map)
+    # Kept on the request as well, for the several conditions of one report
+    frappe.local.erpera_item_map = item_map
+    return item_map
+
+
+def get_item(item_code):
+    """Cached attributes of an item, or None for an unknown item code."""
+    if item_code not in get_item_map():
+        return None
+    is_stock_item, item_group, reportable, sku = get_item_map()[item_code]
+    return frappe._dict(
+        item_code=item_code,
+        is_stock_item=is_stock_item,
+        item_group=item_group,
+        reportable=reportable,
+        sku=sku
+    )
+
+
+def clear_item_cache(doc=None, method=None):
+    """doc_events hook on Item Group: rebuild the item map on next use."""
+    frappe.cache().delete_value(ITEM_MAP_KEY)
+    frappe.local.erpera_item_map = None
+
+
+def get_item_codes(item_class=None, item_group=None):
+    """Set of the item codes of an ITEM_CLASSES class and/or item group."""
+    # A group node takes in the items of every item group below it
+    item_groups = get_descendants("Item Group", item_group) if item_group else None
+    flags = ITEM_CLASSES[item_class] if item_class else ()
+    return {
+        item_code
+        for item_code in get_item_map()
+        if all(get_item(item_code)[flag] for flag in flags)
+        and (not item_groups or get_item(item_code).item_group in item_groups)
+    }
+
+
+def get_item_condition(column, item_class=None, item_group=None):
+    """
+    SQL condition on an item code `column` standing in for a join to Item and
+    Item Group, e.g. get_item_condition("sii.item_code", "reportable"): a
+    semi-join on the indexed flags of Report Item, so an item code without a
+    row never matches. Percent signs are doubled, so the query must be run
+    with values.
+    """
+    conditions = [f"ri.{flag} = 1" for flag in (ITEM_CLASSES[item_class] if item_class else ())]
+    if item_group:
+        if is_group_node("Item Group", item_group):
+            lft, rgt = get_tree("Item Group")[item_group][:2]
+            conditions.append(f"ri.item_group IN (SELECT name FROM `tabItem Group` WHERE lft >= {lft} AND rgt <= {rgt})")
+        else:
+            conditions.append("ri.item_group = " + frappe.db.escape(item_group))
+    where = " AND ".join(conditions) or "1 = 1"
+    return f"{column} IN (SELECT ri.name FROM `tabReport Item` ri WHERE {where})"
+
+
+def reportable_items(column, stock_only=False):
+    """Items outside the excluded item groups (and stock items only with `stock_only`)."""
+    return get_item_condition(column, "reportable_stock" if stock_only else "reportable")
+
+
+def stock_items(column):
+    return get_item_condition(column, "stock")
+
+
+def sku_items(column):
+    """Items outside the non-SKU item groups."""
+    return get_item_condition(column, "sku")
+
+
+def items_in_group(column, item_group):
+    """Items of `item_group`, or of any item group below it for a group node."""
+    return get_item_condition(column, item_group=item_group)
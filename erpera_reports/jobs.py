@@ -0,0 +1,135 @@
+import frappe
+
+from erpera_reports.compact import compact_response
+from erpera_reports.replica import report_connection
+
+# Heavy reports run on their own RQ queue so they neither hit the gunicorn
+# timeout nor starve the default workers. Start a worker for it with:
+#   bench worker --queue reports
+REPORT_QUEUE = "reports"
+REPORT_JOB_TIMEOUT = 60 * 60
+# Finished payloads are kept in Redis for this long
+REPORT_RESULT_TTL = 60 * 60
+
+# Whether a worker listens on REPORT_QUEUE is checked at most this often
+WORKER_CHECK_INTERVAL = 60
+WORKER_STATUS_KEY = "erpera_reports:report_worker"
+
+PROGRESS_EVENT = "erpera_report_job_progress"
+# Job state fields exposed to the client
+JOB_FIELDS = ("job_id", "status", "progress", "description", "error", "data_source")
+
+
+def get_job_key(job_id):
+    return f"erpera_reports:report_job:{job_id}"
+
+
+def get_result_key(job_id):
+    return f"erpera_reports:report_job_result:{job_id}"
+
+
+def has_report_worker():
+    """
+    True when an RQ worker listens on REPORT_QUEUE. Without one a queued
+    report would never run, so callers run it inline instead.
+    """
+    available = frappe.cache().get_value(WORKER_STATUS_KEY)
+    if available is None:
+        try:
+            from frappe.utils.background_jobs import get_queue, get_workers
+
+            available = bool(get_workers(get_queue(REPORT_QUEUE)))
+        except Exception as e:
+            frappe.log_error(f"Error in has_report_worker: {str(e)}")
+            available = False
+        frappe.cache().set_value(WORKER_STATUS_KEY, available, expires_in_sec=WORKER_CHECK_INTERVAL)
+    return available
+
+
+def enqueue_report_job(endpoint, kwargs):
+    """Queue `endpoint` (a REPORT_ENDPOINTS entry) with the request kwargs and return the job handle."""
+    job_id = frappe.generate_hash(length=16)
+    state = {
+        "job_id": job_id,
+        "method": endpoint.path,
+        "schema": endpoint.schema,
+        "precision": endpoint.precision,
+        "user": frappe.session.user,
+        "status": "queued",
+        "progress": 0,
+        "description": "Queued"
+    }
+    frappe.cache().set_value(get_job_key(job_id), state, expires_in_sec=REPORT_RESULT_TTL)
+
+    frappe.enqueue(
+        "erpera_reports.jobs.run_report_job",
+        queue=REPORT_QUEUE,
+        timeout=REPORT_JOB_TIMEOUT,
+        report_job_id=job_id,
+        report_method=endpoint.path,
+        report_kwargs=kwargs
+    )
+
+    return {"background": 1, "job_id": job_id, "status": "queued"}
+
+
+def run_report_job(report_job_id, report_method, report_kwargs):
+    """RQ entry point: run the report and store its payload in the cache."""
+    job_id = frappe.local.report_job_id = report_job_id
+    try:
+        update_job(job_id, status="running", progress=5, description="Running")
+        with report_connection() as data_source:
+            result = frappe.call(report_method, **(report_kwargs or {}))
+        frappe.cache().set_value(get_result_key(job_id), result, expires_in_sec=REPORT_RESULT_TTL)
+        update_job(job_id, status="finished", progress=100, description="Finished", data_source=data_source)
+    except Exception as e:
+        frappe.log_error(f"Error in report job {report_method}: {str(e)}")
+        update_job(job_id, status="failed", description="Failed", error=str(e))
+    finally:
+        frappe.local.report_job_id = None
+
+
+def update_job(job_id, **values):
+    key = get_job_key(job_id)
+    state = frappe.cache().get_value(key)
+    if not state:
+        return
+    state.update(values)
+    frappe.cache().set_value(key, state, expires_in_sec=REPORT_RESULT_TTL)
+
+    frappe.publish_realtime(
+        PROGRESS_EVENT,
+        {field: state.get(field) for field in JOB_FIELDS},
+        user=state["user"],
+        after_commit=False
+    )
+
+
+def report_progress(progress, description=None):
+    """
+    Report progress from inside a report endpoint.
+    A no-op unless the endpoint is running as a background job.
+    """
+    job_id = getattr(frappe.local, "report_job_id", None)
+    if job_id:
+        update_job(job_id, progress=progress, description=description or f"{progress}%")
+
+
+@frappe.whitelist()
+def get_report_job(job_id, compact=0):
+    """Poll a report job. Once finished the endpoint payload is returned as `result`."""
+    state = frappe.cache().get_value(get_job_key(job_id))
+    if not state:
+        return {"job_id": job_id, "status": "expired"}
+    if state["user"] != frappe.session.user:
+        frappe.throw("Not permitted", frappe.PermissionError)
+
+    response = {field: state.get(field) for field in JOB_FIELDS}
+    if state["status"] == "finished":
+        result = frappe.cache().get_value(get_result_key(job_id))
+        if result is None:
+            return {"job_id": job_id, "status": "expired"}
+        if frappe.utils.cint(compact):
+            result = compact_response(result, schema=state["schema"], precision=state["precision"])
+        response["result"] = result
+    return response
@@ -0,0 +1,307 @@
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, flt, today
+
+from erpera_reports.comparison import compare_totals, get_comparison, get_windows_from_filters
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.items import sku_items
+from erpera_reports.sketches import get_distinct_comparison
+
+# Doctypes whose modification watermark versions the report responses
+REPORT_SOURCES = ("Sales Invoice", "Purchase Invoice", "Purchase Order", "Item", "Item Group")
+
+# Tables a KPI can be measured over. KPIs on the same source and window are
+# aggregated together by a single statement. A source with an `sku_column`
+# only counts the SKU items (see erpera_reports.items.sku_items).
+KPI_SOURCES = {
+    "Sales Invoice": frappe._dict(
+        table="`tabSales Invoice`",
+        date_field="posting_date",
+        company_field="company",
+        conditions=" AND docstatus = 1"
+    ),
+    "Sales Invoice Item": frappe._dict(
+        table="""`tabSales Invoice Item` sii
+            INNER JOIN `tabSales Invoice` si ON si.name = sii.parent""",
+        date_field="si.posting_date",
+        company_field="si.company",
+        conditions=" AND si.docstatus = 1",
+        sku_column="sii.item_code"
+    ),
+    "Purchase Invoice": frappe._dict(
+        table="`tabPurchase Invoice`",
+        date_field="posting_date",
+        company_field="company",
+        conditions=" AND docstatus = 1"
+    ),
+    "Purchase Order": frappe._dict(
+        table="`tabPurchase Order`",
+        date_field="transaction_date",
+        company_field="company",
+        conditions=" AND docstatus = 1"
+    )
+}
+
+
+def kpi(source=None, aggregate=None, expr=None, compare=True, top=None, derive=None, depends=(), sketch=None):
+    """
+    Declare a KPI:
+    - a measure: `aggregate` (see erpera_reports.comparison.AGGREGATES) of `expr` over `source`
+    - a leader: the `top` value with the highest `aggregate` of `expr`, for the current window only
+    - a derived value: `derive(values)` over the values of the `depends` KPIs
+    `compare=False` reports no change against the comparison window. A distinct
+    count with a `sketch` (see erpera_reports.sketches.DISTINCT_METRICS) is
+    read from the HyperLogLog sketches when they cover both windows.
+    """
+    return frappe._dict(
+        source=source,
+        aggregate=aggregate,
+        expr=expr,
+        compare=compare,
+        top=top,
+        derive=derive,
+        depends=tuple(depends),
+        sketch=sketch
+    )
+
+
+def get_avg_qty_per_sku(values):
+    return round(flt(values["sku_qty_sold"]) / max(flt(values["sku_count"]), 1), 2)
+
+
+def get_efficiency_ratio(values):
+    purchases = flt(values["purchase_amount"])
+    return round(flt(values["sales_amount"]) / purchases * 100, 1) if purchases > 0 else 0
+
+
+KPIS = {
+    # Sales Invoice
+    "sales_amount": kpi("Sales Invoice", "SUM", "grand_total"),
+    "sales_count": kpi("Sales Invoice", "COUNT", "name"),
+    "sales_avg_value": kpi("Sales Invoice", "AVG", "grand_total"),
+    "sales_unique_customers": kpi("Sales Invoice", "COUNT DISTINCT", "customer", sketch="customers"),
+    "sales_active_branches": kpi("Sales Invoice", "COUNT DISTINCT", "branch", compare=False),
+    # Sales Invoice Item
+    "sku_count": kpi("Sales Invoice Item", "COUNT DISTINCT", "sii.item_code", sketch="skus"),
+    "sku_qty_sold": kpi("Sales Invoice Item", "SUM", "sii.qty"),
+    "sku_sales_amount": kpi("Sales Invoice Item", "SUM", "sii.amount"),
+    "sku_top_qty": kpi("Sales Invoice Item", "SUM", "sii.qty", top="sii.item_code"),
+    "sku_avg_qty": kpi(derive=get_avg_qty_per_sku, depends=("sku_qty_sold", "sku_count")),
+    # Purchase Invoice
+    "purchase_amount": kpi("Purchase Invoice", "SUM", "grand_total"),
+    "purchase_count": kpi("Purchase Invoice", "COUNT", "name"),
+    "purchase_avg_value": kpi("Purchase Invoice", "AVG", "grand_total"),
+    "purchase_unique_suppliers": kpi("Purchase Invoice", "COUNT DISTINCT", "supplier", sketch="suppliers"),
+    "purchase_outstanding": kpi("Purchase Invoice", "SUM", "outstanding_amount"),
+    # Purchase Order
+    "order_count": kpi("Purchase Order", "COUNT", "name"),
+    "order_amount": kpi("Purchase Order", "SUM", "grand_total"),
+    # Across sources
+    "efficiency_ratio": kpi(derive=get_efficiency_ratio, depends=("sales_amount", "purchase_amount"))
+}
+
+# Number card sets: card key -> KPI, plus the window the cards are measured over.
+# `window` is "day" (filters.date) or "range" (filters.from_date/to_date,
+# defaulting to the last `default_months`).
+KPI_CARD_SETS = {
+    "branch_performance": frappe._dict(
+        window="range",
+        default_months=1,
+        cards={
+            "total_revenue": "sales_amount",
+            "total_invoices": "sales_count",
+            "avg_invoice_value": "sales_avg_value",
+            "unique_customers": "sales_unique_customers",
+            "active_branches": "sales_active_branches"
+        }
+    ),
+    "sku_performance": frappe._dict(
+        window="range",
+        default_months=1,
+        cards={
+            "total_skus": "sku_count",
+            "total_qty_sold": "sku_qty_sold",
+            "total_sales_amount": "sku_sales_amount",
+            "top_sku_qty": "sku_top_qty",
+            "avg_qty_per_sku": "sku_avg_qty"
+        }
+    ),
+    "purchase_sales": frappe._dict(
+        window="range",
+        default_months=3,
+        cards={
+            "total_purchases": "purchase_amount",
+            "total_sales": "sales_amount",
+            "purchase_count": "purchase_count",
+            "sales_count": "sales_count",
+            "efficiency_ratio": "efficiency_ratio"
+        }
+    ),
+    "daily_sales": frappe._dict(
+        window="day",
+        cards={
+            "total_sales": "sales_amount",
+            "total_invoices": "sales_count",
+            "avg_invoice_value": "sales_avg_value",
+            "unique_customers": "sales_unique_customers",
+            "active_branches": "sales_active_branches"
+        }
+    ),
+    "purchase": frappe._dict(
+        window="range",
+        default_months=1,
+        cards={
+            "total_amount": "purchase_amount",
+            "total_invoices": "purchase_count",
+            "avg_invoice_value": "purchase_avg_value",
+            "unique_suppliers": "purchase_unique_suppliers",
+            "total_outstanding": "purchase_outstanding",
+            "total_orders": "order_count"
+        }
+    )
+}
+
+
+def get_card_set_windows(card_set, filters):
+    if card_set.window == "day":
+        date = filters.get("date") or today()
+        return get_windows_from_filters(filters, date, date)
+    from_date = filters.get("from_date") or add_months(today(), -card_set.default_months)
+    to_date = filters.get("to_date") or today()
+    return get_windows_from_filters(filters, from_date, to_date)
+
+
+def get_base_kpis(name):
+    """The stored measures a KPI needs, following derived KPIs down to their inputs."""
+    definition = KPIS[name]
+    if not definition.derive:
+        return [name]
+    return [base for dependency in definition.depends for base in get_base_kpis(dependency)]
+
+
+def get_kpi_card_sets(names, filters=None):
+    """
+    Card values for the given card sets. Every set's KPIs are planned together:
+    measures sharing a source and window are computed by one statement, whichever
+    sets asked for them.
+    """
+    if isinstance(filters, str):
+        filters = json.loads(filters)
+    filters = filters or {}
+
+    values = {"company": filters.get("company")}
+    conditions = {}
+    for source_name, source in KPI_SOURCES.items():
+        conditions[source_name] = source.conditions
+        if source.sku_column:
+            conditions[source_name] += f" AND {sku_items(source.sku_column)}"
+        if filters.get("company"):
+            conditions[source_name] += f" AND {source.company_field} = %(company)s"
+
+    # Plan: (source, windows) -> measures
+    plan = {}
+    set_windows = {}
+    for set_name in names:
+        card_set = KPI_CARD_SETS.get(set_name)
+        if not card_set:
+            frappe.throw(_("Unknown KPI card set {0}").format(set_name))
+        windows = set_windows[set_name] = get_card_set_windows(card_set, filters)
+        window_key = (windows.current, windows.previous)
+        for kpi_name in card_set.cards.values():
+            for base in get_base_kpis(kpi_name):
+                plan.setdefault((KPIS[base].source, window_key), {})[base] = KPIS[base]
+
+    # Execute: distinct counts from the sketches where they cover the windows, then
+    # one aggregate statement per (source, window), plus one per leader KPI
+    results = {}
+    for (source_name, window_key), measures in plan.items():
+        source = KPI_SOURCES[source_name]
+        windows = frappe._dict(current=window_key[0], previous=window_key[1])
+        computed = results.setdefault(window_key, {})
+        for name, measure in measures.items():
+            if measure.sketch:
+                comparison = get_distinct_comparison(measure.sketch, windows, company=filters.get("company"))
+                if comparison:
+                    computed[name] = comparison
+        aggregates = {
+            name: (m.aggregate, m.expr)
+            for name, m in measures.items()
+            if not m.top and name not in computed
+        }
+        if aggregates:
+            computed.update(compare_totals(
+                source.table,
+                aggregates,
+                windows,
+                date_field=source.date_field,
+                conditions=conditions[source_name],
+                values=values
+            ))
+        for name, measure in measures.items():
+            if measure.top:
+                computed[name] = get_top_kpi(source, measure, windows, conditions[source_name], values)
+
+    response = {}
+    for set_name in names:
+        windows = set_windows[set_name]
+        computed = results.get((windows.current, windows.previous), {})
+        response[set_name] = {
+            card: get_card(KPIS[kpi_name], kpi_name, computed)
+            for card, kpi_name in KPI_CARD_SETS[set_name].cards.items()
+        }
+    return response
+
+
+def get_top_kpi(source, measure, windows, conditions, values):
+    """Leader in the current window, e.g. the best selling item and its quantity."""
+    top = frappe.db.sql(f"""
+        SELECT
+            {measure.top} AS entity,
+            {measure.aggregate}({measure.expr}) AS value
+        FROM {source.table}
+        WHERE {source.date_field} BETWEEN %(current_from)s AND %(current_to)s
+        {conditions}
+        GROUP BY {measure.top}
+        ORDER BY value DESC
+        LIMIT 1
+    """, dict(values, current_from=windows.current[0], current_to=windows.current[1]), as_dict=True)
+
+    comparison = get_comparison(top[0].value if top else 0, 0)
+    comparison.entity = top[0].entity if top else None
+    return comparison
+
+
+def get_card(definition, name, computed):
+    if definition.derive:
+        current = {base: computed[base].value for base in definition.depends}
+        previous = {base: computed[base].previous for base in definition.depends}
+        comparison = get_comparison(definition.derive(current), definition.derive(previous))
+    else:
+        comparison = computed[name]
+
+    card = {
+        "value": comparison.value,
+        "change": comparison.change if definition.compare and not definition.top else 0
+    }
+    if definition.top:
+        card["item_code"] = comparison.entity or "N/A"
+    return card
+
+
+def get_kpi_card_set(name, filters=None):
+    return get_kpi_card_sets([name], filters)[name]
+
+
+@frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="light")
+def get_kpi_cards(card_sets, filters=None):
+    """All requested number card sets in one call, e.g. card_sets=["branch_performance", "purchase"]."""
+    if isinstance(card_sets, str):
+        card_sets = json.loads(card_sets)
+    try:
+        return {"success": True, "card_sets": get_kpi_card_sets(card_sets, filters)}
+    except Exception as e:
+        frappe.log_error(f"Error in get_kpi_cards: {str(e)}")
+        return {"success": False, "error": str(e)}
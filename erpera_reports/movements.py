@@ -0,0 +1,286 @@
+import hashlib
+import json
+
+import frappe
+from frappe.utils import add_months, cint, flt, get_first_day, get_last_day, getdate, now, today
+
+from erpera_reports.items import get_excluded_item_groups, items_in_group, reportable_items
+from erpera_reports.rollup import split_whole_months
+from erpera_reports.trees import item_group_condition
+
+# Months re-read from the ledger every night, for valuations reposted after
+# the movements were posted
+REFRESH_MONTHS = 2
+
+MOVEMENT_FIELDS = ("qty_in", "qty_out", "value_in", "value_out")
+
+# Queue of the per-voucher summary updates, which are small and frequent
+MOVEMENT_QUEUE = "short"
+
+
+def get_movement_name(company, warehouse, item_group, month):
+    key = f"{company}\n{warehouse}\n{item_group}\n{getdate(month)}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def add_movement(company, warehouse, item_group, month, movement):
+    """Add in/out quantities and values to a month's summary row, creating it first."""
+    month = get_first_day(month)
+    timestamp = now()
+    frappe.db.sql("""
+        INSERT INTO `tabStock Movement Summary`
+            (name, creation, modified, owner, modified_by, docstatus, idx,
+            month, company, warehouse, item_group, qty_in, qty_out, value_in, value_out)
+        VALUES
+            (%(name)s, %(timestamp)s, %(timestamp)s, 'Administrator', 'Administrator', 0, 0,
+            %(month)s, %(company)s, %(warehouse)s, %(item_group)s, %(qty_in)s, %(qty_out)s, %(value_in)s, %(value_out)s)
+        ON DUPLICATE KEY UPDATE
+            qty_in = qty_in + VALUES(qty_in),
+            qty_out = qty_out + VALUES(qty_out),
+            value_in = value_in + VALUES(value_in),
+            value_out = value_out + VALUES(value_out),
+            modified = VALUES(modified)
+    """, dict(
+        movement,
+        name=get_movement_name(company, warehouse, item_group, month),
+        timestamp=timestamp,
+        month=month,
+        company=company,
+        warehouse=warehouse,
+        item_group=item_group
+    ))
+
+
+def update_stock_movement(doc, method=None):
+    """
+    doc_events hook on Stock Ledger Entry: queue the voucher's summary rows
+    for an update once the submit or cancel commits, one job per voucher
+    rather than a row upsert per entry inside the stock transaction.
+
+    Cancelling a voucher flags its entries as cancelled and posts reversals,
+    themselves flagged, so a flagged entry queues a recount instead.
+    """
+    cancel = cint(doc.is_cancelled)
+    queued = frappe.flags.setdefault("erpera_queued_movements", set())
+    if (doc.voucher_type, doc.voucher_no, cancel) in queued:
+        return
+    queued.add((doc.voucher_type, doc.voucher_no, cancel))
+    frappe.enqueue(
+        "erpera_reports.movements.update_voucher_movements",
+        queue=MOVEMENT_QUEUE,
+        enqueue_after_commit=True,
+        voucher_type=doc.voucher_type,
+        voucher_no=doc.voucher_no,
+        cancel=cancel
+    )
+
+
+def update_voucher_movements(voucher_type, voucher_no, cancel=0):
+    """
+    Background job: add a committed voucher's ledger entries to their summary
+    rows, or recount the rows it touched (`cancel`). Rows are written in name
+    order, so concurrent jobs lock shared rows in the same order.
+    """
+    values = {"voucher_type": voucher_type, "voucher_no": voucher_no}
+    voucher_condition = " AND sle.voucher_type = %(voucher_type)s AND sle.voucher_no = %(voucher_no)s"
+    if not cint(cancel):
+        # The entries are read back as stored: once cancelled, none are left to add
+        rows = get_ledger_movements(voucher_condition, values)
+        for row in sorted(rows, key=get_row_name):
+            add_movement(row.company, row.warehouse, row.item_group, row.month, row)
+        return
+
+    rows = frappe.db.sql(f"""
+        SELECT DISTINCT
+            sle.company,
+            sle.warehouse,
+            i.item_group,
+            DATE_FORMAT(sle.posting_date, '%%Y-%%m-01') AS month
+        FROM `tabStock Ledger Entry` sle
+        LEFT JOIN `tabItem` i ON i.name = sle.item_code
+        WHERE 1 = 1
+        {voucher_condition}
+    """, values, as_dict=True)
+    for row in sorted(rows, key=get_row_name):
+        recount_movement(row.company, row.warehouse, row.item_group, row.month)
+
+
+def get_row_name(row):
+    return get_movement_name(row.company, row.warehouse, row.item_group, row.month)
+
+
+def recount_movement(company, warehouse, item_group, month):
+    """Replace a summary row with its movements recounted from the ledger."""
+    month = get_first_day(month)
+    frappe.db.delete("Stock Movement Summary", {"name": get_movement_name(company, warehouse, item_group, month)})
+    rows = get_ledger_movements(
+        " AND sle.company = %(company)s AND sle.warehouse = %(warehouse)s AND i.item_group <=> %(item_group)s"
+        " AND sle.posting_date BETWEEN %(from_date)s AND %(to_date)s",
+        {
+            "company": company,
+            "warehouse": warehouse,
+            "item_group": item_group,
+            "from_date": month,
+            "to_date": get_last_day(month)
+        }
+    )
+    for row in rows:
+        add_movement(row.company, row.warehouse, row.item_group, row.month, row)
+
+
+def get_ledger_movements(conditions, values):
+    """In/out quantities and values of the submitted ledger entries per company, warehouse, item group and month."""
+    return frappe.db.sql(f"""
+        SELECT
+            sle.company,
+            sle.warehouse,
+            i.item_group,
+            DATE_FORMAT(sle.posting_date, '%%Y-%%m-01') AS month,
+            SUM(CASE WHEN sle.actual_qty > 0 THEN sle.actual_qty ELSE 0 END) AS qty_in,
+            SUM(CASE WHEN sle.actual_qty < 0 THEN -sle.actual_qty ELSE 0 END) AS qty_out,
+            SUM(CASE WHEN sle.actual_qty > 0 THEN sle.stock_value_difference ELSE 0 END) AS value_in,
+            SUM(CASE WHEN sle.actual_qty < 0 THEN -sle.stock_value_difference ELSE 0 END) AS value_out
+        FROM `tabStock Ledger Entry` sle
+        LEFT JOIN `tabItem` i ON i.name = sle.item_code
+        WHERE sle.is_cancelled = 0
+        {conditions}
+        GROUP BY sle.company, sle.warehouse, i.item_group, DATE_FORMAT(sle.posting_date, '%%Y-%%m-01')
+    """, values, as_dict=True)
+
+
+def rebuild_stock_movements(from_date=None):
+    """
+    Rebuild the summary rows from the ledger, from the month of `from_date`
+    (default: all of it).
+    """
+    conditions, values = "", {}
+    if from_date:
+        values["from_date"] = get_first_day(from_date)
+        conditions = " AND sle.posting_date >= %(from_date)s"
+        frappe.db.delete("Stock Movement Summary", {"month": [">=", values["from_date"]]})
+    else:
+        frappe.db.delete("Stock Movement Summary")
+
+    timestamp = now()
+    rows = get_ledger_movements(conditions, values)
+    frappe.db.bulk_insert(
+        "Stock Movement Summary",
+        ("name", "creation", "modified", "owner", "modified_by", "month", "company", "warehouse", "item_group")
+        + MOVEMENT_FIELDS,
+        [
+            (
+                get_movement_name(row.company, row.warehouse, row.item_group, row.month),
+                timestamp, timestamp, "Administrator", "Administrator",
+                row.month, row.company, row.warehouse, row.item_group
+            ) + tuple(flt(row[field]) for field in MOVEMENT_FIELDS)
+            for row in rows
+        ]
+    )
+    frappe.db.commit()
+
+
+def refresh_recent_stock_movements():
+    """Scheduled: re-read the last REFRESH_MONTHS months from the ledger."""
+    rebuild_stock_movements(add_months(get_first_day(today()), -(REFRESH_MONTHS - 1)))
+
+
+def get_stock_movements(filters, reportable=True):
+    """
+    In/out quantities and values per company, warehouse and month ('%Y-%m'
+    as `sort_date`) for the stock report filters.
+
+    Whole months are read from the summary rows. The partial months at
+    either end of the date range, and any range filtered to one item, are
+    read from the ledger. `reportable` leaves out the excluded item groups.
+    """
+    if isinstance(filters, str):
+        filters = json.loads(filters)
+    filters = filters or {}
+
+    from_date = getdate(filters["from_date"]) if filters.get("from_date") else None
+    to_date = getdate(filters["to_date"]) if filters.get("to_date") else None
+    if filters.get("item"):
+        return merge_movements(get_filtered_ledger_movements(filters, from_date, to_date, reportable))
+
+    whole, partial = split_whole_months(from_date, to_date)
+    rows = get_summary_movements(filters, *whole, reportable) if whole else []
+    for start, end in partial:
+        rows += get_filtered_ledger_movements(filters, start, end, reportable)
+    return merge_movements(rows)
+
+
+def get_summary_movements(filters, from_date, to_date, reportable):
+    conditions, values = [], {}
+    if from_date:
+        conditions.append("month >= %(from_date)s")
+        values["from_date"] = from_date
+    if to_date:
+        conditions.append("month <= %(to_date)s")
+        values["to_date"] = to_date
+    if filters.get("company"):
+        conditions.append("company = %(company)s")
+        values["company"] = filters["company"]
+    if filters.get("branch"):
+        conditions.append("LOWER(TRIM(warehouse)) = LOWER(TRIM(%(branch)s))")
+        values["branch"] = filters["branch"].strip()
+    elif filters.get("warehouse"):
+        conditions.append("warehouse = %(warehouse)s")
+        values["warehouse"] = filters["warehouse"]
+    if filters.get("item_group"):
+        conditions.append(item_group_condition("item_group", filters["item_group"]))
+        values["item_group"] = filters["item_group"]
+    if reportable:
+        conditions.append("(item_group IS NULL OR item_group NOT IN %(excluded_item_groups)s)")
+        values["excluded_item_groups"] = get_excluded_item_groups()
+
+    return frappe.db.sql(f"""
+        SELECT company, warehouse, month, SUM(qty_in) AS qty_in, SUM(qty_out) AS qty_out,
+            SUM(value_in) AS value_in, SUM(value_out) AS value_out
+        FROM `tabStock Movement Summary`
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        GROUP BY company, warehouse, month
+    """, values, as_dict=True)
+
+
+def get_filtered_ledger_movements(filters, from_date, to_date, reportable):
+    conditions, values = [], {}
+    if from_date:
+        conditions.append("sle.posting_date >= %(from_date)s")
+        values["from_date"] = from_date
+    if to_date:
+        conditions.append("sle.posting_date <= %(to_date)s")
+        values["to_date"] = to_date
+    if filters.get("item"):
+        conditions.append("sle.item_code = %(item)s")
+        values["item"] = filters["item"]
+    if filters.get("company"):
+        conditions.append("sle.company = %(company)s")
+        values["company"] = filters["company"]
+    if filters.get("branch"):
+        conditions.append("LOWER(TRIM(sle.warehouse)) = LOWER(TRIM(%(branch)s))")
+        values["branch"] = filters["branch"].strip()
+    elif filters.get("warehouse"):
+        conditions.append("sle.warehouse = %(warehouse)s")
+        values["warehouse"] = filters["warehouse"]
+    if filters.get("item_group"):
+        conditions.append(items_in_group("sle.item_code", filters["item_group"]))
+    if reportable:
+        conditions.append(reportable_items("sle.item_code"))
+
+    return get_ledger_movements("".join(f" AND {condition}" for condition in conditions), values)
+
+
+def merge_movements(rows):
+    """Rows summed per company, warehouse and month, sorted by them."""
+    merged = {}
+    for row in rows:
+        key = (row.company, row.warehouse, getdate(row.month).strftime("%Y-%m"))
+        entry = merged.setdefault(key, frappe._dict(
+            company=key[0],
+            warehouse=key[1],
+            sort_date=key[2],
+            **{field: 0 for field in MOVEMENT_FIELDS}
+        ))
+        for field in MOVEMENT_FIELDS:
+            entry[field] += flt(row[field])
+    return [merged[key] for key in sorted(merged, key=lambda key: tuple(str(part or "") for part in key))]
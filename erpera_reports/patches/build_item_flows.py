@@ -0,0 +1,5 @@
+from erpera_reports.flows import rebuild_item_flows
+
+
+def execute():
+    rebuild_item_flows()
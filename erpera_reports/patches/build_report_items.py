@@ -0,0 +1,5 @@
+from erpera_reports.items import rebuild_report_items
+
+
+def execute():
+    rebuild_report_items()
@@ -0,0 +1,5 @@
+from erpera_reports.sketches import rebuild_sketches
+
+
+def execute():
+    rebuild_sketches()
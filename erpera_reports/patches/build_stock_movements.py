@@ -0,0 +1,5 @@
+from erpera_reports.movements import rebuild_stock_movements
+
+
+def execute():
+    rebuild_stock_movements()
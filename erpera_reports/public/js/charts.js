@@ -0,0 +1,757 @@
+// Runtime of the bar, doughnut and multi-pie chart includes.
+// An include only renders its container and a JSON config
+// (<script type="application/json" class="erpera-chart-config">); every chart
+// on the page is created from its config by this one script.
+// Charts fetch their data only when they come within PREFETCH_MARGIN of the
+// viewport; a chart refreshed while off-screen reloads once it is scrolled to.
+// Every (re)load starts a new generation of its chart: the previous request is
+// aborted and only the latest generation's response is rendered.
+(function() {
+  const erperaReports = window.erperaReports = window.erperaReports || {};
+  const DEFAULT_COLOR = '#667eea';
+  const MONTH_LABEL = /^(Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s+\d{4}$/i;
+  const DRILL_DOWN_DEFAULTS = {
+    bar: { method: 'erpera_reports.api.get_buying_drill_down_data', title: 'Purchase Details' },
+    doughnut: { method: 'erpera_reports.api.get_selling_drill_down_data', title: 'Selling Details' },
+    multi_pie: { method: 'erpera_reports.api.get_buying_drill_down_data', title: 'Purchase Details' }
+  };
+
+  const PREFETCH_MARGIN = '300px 0px';
+  // Filter changes within this many ms are applied together
+  const FILTER_DEBOUNCE = 400;
+  // Bar charts ask for a background job (erpera_reports/jobs.py) only for heavy
+  // loads: a date range wider than this, or every company at once
+  const BACKGROUND_MIN_DAYS = 92;
+
+  const configs = {};
+  const instances = {};
+  // chart_id -> true while the chart is in (or near) the viewport
+  const visible = {};
+  // chart_id -> true when the chart's data has to be (re)loaded
+  const stale = {};
+  // chart_id -> AbortController / generation number of the latest load
+  const controllers = {};
+  const generations = {};
+  let observer = null;
+  let pendingRefresh = null;
+  let pendingNavigation = null;
+
+  // Query params as an object
+  function getQueryParams() {
+    const params = {};
+    window.location.search.replace(/[?&]+([^=&]+)=([^&]*)/gi, function(str, key, value) {
+      params[key] = value;
+    });
+    return params;
+  }
+
+  // Decode query param values (handles + and percent encoding)
+  function decodeQueryParam(val) {
+    return decodeURIComponent((val || '').replace(/\+/g, ' '));
+  }
+
+  // Every query param, decoded
+  function getQueryFilters() {
+    const raw = getQueryParams();
+    const filters = {};
+    Object.keys(raw).forEach(function(key) {
+      filters[key] = decodeQueryParam(raw[key]);
+    });
+    return filters;
+  }
+
+  // Only the query params the chart declares as filters
+  function getDeclaredFilters(config) {
+    const filters = {};
+    const urlParams = new URLSearchParams(window.location.search);
+    (config.filter_fields || []).forEach(function(fieldname) {
+      if (urlParams.has(fieldname)) {
+        filters[fieldname] = decodeQueryParam(urlParams.get(fieldname));
+      }
+    });
+    return filters;
+  }
+
+  // Filter values picked in a chart's own filter panel
+  function getControlFilters(chartId) {
+    const filters = {};
+    document.querySelectorAll('.filter-control-' + chartId).forEach(function(el) {
+      const fieldname = el.dataset.fieldname;
+      if (fieldname && el.value) {
+        filters[fieldname] = el.value;
+      }
+    });
+    return filters;
+  }
+
+  function formatDate(date) {
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    return date.getFullYear() + '-' + month + '-' + day;
+  }
+
+  // Legend entry of the hovered slice is highlighted; see hoverSlice()
+  function highlightLegendLabels(type) {
+    return function(chart) {
+      const labels = Chart.overrides[type].plugins.legend.labels.generateLabels(chart);
+      const hovered = chart.$_hoveredIndex;
+      return labels.map(function(label, idx) {
+        if (hovered === idx) {
+          return Object.assign({}, label, {
+            fontColor: '#1d4ed8',
+            fontStyle: 'bold',
+            fillStyle: label.fillStyle,
+            strokeStyle: label.strokeStyle,
+            lineWidth: label.lineWidth
+          });
+        }
+        return label;
+      });
+    };
+  }
+
+  // Pulls the hovered slice out of a doughnut or pie
+  function hoverSlice(evt, activeEls) {
+    const chart = this;
+    const dataset = chart.data.datasets[0];
+    if (!dataset._originalOffset) {
+      dataset._originalOffset = dataset.offset ? [...dataset.offset] : dataset.data.map(() => 0);
+    }
+    if (activeEls && activeEls.length > 0) {
+      const idx = activeEls[0].index;
+      dataset.offset = dataset.data.map((_, i) => i === idx ? 20 : 0);
+      chart.$_hoveredIndex = idx;
+    } else {
+      dataset.offset = [...dataset._originalOffset];
+      chart.$_hoveredIndex = null;
+    }
+    chart.update('none');
+  }
+
+  // Bar charts
+
+  function renderBar(config, labels, data, datasets, backgroundColor) {
+    if (instances[config.chart_id]) {
+      instances[config.chart_id].destroy();
+    }
+
+    // Multi-dataset mode when datasets are given, otherwise a single dataset from data
+    let chartData;
+    if (datasets && Array.isArray(datasets) && datasets.length > 0) {
+      chartData = { labels: labels, datasets: datasets };
+    } else {
+      chartData = {
+        labels: labels,
+        datasets: [{
+          label: config.title,
+          data: data,
+          backgroundColor: backgroundColor || config.backgroundColor || DEFAULT_COLOR,
+          borderRadius: 8,
+          barPercentage: 0.7,
+          categoryPercentage: 0.6
+        }]
+      };
+    }
+
+    instances[config.chart_id] = new Chart(document.getElementById(config.chart_id), {
+      type: config.chart_type || 'bar',
+      data: chartData,
+      options: {
+        plugins: {
+          legend: { display: chartData.datasets.length > 1 },
+          tooltip: {
+            backgroundColor: '#111827',
+            titleColor: '#fff',
+            bodyColor: '#fff',
+            borderColor: '#e5e7eb',
+            borderWidth: 1
+          }
+        },
+        scales: {
+          y: {
+            beginAtZero: true,
+            grid: { color: '#f3f4f6' },
+            ticks: { color: '#6b7280', font: { size: 13 } }
+          },
+          x: {
+            grid: { display: false },
+            ticks: { color: '#6b7280', font: { size: 13 } }
+          }
+        },
+        onClick: function(evt, elements) {
+          if (elements.length > 0) {
+            const idx = elements[0].index;
+            const dsIdx = elements[0].datasetIndex || 0;
+            showDrillDown(config, { label: this.data.labels[idx], value: this.data.datasets[dsIdx].data[idx] });
+          }
+        },
+        responsive: true,
+        maintainAspectRatio: false
+      }
+    });
+  }
+
+  function renderBarMessage(config, message) {
+    if (!message) {
+      return;
+    }
+    if (message.datasets) {
+      renderBar(config, message.labels, null, message.datasets);
+    } else {
+      renderBar(config, message.labels, message.data, null, message.backgroundColor);
+    }
+  }
+
+  // True when a chart load with these filters is worth running as a background job
+  function isHeavyLoad(filters) {
+    if (typeof filters === 'string') {
+      try {
+        filters = JSON.parse(filters);
+      } catch (e) {
+        return false;
+      }
+    }
+    filters = filters || {};
+    if (!filters.company) {
+      return true;
+    }
+    const from = Date.parse(filters.from_date);
+    const to = Date.parse(filters.to_date);
+    return !isNaN(from) && !isNaN(to) && (to - from) / 86400000 > BACKGROUND_MIN_DAYS;
+  }
+
+  function initBar(config, load) {
+    if (!config.data_url) {
+      // Static data passed via context
+      renderBar(config, config.labels, config.data, config.datasets, config.backgroundColor);
+      return;
+    }
+
+    let method = config.data_url;
+    const filters = config.filters || getQueryFilters();
+    let args = { filters: filters, compact: 1 };
+    if (isHeavyLoad(filters)) {
+      args.background = 1;
+    }
+    if (config.saved_report && !config.filters) {
+      // Saved report: open the precomputed snapshot instead of running the live query
+      method = 'erpera_reports.erpera_reports.doctype.custom_report.custom_report.get_snapshot';
+      args = { report: config.saved_report, compact: 1 };
+    }
+    erperaReports.call({
+      method: method,
+      args: args,
+      signal: load.signal,
+      slot: config.chart_id,
+      callback: function(r) {
+        if (load.isCurrent()) {
+          renderBarMessage(config, erperaReports.expandCompact(r.message));
+        }
+      }
+    });
+  }
+
+  // Doughnut charts
+
+  function renderDoughnut(config, labels, data, backgroundColor) {
+    if (instances[config.chart_id]) {
+      instances[config.chart_id].destroy();
+    }
+
+    instances[config.chart_id] = new Chart(document.getElementById(config.chart_id), {
+      type: 'doughnut',
+      data: {
+        labels: labels,
+        datasets: [{
+          data: data,
+          backgroundColor: backgroundColor || config.backgroundColor || DEFAULT_COLOR,
+          offset: data.map(() => 0)
+        }]
+      },
+      options: {
+        plugins: {
+          legend: {
+            position: 'left',
+            labels: {
+              boxWidth: 12,
+              padding: 8,
+              font: { size: 18 },
+              generateLabels: highlightLegendLabels('doughnut')
+            }
+          }
+        },
+        onClick: function(evt, elements) {
+          if (elements.length > 0) {
+            const idx = elements[0].index;
+            showDrillDown(config, { label: this.data.labels[idx], value: this.data.datasets[0].data[idx] });
+          }
+        },
+        onHover: hoverSlice,
+        responsive: true,
+        maintainAspectRatio: false
+      }
+    });
+  }
+
+  function initDoughnut(config, load) {
+    if (!config.data_url) {
+      renderDoughnut(config, config.labels, config.data, config.backgroundColor);
+      return;
+    }
+    erperaReports.call({
+      method: config.data_url,
+      args: { filters: config.filters || getDeclaredFilters(config), compact: 1 },
+      signal: load.signal,
+      slot: config.chart_id,
+      callback: function(r) {
+        const message = erperaReports.expandCompact(r.message);
+        if (message && load.isCurrent()) {
+          renderDoughnut(config, message.labels, message.data, message.backgroundColor);
+        }
+      }
+    });
+  }
+
+  // Multi-pie charts: one pie per entity
+
+  function renderMultiPie(config, datasets) {
+    const container = document.getElementById(config.chart_id + '_container');
+    if (!datasets || Object.keys(datasets).length === 0) {
+      container.innerHTML = '<div class="error-message">No data available</div>';
+      return;
+    }
+
+    (instances[config.chart_id] || []).forEach(chart => chart.destroy());
+    instances[config.chart_id] = [];
+
+    const gridContainer = document.createElement('div');
+    gridContainer.className = 'multi-pie-grid';
+    Object.keys(datasets).forEach((entityName, index) => {
+      const entityData = datasets[entityName];
+
+      const chartItem = document.createElement('div');
+      chartItem.className = 'pie-chart-item';
+      const title = document.createElement('div');
+      title.className = 'pie-chart-title';
+      title.textContent = entityName;
+      const total = document.createElement('div');
+      total.className = 'pie-chart-total';
+      total.textContent = `Total: ₹${entityData.total_amount.toLocaleString()}`;
+      const canvas = document.createElement('canvas');
+      canvas.id = config.chart_id + '_' + index;
+      canvas.className = 'pie-canvas';
+      chartItem.appendChild(title);
+      chartItem.appendChild(total);
+      chartItem.appendChild(canvas);
+      gridContainer.appendChild(chartItem);
+
+      instances[config.chart_id].push(new Chart(canvas, {
+        type: 'pie',
+        data: {
+          labels: entityData.labels,
+          datasets: [{
+            data: entityData.data,
+            backgroundColor: entityData.backgroundColor,
+            offset: entityData.data.map(() => 0)
+          }]
+        },
+        options: {
+          plugins: {
+            legend: {
+              position: 'left',
+              labels: {
+                boxWidth: 12,
+                padding: 8,
+                font: { size: 18 },
+                generateLabels: highlightLegendLabels('pie')
+              }
+            },
+            tooltip: {
+              callbacks: {
+                label: function(context) {
+                  const label = context.label || '';
+                  const value = context.parsed;
+                  const percentage = ((value / entityData.total_amount) * 100).toFixed(1);
+                  return `${label}: ₹${value.toLocaleString()} (${percentage}%)`;
+                }
+              }
+            }
+          },
+          onHover: hoverSlice,
+          onClick: function(evt, elements) {
+            if (elements.length > 0) {
+              const idx = elements[0].index;
+              showDrillDown(config, {
+                label: this.data.labels[idx],
+                value: this.data.datasets[0].data[idx],
+                entity: entityName
+              });
+            }
+          },
+          responsive: true,
+          maintainAspectRatio: false
+        }
+      }));
+    });
+    container.innerHTML = '';
+    container.appendChild(gridContainer);
+  }
+
+  function initMultiPie(config, load) {
+    const container = document.getElementById(config.chart_id + '_container');
+    container.innerHTML = '<div class="loading-spinner"><i class="fa fa-spinner fa-spin"></i> Loading charts...</div>';
+    erperaReports.call({
+      method: config.data_url,
+      args: { filters: config.filters || getDeclaredFilters(config), compact: 1 },
+      signal: load.signal,
+      slot: config.chart_id,
+      callback: function(r) {
+        if (!load.isCurrent()) {
+          return;
+        }
+        const message = erperaReports.expandCompact(r.message);
+        if (message && message.success) {
+          renderMultiPie(config, message.datasets);
+        } else {
+          container.innerHTML = '<div class="error-message">Error loading data: ' +
+            (message ? message.error || 'Unknown error' : 'No response') + '</div>';
+        }
+      },
+      error: function() {
+        if (load.isCurrent()) {
+          container.innerHTML = '<div class="error-message">Failed to load data</div>';
+        }
+      }
+    });
+  }
+
+  // Per-chart filter panel (bar charts with `filters`)
+
+  function toggleFilters(chartId) {
+    document.getElementById('filters_' + chartId).classList.toggle('filter-hidden');
+  }
+
+  function applyFilters(chartId) {
+    scheduleRefresh([chartId], Object.assign(getQueryFilters(), getControlFilters(chartId)));
+  }
+
+  function resetFilters(chartId) {
+    const now = new Date();
+    document.querySelectorAll('.filter-control-' + chartId).forEach(function(el) {
+      if (el.type === 'date') {
+        if (el.dataset.fieldname === 'from_date') {
+          el.value = formatDate(new Date(now.getFullYear(), now.getMonth(), 1));
+        } else if (el.dataset.fieldname === 'to_date') {
+          el.value = formatDate(now);
+        }
+      } else {
+        el.value = '';
+      }
+    });
+    applyFilters(chartId);
+  }
+
+  // Drill-down
+
+  // Drill filters of a bar or doughnut click, classified by the label and chart title
+  function getDrillDownFilters(config, label) {
+    const filters = getControlFilters(config.chart_id);
+    const titleLower = (config.title || '').toLowerCase();
+
+    if (MONTH_LABEL.test(label)) {
+      // Time period: the whole month
+      const [monthName, year] = label.split(' ');
+      const monthIndex = new Date(Date.parse(monthName + " 1, 2000")).getMonth();
+      filters['drill_type'] = 'time_period';
+      filters['drill_value'] = label;
+      filters['from_date'] = new Date(parseInt(year), monthIndex, 1).toISOString().split('T')[0];
+      filters['to_date'] = new Date(parseInt(year), monthIndex + 1, 0).toISOString().split('T')[0];
+    } else {
+      // Labels may carry their amount, e.g. "Branch (₹1,234)"
+      filters['drill_type'] = ['branch', 'company', 'supplier'].find(type => titleLower.includes(type)) || 'general';
+      filters['drill_value'] = label.split(' (₹')[0];
+    }
+
+    if (titleLower.includes('item')) {
+      filters['item'] = label;
+    }
+    if (titleLower.includes('sales snapshot')) {
+      filters['branch'] = label;
+    }
+    if (titleLower.includes('outstanding by supplier')) {
+      filters['supplier'] = label;
+    }
+    return filters;
+  }
+
+  // Drill filters of a multi-pie click; the pie's entity is passed along
+  function getPieDrillDownFilters(config, label, entity) {
+    const filters = getControlFilters(config.chart_id);
+    const titleLower = (config.title || '').toLowerCase();
+
+    if (titleLower.includes('product') || titleLower.includes('item')) {
+      filters['drill_type'] = 'item';
+    } else if (titleLower.includes('company')) {
+      filters['drill_type'] = 'company';
+    } else if (titleLower.includes('branch')) {
+      filters['drill_type'] = 'branch';
+    } else {
+      filters['drill_type'] = 'general';
+    }
+    filters['drill_value'] = label;
+    if (entity) {
+      filters['entity'] = entity;
+    }
+    return filters;
+  }
+
+  function showDrillDownError() {
+    frappe.msgprint({
+      title: 'Drill Down Error',
+      message: '<div style="text-align: center; padding: 20px; color: #dc2626;">Error loading drill-down data. Please try again.</div>',
+      wide: true,
+      indicator: 'red'
+    });
+  }
+
+  function formatCell(value) {
+    if (typeof value === 'number') {
+      return value > 1000 ? '₹' + value.toLocaleString() : value.toLocaleString();
+    }
+    if (value && typeof value === 'string' && value.includes('-')) {
+      // Might be a date
+      const date = new Date(value);
+      if (!isNaN(date.getTime())) {
+        return date.toLocaleDateString();
+      }
+    }
+    return value;
+  }
+
+  function buildDrillDownSummary(chartTitle, title, value, exportable) {
+    const exportButtons = exportable ? `
+          <span style="margin-left: auto; display: flex; gap: 8px;">
+            <button class="btn btn-xs btn-default" onclick="erperaReports.exportDrillDown('csv')">Export CSV</button>
+            <button class="btn btn-xs btn-default" onclick="erperaReports.exportDrillDown('xlsx')">Export XLSX</button>
+          </span>` : '';
+
+    return `
+      <div class="drill-down-summary">
+        <h4 style="margin: 0 0 10px 0; color: #374151; font-size: 1.1em;">${chartTitle}</h4>
+        <div style="display: flex; gap: 20px; flex-wrap: wrap;">
+          <span style="color: #6b7280; font-size: 0.9em;">
+            <strong style="color: #374151;">Total Amount:</strong> ₹${value.toLocaleString()}
+          </span>
+          <span style="color: #6b7280; font-size: 0.9em;">
+            <strong style="color: #374151;">Records:</strong> <span class="drill-down-record-count"></span>
+          </span>
+          <span style="color: #6b7280; font-size: 0.9em;">
+            <strong style="color: #374151;">Chart:</strong> ${title}
+          </span>${exportButtons}
+        </div>
+      </div>`;
+  }
+
+  // Summary plus a virtualized table (see virtual_table.js) of the drill-down rows
+  function showDrillDownTable(chartTitle, drillDownTitle, title, value, data, exportable) {
+    const tableId = 'drill-down-table-' + Date.now();
+    const dialog = frappe.msgprint({
+      title: drillDownTitle,
+      message: buildDrillDownSummary(chartTitle, title, value, exportable) + `<div id="${tableId}" class="drill-down-virtual-table"></div>`,
+      wide: true,
+      indicator: 'green'
+    });
+
+    const container = document.getElementById(tableId);
+    const recordCount = container.previousElementSibling.querySelector('.drill-down-record-count');
+    const table = new erperaReports.VirtualTable(container, data, {
+      format: formatCell,
+      onViewChange: function(shown, total) {
+        recordCount.textContent = shown === total ? total : `${shown} of ${total}`;
+      }
+    });
+    if (dialog && dialog.$wrapper) {
+      dialog.$wrapper.one('hidden.bs.modal', () => table.destroy());
+    }
+  }
+
+  // Drill-down of a clicked bar or slice, using the drill method of the chart that was clicked
+  function showDrillDown(config, clickData) {
+    const defaults = DRILL_DOWN_DEFAULTS[config.type] || DRILL_DOWN_DEFAULTS.bar;
+    const drillDownMethod = config.drill_down_method || defaults.method;
+    const drillDownTitle = config.drill_down_title || defaults.title;
+    const chartTitle = config.title;
+    const value = clickData.value;
+    const isPie = config.type === 'multi_pie';
+
+    let label = clickData.label;
+    let args;
+    if (isPie) {
+      // Pie labels carry their amount in parentheses
+      label = label.replace(/\s*\(.*\)$/, '').trim();
+      args = { filters: getPieDrillDownFilters(config, label, clickData.entity) };
+    } else {
+      const filters = getDrillDownFilters(config, label);
+      frappe.msgprint({ title: 'Drill Down', wide: true });
+      // Remembered so the modal's export buttons can stream the full result
+      erperaReports.lastDrillDown = {
+        method: drillDownMethod,
+        args: { filters: filters, chart_title: chartTitle, clicked_label: label }
+      };
+      args = { filters: filters, chart_title: chartTitle, clicked_label: label, clicked_value: value };
+    }
+
+    // Shared with any identical drill-down still loading or recently shown
+    erperaReports.call({
+      method: drillDownMethod,
+      args: args,
+      callback: function(r) {
+        if (!(r.message && r.message.success)) {
+          showDrillDownError();
+          return;
+        }
+
+        const data = r.message.data || [];
+        const title = r.message.title || `${drillDownTitle}: ${label}`;
+        if (data.length === 0) {
+          frappe.msgprint({
+            title: title,
+            message: '<div style="text-align: center; padding: 20px; color: #6c757d;">No detailed data found for this selection.</div>',
+            wide: true,
+            indicator: 'blue'
+          });
+          return;
+        }
+
+        showDrillDownTable(chartTitle, drillDownTitle, title, value, data, !isPie);
+      },
+      error: showDrillDownError
+    });
+  }
+
+  const RENDERERS = {
+    bar: initBar,
+    doughnut: initDoughnut,
+    multi_pie: initMultiPie
+  };
+
+  // Lazy loading
+
+  // A new generation of the chart; the previous one's request is aborted
+  function beginLoad(chartId) {
+    if (controllers[chartId]) {
+      controllers[chartId].abort();
+    }
+    const controller = controllers[chartId] = new AbortController();
+    const generation = generations[chartId] = (generations[chartId] || 0) + 1;
+    return {
+      signal: controller.signal,
+      isCurrent: function() {
+        return generations[chartId] === generation;
+      }
+    };
+  }
+
+  function loadChart(chartId) {
+    delete stale[chartId];
+    RENDERERS[configs[chartId].type](configs[chartId], beginLoad(chartId));
+  }
+
+  function getChartElement(config) {
+    return document.getElementById(config.type === 'multi_pie' ? config.chart_id + '_container' : config.chart_id);
+  }
+
+  function onIntersection(entries) {
+    entries.forEach(function(entry) {
+      const chartId = entry.target.dataset.chartId;
+      visible[chartId] = entry.isIntersecting;
+      if (entry.isIntersecting && stale[chartId]) {
+        loadChart(chartId);
+      }
+    });
+  }
+
+  // Reload charts (default: all) with new filters (default: their current ones).
+  // Visible charts reload now, the others when they are scrolled into view.
+  function refresh(chartIds, filters) {
+    (chartIds || Object.keys(configs)).forEach(function(chartId) {
+      const config = configs[chartId];
+      if (!config || !config.data_url) {
+        return;
+      }
+      if (filters) {
+        config.filters = filters;
+      }
+      stale[chartId] = true;
+      if (visible[chartId] || !observer) {
+        loadChart(chartId);
+      }
+    });
+  }
+
+  // refresh() once the filters have stopped changing for FILTER_DEBOUNCE ms
+  function scheduleRefresh(chartIds, filters) {
+    clearTimeout(pendingRefresh);
+    pendingRefresh = setTimeout(function() {
+      refresh(chartIds, filters);
+    }, FILTER_DEBOUNCE);
+  }
+
+  // Page filter panels reload the page with the new filters as query params.
+  // Quick successive changes (company, then date range) make one navigation;
+  // leaving the page cancels the charts' pending requests (see report_client.js).
+  function applyPageFilters(url) {
+    clearTimeout(pendingNavigation);
+    pendingNavigation = setTimeout(function() {
+      window.location.href = url.toString();
+    }, FILTER_DEBOUNCE);
+  }
+
+  function init() {
+    if (!observer && 'IntersectionObserver' in window) {
+      observer = new IntersectionObserver(onIntersection, { rootMargin: PREFETCH_MARGIN });
+    }
+    document.querySelectorAll('script.erpera-chart-config').forEach(function(el) {
+      const config = JSON.parse(el.textContent);
+      if (configs[config.chart_id] || !RENDERERS[config.type]) {
+        return;
+      }
+      configs[config.chart_id] = config;
+
+      const element = getChartElement(config);
+      if (!config.data_url || !observer || !element) {
+        // Static data costs no request; without an observer everything loads up front
+        loadChart(config.chart_id);
+        return;
+      }
+      stale[config.chart_id] = true;
+      element.dataset.chartId = config.chart_id;
+      observer.observe(element);
+    });
+  }
+
+  erperaReports.charts = {
+    configs: configs,
+    instances: instances,
+    init: init,
+    refresh: refresh,
+    scheduleRefresh: scheduleRefresh,
+    applyPageFilters: applyPageFilters,
+    toggleFilters: toggleFilters,
+    applyFilters: applyFilters,
+    resetFilters: resetFilters,
+    showDrillDown: showDrillDown,
+    getQueryParams: getQueryParams,
+    decodeQueryParam: decodeQueryParam
+  };
+
+  // Line, radar and polar charts drill down through the global showDrillDownModal;
+  // they are matched to a chart config by title, falling back to the bar defaults.
+  // Pages that define their own showDrillDownModal override this one.
+  window.showDrillDownModal = function(clickData, chartTitle) {
+    const config = Object.values(configs).find(c => c.title === chartTitle && c.type !== 'multi_pie');
+    showDrillDown(config || { type: 'bar', title: chartTitle, chart_id: '' }, clickData);
+  };
+
+  document.addEventListener('DOMContentLoaded', init);
+})();
@@ -0,0 +1,170 @@
+// Expands compact chart responses (see erpera_reports/compact.py) back into
+// the regular payload shape and restores static Chart.js options by schema id.
+(function() {
+  const erperaReports = window.erperaReports = window.erperaReports || {};
+
+  function currencyTick(value) {
+    return '₹' + value.toLocaleString();
+  }
+
+  function stackedInOutOptions(extra) {
+    return Object.assign({
+      scales: {
+        y: { beginAtZero: true, title: { display: true, text: 'Quantity' } }
+      },
+      plugins: {
+        tooltip: { mode: 'index', intersect: false },
+        legend: { display: true, position: 'top' }
+      }
+    }, extra || {});
+  }
+
+  const CHART_SCHEMAS = {
+    'stock.stacked_expiry': function() {
+      return {
+        scales: { x: { stacked: true }, y: { stacked: true } },
+        plugins: { tooltip: { mode: 'index', intersect: false } }
+      };
+    },
+    'stock.expired_items': function() {
+      return {
+        plugins: {
+          tooltip: {
+            callbacks: {
+              label: function(context) { return 'Expired Value: ₹' + context.parsed.y.toLocaleString(); },
+              afterLabel: function(context) { return context.chart.data.tooltipData ? context.chart.data.tooltipData[context.dataIndex] : ''; }
+            }
+          },
+          legend: { display: false }
+        },
+        scales: {
+          y: { beginAtZero: true, title: { display: true, text: 'Expired Stock Value (₹)' } },
+          x: { title: { display: true, text: 'Company - Warehouse' }, ticks: { maxRotation: 45, minRotation: 45 } }
+        }
+      };
+    },
+    'stock.in_out_branch': function() {
+      return stackedInOutOptions();
+    },
+    'stock.in_out_company': function() {
+      const options = stackedInOutOptions();
+      options.plugins.legend.labels = { usePointStyle: true };
+      options.plugins.tooltip.callbacks = {
+        footer: function(tooltipItems) {
+          let total = 0;
+          tooltipItems.forEach(function(item) { total += item.parsed.y; });
+          return 'Total: ' + total.toLocaleString();
+        }
+      };
+      return options;
+    },
+    'stock.in_out_consolidated': function() {
+      const options = stackedInOutOptions({ responsive: true, maintainAspectRatio: false });
+      options.scales.x = { title: { display: true, text: 'Month' } };
+      options.plugins.legend.labels = { usePointStyle: true, padding: 15 };
+      options.plugins.tooltip.callbacks = {
+        title: function(tooltipItems) { return tooltipItems[0].label; },
+        label: function(context) { return context.dataset.label + ': ' + context.parsed.y.toLocaleString(); },
+        footer: function(tooltipItems) {
+          let inTotal = 0;
+          let outTotal = 0;
+          tooltipItems.forEach(function(item) {
+            if (item.dataset.entity_type === 'in') inTotal += item.parsed.y;
+            else if (item.dataset.entity_type === 'out') outTotal += item.parsed.y;
+          });
+          return 'Total IN: ' + inTotal.toLocaleString() + '\nTotal OUT: ' + outTotal.toLocaleString() + '\nNet: ' + (inTotal - outTotal).toLocaleString();
+        }
+      };
+      return options;
+    },
+    'consolidated_total_amount': function(message) {
+      const grandTotal = (message.datasets || []).reduce(function(sum, ds) { return sum + (ds.entity_total || 0); }, 0);
+      return {
+        responsive: true,
+        plugins: {
+          title: { display: true, text: 'Total by Company/Branch (Grand Total: ₹' + Math.round(grandTotal).toLocaleString() + ')' },
+          legend: { display: true, position: 'right' }
+        },
+        scales: {
+          x: { title: { display: true, text: 'Month' } },
+          y: { title: { display: true, text: 'Amount (₹)' }, ticks: { callback: currencyTick } }
+        }
+      };
+    }
+  };
+
+  function decodeBase64(b64) {
+    const binary = atob(b64);
+    const bytes = new Uint8Array(binary.length);
+    for (let i = 0; i < binary.length; i++) {
+      bytes[i] = binary.charCodeAt(i);
+    }
+    return new DataView(bytes.buffer);
+  }
+
+  function decodeNumbers(node) {
+    const view = decodeBase64(node.b);
+    const width = node.$ === 'i4' ? 4 : 8;
+    const count = view.byteLength / width;
+    const values = new Float64Array(count);
+    if (node.$ === 'i4') {
+      const factor = Math.pow(10, node.s || 0);
+      for (let i = 0; i < count; i++) {
+        values[i] = view.getInt32(i * 4, true) / factor;
+      }
+    } else {
+      for (let i = 0; i < count; i++) {
+        values[i] = view.getFloat64(i * 8, true);
+      }
+    }
+    // Chart.js instruments its data arrays, so hand it a plain Array
+    return Array.from(values);
+  }
+
+  function decode(node, strings) {
+    if (Array.isArray(node)) {
+      return node.map(function(item) { return decode(item, strings); });
+    }
+    if (!node || typeof node !== 'object') {
+      return node;
+    }
+    switch (node.$) {
+      case 'i4':
+      case 'f8':
+        return decodeNumbers(node);
+      case 's':
+        return node.i.map(function(i) { return strings[i]; });
+      case 't': {
+        const columns = node.c.map(function(column) { return decode(column, strings); });
+        const rowCount = columns.length ? columns[0].length : 0;
+        const rows = [];
+        for (let r = 0; r < rowCount; r++) {
+          const row = {};
+          node.k.forEach(function(key, k) { row[key] = columns[k][r]; });
+          rows.push(row);
+        }
+        return rows;
+      }
+    }
+    const result = {};
+    Object.keys(node).forEach(function(key) { result[key] = decode(node[key], strings); });
+    return result;
+  }
+
+  function expandCompact(message) {
+    if (!message || !message.compact) {
+      return message;
+    }
+    const expanded = decode(message.body, message.strings || []);
+    const factory = CHART_SCHEMAS[message.schema];
+    if (factory) {
+      (message.omitted || []).forEach(function(key) {
+        expanded[key] = factory(expanded);
+      });
+    }
+    return expanded;
+  }
+
+  erperaReports.CHART_SCHEMAS = CHART_SCHEMAS;
+  erperaReports.expandCompact = expandCompact;
+})();
@@ -0,0 +1,359 @@
+// Thin wrapper around /api/method calls for report endpoints.
+// Remembers the last ETag per method + args in sessionStorage and sends it as
+// If-None-Match, so an unchanged report is answered with 304 and reused.
+// Within a page, identical calls (same method and canonical args) share one
+// request while it is in flight, and its response for MEMORY_TTL afterwards.
+// A caller passing opts.signal (AbortController) stops waiting when it is
+// aborted; the request itself is cancelled once no caller waits for it.
+// Requests carry an id (and opts.slot, e.g. the chart id) so the server can
+// kill the query of a cancelled or superseded request
+// (erpera_reports/cancellation.py); see cancelRequests().
+(function() {
+  const erperaReports = window.erperaReports = window.erperaReports || {};
+  const STORAGE_PREFIX = 'erpera_reports:';
+  const JOB_POLL_INTERVAL = 2000;
+  // Times a call turned away by admission control (429) is retried after its Retry-After
+  const THROTTLE_RETRIES = 3;
+  const MEMORY_TTL = 60 * 1000;
+  const CANCEL_METHOD = 'erpera_reports.cancellation.cancel_report_requests';
+
+  // cache key -> { promise, controller, waiters } of a pending request
+  const inFlight = {};
+  // cache key -> { expires, body } of a recent response
+  const memory = {};
+  // slot -> latest request started for it
+  const slotRequests = {};
+
+  // Objects with sorted keys and without empty values, so equal filters serialize equally
+  function canonicalize(value) {
+    if (Array.isArray(value)) {
+      return value.map(canonicalize);
+    }
+    if (value && typeof value === 'object') {
+      const canonical = {};
+      Object.keys(value).sort().forEach(function(key) {
+        if (value[key] !== undefined && value[key] !== null && value[key] !== '') {
+          canonical[key] = canonicalize(value[key]);
+        }
+      });
+      return canonical;
+    }
+    return value;
+  }
+
+  function serializeArgs(args) {
+    const params = new URLSearchParams();
+    Object.keys(args || {}).forEach(function(key) {
+      let value = args[key];
+      if (value === undefined || value === null) {
+        return;
+      }
+      if (typeof value === 'object') {
+        value = JSON.stringify(canonicalize(value));
+      }
+      params.append(key, value);
+    });
+    return params;
+  }
+
+  function getCacheKey(method, params) {
+    return STORAGE_PREFIX + method + '?' + params.toString();
+  }
+
+  function readCache(key) {
+    try {
+      return JSON.parse(sessionStorage.getItem(key));
+    } catch (e) {
+      return null;
+    }
+  }
+
+  function writeCache(key, etag, message) {
+    try {
+      sessionStorage.setItem(key, JSON.stringify({ etag: etag, message: message }));
+    } catch (e) {
+      // Storage full or unavailable; conditional requests simply stop for this key
+    }
+  }
+
+  // Every caller gets its own copy; Chart.js mutates the datasets it is given
+  function clone(body) {
+    return JSON.parse(body);
+  }
+
+  function isAbort(err) {
+    return err && err.name === 'AbortError';
+  }
+
+  function newRequestId() {
+    if (window.crypto && crypto.randomUUID) {
+      return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+  }
+
+  function startRequest(opts, params, cacheKey) {
+    const controller = new AbortController();
+    const entry = { controller: controller, waiters: 0, requestId: newRequestId(), slot: opts.slot, done: false };
+    const requestHeaders = { 'X-Report-Request-Id': entry.requestId };
+    if (opts.slot) {
+      // The server kills the slot's previous query when this request arrives,
+      // unless another slot still waits for that query too
+      const previous = slotRequests[opts.slot];
+      if (!(previous && previous.shared && !previous.done)) {
+        requestHeaders['X-Report-Slot'] = opts.slot;
+      }
+      slotRequests[opts.slot] = entry;
+    }
+
+    entry.promise = fetchMethod(opts, params, cacheKey, controller.signal, requestHeaders).then(function(r) {
+      const body = JSON.stringify(r);
+      memory[cacheKey] = { expires: Date.now() + MEMORY_TTL, body: body };
+      return body;
+    }).finally(function() {
+      entry.done = true;
+      if (inFlight[cacheKey] === entry) {
+        delete inFlight[cacheKey];
+      }
+    });
+    inFlight[cacheKey] = entry;
+    return entry;
+  }
+
+  // Kill the server-side queries of abandoned requests. `beacon` is for page
+  // unload, when a regular request would be cut off.
+  function cancelRequests(requestIds, beacon) {
+    if (!requestIds.length) {
+      return;
+    }
+    if (beacon && navigator.sendBeacon) {
+      const data = new FormData();
+      data.append('request_ids', JSON.stringify(requestIds));
+      data.append('csrf_token', frappe.csrf_token);
+      navigator.sendBeacon('/api/method/' + CANCEL_METHOD, data);
+      return;
+    }
+    postMethod(CANCEL_METHOD, { request_ids: requestIds }).catch(function() {
+      // Best effort; the query simply runs to completion
+    });
+  }
+
+  // Wait for a shared request until `signal` aborts; the last waiter to leave cancels it
+  function joinRequest(entry, cacheKey, opts) {
+    const signal = opts.signal;
+    entry.waiters += 1;
+    if (opts.slot !== entry.slot) {
+      entry.shared = true;
+    }
+    if (!signal) {
+      return entry.promise;
+    }
+    return new Promise(function(resolve, reject) {
+      function leave() {
+        entry.waiters -= 1;
+        if (entry.waiters === 0) {
+          if (inFlight[cacheKey] === entry) {
+            delete inFlight[cacheKey];
+          }
+          entry.controller.abort();
+          if (!entry.done) {
+            cancelRequests([entry.requestId]);
+          }
+        }
+        reject(new DOMException('Superseded report call', 'AbortError'));
+      }
+      if (signal.aborted) {
+        leave();
+        return;
+      }
+      signal.addEventListener('abort', leave, { once: true });
+      entry.promise.then(resolve, reject).finally(function() {
+        signal.removeEventListener('abort', leave);
+      });
+    });
+  }
+
+  // opts.cache = false skips the page memory (in-flight requests are still shared)
+  function call(opts) {
+    const params = serializeArgs(opts.args);
+    const cacheKey = getCacheKey(opts.method, params);
+
+    let request;
+    const remembered = memory[cacheKey];
+    if (opts.cache !== false && remembered && remembered.expires > Date.now()) {
+      request = Promise.resolve(remembered.body);
+    } else {
+      request = joinRequest(inFlight[cacheKey] || startRequest(opts, params, cacheKey), cacheKey, opts);
+    }
+
+    return request.then(clone).then(function(r) {
+      if (opts.callback) {
+        opts.callback(r);
+      }
+      return r;
+    }).catch(function(err) {
+      if (isAbort(err)) {
+        // Superseded: the caller has moved on, nothing to report
+        return;
+      }
+      if (opts.error) {
+        opts.error(err);
+      } else {
+        console.error('Report call failed: ' + opts.method, err);
+      }
+    });
+  }
+
+  // Resolves after `ms`, or rejects with an AbortError once `signal` aborts
+  function delay(ms, signal) {
+    return new Promise(function(resolve, reject) {
+      const timer = setTimeout(resolve, ms);
+      if (signal) {
+        signal.addEventListener('abort', function() {
+          clearTimeout(timer);
+          reject(new DOMException('Superseded report call', 'AbortError'));
+        }, { once: true });
+      }
+    });
+  }
+
+  function fetchMethod(opts, params, cacheKey, signal, requestHeaders, attempt) {
+    attempt = attempt || 0;
+    const cached = readCache(cacheKey);
+    const headers = Object.assign({
+      'Accept': 'application/json',
+      'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+      'X-Frappe-CSRF-Token': frappe.csrf_token
+    }, requestHeaders);
+    if (cached && cached.etag) {
+      headers['If-None-Match'] = cached.etag;
+    }
+
+    return fetch('/api/method/' + opts.method, {
+      method: 'POST',
+      headers: headers,
+      body: params,
+      credentials: 'same-origin',
+      signal: signal
+    }).then(function(response) {
+      if (response.status === 304 && cached) {
+        return { message: cached.message };
+      }
+      if (response.status === 429 && attempt < THROTTLE_RETRIES) {
+        // Turned away by admission control (erpera_reports/admission.py); try again when told to
+        const retryAfter = parseInt(response.headers.get('Retry-After'), 10) || 5;
+        return delay(retryAfter * 1000, signal).then(function() {
+          return fetchMethod(opts, params, cacheKey, signal, requestHeaders, attempt + 1);
+        });
+      }
+      if (!response.ok) {
+        throw new Error(response.status + ' ' + response.statusText);
+      }
+      return response.json().then(function(r) {
+        const etag = response.headers.get('ETag');
+        if (r.message && r.message.background && r.message.job_id) {
+          // Heavy report queued on the server; wait for the job and cache its payload instead
+          return waitForJob(r.message.job_id, opts, signal).then(function(message) {
+            if (etag) {
+              writeCache(cacheKey, etag, message);
+            }
+            return { message: message };
+          });
+        }
+        if (etag) {
+          writeCache(cacheKey, etag, r.message);
+        }
+        return r;
+      });
+    });
+  }
+
+  function postMethod(method, args, signal) {
+    return fetch('/api/method/' + method, {
+      method: 'POST',
+      headers: {
+        'Accept': 'application/json',
+        'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8',
+        'X-Frappe-CSRF-Token': frappe.csrf_token
+      },
+      body: serializeArgs(args),
+      credentials: 'same-origin',
+      signal: signal
+    }).then(function(response) {
+      if (!response.ok) {
+        throw new Error(response.status + ' ' + response.statusText);
+      }
+      return response.json();
+    });
+  }
+
+  // Poll erpera_reports.jobs.get_report_job until the job finishes; resolves with the report payload
+  function waitForJob(jobId, opts, signal) {
+    const compact = (opts.args || {}).compact || 0;
+    return new Promise(function(resolve, reject) {
+      function poll() {
+        if (signal && signal.aborted) {
+          reject(new DOMException('Superseded report call', 'AbortError'));
+          return;
+        }
+        postMethod('erpera_reports.jobs.get_report_job', { job_id: jobId, compact: compact }, signal).then(function(r) {
+          const job = r.message || {};
+          if (opts.progress) {
+            opts.progress(job);
+          }
+          if (job.status === 'finished') {
+            resolve(job.result);
+          } else if (job.status === 'failed' || job.status === 'expired') {
+            reject(new Error(job.error || ('Report job ' + job.status)));
+          } else {
+            setTimeout(poll, JOB_POLL_INTERVAL);
+          }
+        }).catch(reject);
+      }
+      poll();
+    });
+  }
+
+  // Drill-down export: `get_<x>_drill_down_data` has a streaming `export_<x>_drill_down_data`
+  // counterpart. A plain GET navigation lets the browser save the chunked
+  // response straight to disk.
+  function exportDrillDown(fileFormat) {
+    const drill = erperaReports.lastDrillDown;
+    if (!drill) {
+      return;
+    }
+    const method = drill.method.replace(/\.get_(\w+_drill_down_data)$/, '.export_$1');
+    const params = serializeArgs(Object.assign({}, drill.args, { file_format: fileFormat }));
+    window.location.href = '/api/method/' + method + '?' + params.toString();
+  }
+
+  // Modal breakdowns are fetched the first time a modal opens and kept for the
+  // page's lifetime; the page filters come from the URL like in get_context
+  const modalDetails = {};
+
+  function getModalDetails(method, args) {
+    const pageArgs = Object.fromEntries(new URLSearchParams(window.location.search));
+    const callArgs = Object.assign(pageArgs, args);
+    const key = method + '?' + serializeArgs(callArgs).toString();
+    if (!modalDetails[key]) {
+      modalDetails[key] = call({ method: method, args: callArgs }).then(function(r) {
+        if (!r) {
+          // Failed; let the next open retry
+          delete modalDetails[key];
+        }
+        return (r && r.message) || [];
+      });
+    }
+    return modalDetails[key];
+  }
+
+  // Closing the tab or navigating away abandons every pending report
+  window.addEventListener('pagehide', function() {
+    cancelRequests(Object.keys(inFlight).map(key => inFlight[key].requestId), true);
+  });
+
+  erperaReports.call = call;
+  erperaReports.cancelRequests = cancelRequests;
+  erperaReports.exportDrillDown = exportDrillDown;
+  erperaReports.getModalDetails = getModalDetails;
+})();
@@ -0,0 +1,234 @@
+// Virtualized table for large drill-down results.
+// Only the rows in (or just around) the viewport exist in the DOM; the row
+// nodes are reused while scrolling. Numeric columns are kept in typed arrays,
+// and sorting/filtering reorder a Uint32Array of row indices instead of the
+// rows themselves.
+(function() {
+  const erperaReports = window.erperaReports = window.erperaReports || {};
+  const ROW_HEIGHT = 36;
+  // Rows rendered above and below the visible window
+  const OVERSCAN = 8;
+  const SEARCH_DEBOUNCE = 150;
+
+  function toHeader(key) {
+    return key.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase());
+  }
+
+  // Column-wise copy of the rows: Float64Array for numeric columns, arrays otherwise
+  function buildColumns(rows, keys) {
+    return keys.map(function(key) {
+      const numeric = rows.every(row => row[key] === null || row[key] === undefined || typeof row[key] === 'number');
+      if (numeric) {
+        const values = new Float64Array(rows.length);
+        rows.forEach((row, i) => { values[i] = row[key] === null || row[key] === undefined ? NaN : row[key]; });
+        return { key: key, numeric: true, values: values };
+      }
+      return { key: key, numeric: false, values: rows.map(row => row[key] === null || row[key] === undefined ? '' : String(row[key])) };
+    });
+  }
+
+  function VirtualTable(container, rows, options) {
+    this.container = container;
+    this.rows = rows;
+    this.options = options || {};
+    this.format = this.options.format || (value => value);
+    this.keys = rows.length ? Object.keys(rows[0]) : [];
+    this.columns = buildColumns(rows, this.keys);
+    this.order = Uint32Array.from(rows.keys());
+    this.view = this.order;
+    this.sortColumn = null;
+    this.sortDirection = 1;
+    this.searchText = null;
+    this.pool = [];
+    this.frame = null;
+    this.build();
+    this.render();
+  }
+
+  VirtualTable.prototype.build = function() {
+    const template = `repeat(${this.keys.length}, minmax(120px, 1fr))`;
+
+    this.search = document.createElement('input');
+    this.search.type = 'search';
+    this.search.className = 'form-control input-xs virtual-table-search';
+    this.search.placeholder = 'Filter rows...';
+
+    this.viewport = document.createElement('div');
+    this.viewport.className = 'drill-down-table-container virtual-table-viewport';
+
+    this.header = document.createElement('div');
+    this.header.className = 'virtual-table-header';
+    this.header.style.gridTemplateColumns = template;
+    this.keys.forEach((key, index) => {
+      const cell = document.createElement('div');
+      cell.className = 'virtual-table-cell';
+      cell.textContent = toHeader(key);
+      cell.dataset.column = index;
+      this.header.appendChild(cell);
+    });
+
+    this.body = document.createElement('div');
+    this.body.className = 'virtual-table-body';
+    this.template = template;
+
+    this.viewport.appendChild(this.header);
+    this.viewport.appendChild(this.body);
+    this.container.innerHTML = '';
+    this.container.appendChild(this.search);
+    this.container.appendChild(this.viewport);
+
+    this.header.addEventListener('click', event => {
+      const cell = event.target.closest('[data-column]');
+      if (cell) {
+        this.sortBy(parseInt(cell.dataset.column));
+      }
+    });
+    this.viewport.addEventListener('scroll', () => this.scheduleRender(), { passive: true });
+    let searchTimer = null;
+    this.search.addEventListener('input', () => {
+      clearTimeout(searchTimer);
+      searchTimer = setTimeout(() => this.filter(this.search.value), SEARCH_DEBOUNCE);
+    });
+    // The modal sizes the viewport after it opens
+    if (window.ResizeObserver) {
+      this.resizeObserver = new ResizeObserver(() => this.scheduleRender());
+      this.resizeObserver.observe(this.viewport);
+    }
+  };
+
+  VirtualTable.prototype.scheduleRender = function() {
+    if (this.frame === null) {
+      this.frame = requestAnimationFrame(() => {
+        this.frame = null;
+        this.render();
+      });
+    }
+  };
+
+  // Row nodes for `count` rows, created once and reused
+  VirtualTable.prototype.ensurePool = function(count) {
+    while (this.pool.length < count) {
+      const row = document.createElement('div');
+      row.className = 'virtual-table-row';
+      row.style.gridTemplateColumns = this.template;
+      row.style.height = ROW_HEIGHT + 'px';
+      this.keys.forEach(() => {
+        const cell = document.createElement('div');
+        cell.className = 'virtual-table-cell';
+        row.appendChild(cell);
+      });
+      this.body.appendChild(row);
+      this.pool.push(row);
+    }
+  };
+
+  VirtualTable.prototype.render = function() {
+    const total = this.view.length;
+    this.body.style.height = (total * ROW_HEIGHT) + 'px';
+
+    const height = this.viewport.clientHeight || ROW_HEIGHT * 20;
+    const first = Math.max(0, Math.floor(this.viewport.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const count = Math.min(total - first, Math.ceil(height / ROW_HEIGHT) + OVERSCAN * 2);
+    this.ensurePool(count);
+
+    this.pool.forEach((row, slot) => {
+      if (slot >= count) {
+        row.style.display = 'none';
+        return;
+      }
+      const position = first + slot;
+      const index = this.view[position];
+      row.style.display = '';
+      row.style.transform = `translateY(${position * ROW_HEIGHT}px)`;
+      row.classList.toggle('virtual-table-row-even', position % 2 === 1);
+      this.columns.forEach((column, c) => {
+        const value = column.values[index];
+        const formatted = column.numeric && isNaN(value) ? '' : this.format(value);
+        const display = formatted === '' || formatted === null || formatted === undefined ? '-' : formatted;
+        const cell = row.children[c];
+        if (cell.textContent !== String(display)) {
+          cell.textContent = display;
+          cell.title = display;
+        }
+      });
+    });
+
+    if (this.options.onViewChange) {
+      this.options.onViewChange(total, this.rows.length);
+    }
+  };
+
+  VirtualTable.prototype.sortBy = function(columnIndex) {
+    this.sortDirection = this.sortColumn === columnIndex ? -this.sortDirection : 1;
+    this.sortColumn = columnIndex;
+
+    const column = this.columns[columnIndex];
+    const direction = this.sortDirection;
+    const values = column.values;
+    if (column.numeric) {
+      // Empty values last in either direction
+      this.order.sort((a, b) => {
+        const x = values[a], y = values[b];
+        if (isNaN(x) || isNaN(y)) {
+          return isNaN(x) - isNaN(y);
+        }
+        return (x - y) * direction;
+      });
+    } else {
+      const collator = new Intl.Collator(undefined, { numeric: true, sensitivity: 'base' });
+      this.order.sort((a, b) => collator.compare(values[a], values[b]) * direction);
+    }
+
+    Array.from(this.header.children).forEach((cell, i) => {
+      cell.classList.toggle('sort-asc', i === columnIndex && direction === 1);
+      cell.classList.toggle('sort-desc', i === columnIndex && direction === -1);
+    });
+    this.applyFilter();
+  };
+
+  VirtualTable.prototype.filter = function(text) {
+    this.searchText = (text || '').trim().toLowerCase();
+    this.applyFilter();
+  };
+
+  // Lower-cased text of every row, built on the first search
+  VirtualTable.prototype.getRowText = function() {
+    if (!this.rowText) {
+      this.rowText = this.rows.map((row, index) => this.columns.map(column => {
+        const value = column.values[index];
+        return column.numeric ? (isNaN(value) ? '' : String(value)) : String(this.format(value) || '') + ' ' + value;
+      }).join('\u0001').toLowerCase());
+    }
+    return this.rowText;
+  };
+
+  VirtualTable.prototype.applyFilter = function() {
+    if (!this.searchText) {
+      this.view = this.order;
+    } else {
+      const rowText = this.getRowText();
+      const matches = new Uint32Array(this.order.length);
+      let count = 0;
+      for (let i = 0; i < this.order.length; i++) {
+        if (rowText[this.order[i]].includes(this.searchText)) {
+          matches[count++] = this.order[i];
+        }
+      }
+      this.view = matches.subarray(0, count);
+    }
+    this.viewport.scrollTop = 0;
+    this.render();
+  };
+
+  VirtualTable.prototype.destroy = function() {
+    if (this.resizeObserver) {
+      this.resizeObserver.disconnect();
+    }
+    if (this.frame !== null) {
+      cancelAnimationFrame(this.frame);
+    }
+    this.container.innerHTML = '';
+  };
+
+  erperaReports.VirtualTable = VirtualTable;
+})();
@@ -1,6 +1,9 @@
 import frappe
 
+from erpera_reports.replica import read_from_replica
+
 @frappe.whitelist()
+@read_from_replica
 def get_top_supplier_for_expenses_raw_bar(branch=None, company=None, limit=5):
     """
     Top Supplier For Expenses Raw Bar
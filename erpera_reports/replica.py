@@ -0,0 +1,186 @@
+import functools
+from contextlib import contextmanager
+
+import frappe
+from frappe.utils import cint
+
+# Reports read from the replica at `replica_host` in site_config.json, with the
+# same keys as frappe.connect_replica(): replica_db_port, and replica_db_name /
+# replica_db_password under different_credentials_for_replica. Beyond this many
+# seconds of replication lag they fall back to the primary; override with
+# "erpera_reports_replica_max_lag".
+REPLICA_MAX_LAG = 5 * 60
+
+# A replica health check (reachable, lag) is shared by every worker for this long
+REPLICA_CHECK_INTERVAL = 30
+REPLICA_STATUS_KEY = "erpera_reports:replica_status"
+
+# Response headers reporting where report data came from and how stale it may be
+SOURCE_HEADER = "X-Report-Data-Source"
+STALENESS_HEADER = "X-Report-Data-Staleness"
+
+
+def get_max_lag():
+    return cint(frappe.conf.get("erpera_reports_replica_max_lag") or REPLICA_MAX_LAG)
+
+
+def get_replica_credentials():
+    conf = frappe.conf
+    if conf.different_credentials_for_replica:
+        return conf.replica_db_name, conf.replica_db_password
+    return conf.db_user or conf.db_name, conf.db_password
+
+
+def connect_replica():
+    """A new, connected database connection to the configured replica."""
+    from frappe.database import get_db
+
+    user, password = get_replica_credentials()
+    db = get_db(host=frappe.conf.replica_host, user=user, password=password, port=frappe.conf.replica_db_port)
+    db.connect()
+    return db
+
+
+def get_replica_lag(db):
+    """
+    Seconds the replica is behind the primary: 0 for a copy that does not
+    replicate, None when replication is stopped.
+    """
+    status = db.sql("SHOW SLAVE STATUS", as_dict=True)
+    if not status:
+        return 0
+    lag = status[0].get("Seconds_Behind_Master")
+    return None if lag is None else cint(lag)
+
+
+def get_primary_source(reason=None):
+    return frappe._dict(source="primary", staleness=0, reason=reason)
+
+
+def open_replica():
+    """
+    (connection, data source) for a report: a replica connection and its last
+    measured lag, or (None, primary) when no replica is configured or the
+    last health check found it down or lagging beyond get_max_lag().
+    """
+    if not frappe.conf.get("replica_host"):
+        return None, get_primary_source()
+
+    status = frappe.cache().get_value(REPLICA_STATUS_KEY)
+    if status and not status["available"]:
+        return None, get_primary_source(status["reason"])
+
+    db = None
+    try:
+        db = connect_replica()
+        if not status:
+            lag = get_replica_lag(db)
+            if lag is None:
+                status = {"available": False, "lag": None, "reason": "replication stopped"}
+            elif lag > get_max_lag():
+                status = {"available": False, "lag": lag, "reason": f"lagging {lag}s"}
+            else:
+                status = {"available": True, "lag": lag, "reason": None}
+            frappe.cache().set_value(REPLICA_STATUS_KEY, status, expires_in_sec=REPLICA_CHECK_INTERVAL)
+    except Exception as e:
+        frappe.log_error(f"Error in open_replica: {str(e)}")
+        status = {"available": False, "lag": None, "reason": "unreachable"}
+        frappe.cache().set_value(REPLICA_STATUS_KEY, status, expires_in_sec=REPLICA_CHECK_INTERVAL)
+
+    if not status["available"]:
+        if db:
+            db.close()
+        return None, get_primary_source(status["reason"])
+    return db, frappe._dict(source="replica", staleness=status["lag"], reason=None)
+
+
+def is_replica_active():
+    return bool(getattr(frappe.local, "report_primary_db", None))
+
+
+@contextmanager
+def report_connection():
+    """
+    Point frappe.db at the read replica for the block, falling back to the
+    primary (see open_replica()). Yields the data source, also kept as
+    frappe.local.report_data_source for the response metadata. Nested
+    blocks reuse the outer connection.
+
+    frappe.flags.read_only is set on the replica, so error logs are
+    deferred instead of written there.
+    """
+    if getattr(frappe.local, "report_connection_depth", 0):
+        frappe.local.report_connection_depth += 1
+        try:
+            yield frappe.local.report_data_source
+        finally:
+            frappe.local.report_connection_depth -= 1
+        return
+
+    replica, source = open_replica()
+    read_only = frappe.flags.read_only
+    if replica:
+        frappe.local.report_primary_db = frappe.local.db
+        frappe.local.db = replica
+        frappe.flags.read_only = True
+    frappe.local.report_data_source = source
+    frappe.local.report_connection_depth = 1
+
+    try:
+        yield source
+    finally:
+        frappe.local.report_connection_depth = 0
+        if replica:
+            frappe.local.db = frappe.local.report_primary_db
+            frappe.local.report_primary_db = None
+            frappe.flags.read_only = read_only
+            replica.close()
+
+
+def is_lagging_read():
+    """
+    True when the current report read from a replica that was behind the
+    primary. Caches keyed on data versions bumped at the primary's commit
+    must not store such a read under the new version.
+    """
+    source = getattr(frappe.local, "report_data_source", None)
+    return bool(source and source.source == "replica" and cint(source.staleness) > 0)
+
+
+def read_from_replica(fn):
+    """Run `fn` within report_connection(), e.g. a page's get_context."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with report_connection():
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def server_connection(replica):
+    """
+    A connection to the replica (`replica` true) or the primary, whichever
+    frappe.db currently is; a connection of its own when it is the other one.
+    """
+    if bool(replica) == is_replica_active():
+        yield frappe.db
+    elif not replica:
+        yield frappe.local.report_primary_db
+    else:
+        db = connect_replica()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def get_data_source_headers():
+    """Response headers describing the data source of the current report request, if any."""
+    source = getattr(frappe.local, "report_data_source", None)
+    if not source:
+        return {}
+    return {
+        SOURCE_HEADER: source.source,
+        STALENESS_HEADER: str(source.staleness or 0)
+    }
@@ -0,0 +1,86 @@
+import frappe
+from frappe.utils import add_days, flt, get_first_day, get_last_day, getdate
+
+
+def get_month_label(sort_date):
+    """'2024-03' -> 'Mar 2024', the month labels of the charts."""
+    return getdate(f"{sort_date}-01").strftime("%b %Y")
+
+
+def split_whole_months(from_date, to_date):
+    """
+    (whole, partial) for a date range, either end open when None: `whole` is
+    the (first, last) day of the whole months in it, or None when it has none,
+    and `partial` the (from, to) ranges of the partial months at either end.
+    Summary tables hold whole months; the partial ones are read from the
+    source documents.
+    """
+    first = from_date if not from_date or from_date.day == 1 else add_days(get_last_day(from_date), 1)
+    last = to_date if not to_date or to_date == get_last_day(to_date) else add_days(get_first_day(to_date), -1)
+    if first and last and first > last:
+        return None, [(from_date, to_date)]
+
+    partial = []
+    if from_date and from_date < first:
+        partial.append((from_date, add_days(first, -1)))
+    if to_date and to_date > last:
+        partial.append((add_days(last, 1), to_date))
+    return (first, last), partial
+
+
+def get_monthly_rollup(query, values):
+    """
+    Every level of a month/company/branch total from one scan.
+
+    `query` selects `sort_date` ('%Y-%m'), `company`, `cost_center` and
+    `total_amount`, grouped by those three WITH ROLLUP in that order. Returns
+
+        branches: {(company, cost_center): {sort_date: amount}}
+        companies: {company: {sort_date: amount}}
+        months: {sort_date: amount}
+        total: amount
+
+    MariaDB has no GROUPING(), so a super-aggregate row is told apart from a
+    real NULL cost center by position: ROLLUP emits it after the rows of its
+    group, while a NULL cost center sorts first among them. `branches` keeps
+    the NULL and empty cost centers as they are, for the caller to label.
+    """
+    rollup = frappe._dict(branches={}, companies={}, months={}, total=0)
+    seen = set()
+
+    for row in frappe.db.sql(query, values, as_dict=True):
+        amount = flt(row.total_amount)
+        if row.sort_date is None:
+            rollup.total = amount
+        elif row.company is None:
+            rollup.months[row.sort_date] = amount
+        elif row.cost_center is None and (row.sort_date, row.company) in seen:
+            rollup.companies.setdefault(row.company, {})[row.sort_date] = amount
+        else:
+            seen.add((row.sort_date, row.company))
+            rollup.branches.setdefault((row.company, row.cost_center), {})[row.sort_date] = amount
+
+    return rollup
+
+
+def get_entity_name(company, cost_center):
+    """'Company - Branch' label of the consolidated charts; the company alone without a branch."""
+    if cost_center:
+        return f"{company or 'Unknown'} - {cost_center}"
+    return company or "Unknown Company"
+
+
+def get_entity_data(rollup):
+    """
+    {entity: {month label: amount}} from the branch rows of a get_monthly_rollup()
+    result, and the entities ordered by their total, largest first.
+    """
+    entity_data = {}
+    for (company, cost_center), months in rollup.branches.items():
+        entity = entity_data.setdefault(get_entity_name(company, cost_center), {})
+        for sort_date, amount in months.items():
+            month = get_month_label(sort_date)
+            entity[month] = entity.get(month, 0) + amount
+
+    entity_order = sorted(entity_data, key=lambda entity: -sum(entity_data[entity].values()))
+    return entity_data, entity_order
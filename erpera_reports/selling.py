@@ -1,6 +1,17 @@
 import frappe
 from frappe import _
 import json
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.items import items_in_group, reportable_items
+from erpera_reports.jobs import report_progress
+from erpera_reports.replica import read_from_replica
+from erpera_reports.rollup import get_entity_data, get_month_label, get_monthly_rollup
+from erpera_reports.sketches import apply_rolling_window, get_sketch_candidates
+from erpera_reports.topn import get_share_pie, get_top_n_per_group
+from erpera_reports.trees import cost_center_condition, get_group_totals
+
+# Doctypes whose modification watermark versions the report responses
+REPORT_SOURCES = ("Sales Invoice", "Item", "Item Group", "Cost Center")
 
 def apply_filters_to_query(base_query, filters):
     """
@@ -29,8 +40,7 @@ def apply_filters_to_query(base_query, filters):
     
     # Item group filter
     if filters.get('item_group'):
-        conditions.append("i.item_group = %(item_group)s")
-        params['item_group'] = filters['item_group']
+        conditions.append(items_in_group("sii.item_code", filters['item_group']))
     
     # Company filter
     if filters.get('company'):
@@ -39,7 +49,7 @@ def apply_filters_to_query(base_query, filters):
     
     # Branch filter
     if filters.get('branch'):
-        conditions.append("si.cost_center = %(branch)s")
+        conditions.append(cost_center_condition("si.cost_center", filters['branch']))
         params['branch'] = filters['branch']
     
     # Custom filters
@@ -57,6 +67,7 @@ def apply_filters_to_query(base_query, filters):
     return base_query, params
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_total_branch_wise_selling(filters=None):
     """
     Chart Name: Total Selling
@@ -64,134 +75,62 @@ def get_total_branch_wise_selling(filters=None):
     Note 1: Branch wise and company wise different chart
     """
     
-    # Main query for branch-wise data
-    branch_query = """
-    SELECT
-        COALESCE(si.cost_center, 'Unknown Branch') AS branch,
-        DATE_FORMAT(si.posting_date, '%%b %%Y') AS month_year,
-        DATE_FORMAT(si.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(sii.amount) AS total_amount,
-        COUNT(DISTINCT si.name) AS invoice_count
-    FROM `tabSales Invoice` si
-    INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-    INNER JOIN `tabItem` i ON sii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        si.docstatus = 1
-        AND si.status NOT IN ('Cancelled', 'Return')
-        AND si.cost_center IS NOT NULL
-        AND si.cost_center != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-        
-    """
-    
-    # Query for company-wise data
-    company_query = """
-    SELECT
-        COALESCE(si.company, 'Unknown Company') AS company,
-        DATE_FORMAT(si.posting_date, '%%b %%Y') AS month_year,
-        DATE_FORMAT(si.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(sii.amount) AS total_amount,
-        COUNT(DISTINCT si.name) AS invoice_count
-    FROM `tabSales Invoice` si
-    INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-    INNER JOIN `tabItem` i ON sii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        si.docstatus = 1
-        AND si.status NOT IN ('Cancelled', 'Return')
-        AND si.company IS NOT NULL
-        AND si.company != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-        
-    """
-    
-    # Summary query for overall totals
-    summary_query = """
+    # One scan for every level: WITH ROLLUP adds the company x month and
+    # month totals to the branch x month rows
+    rollup_query = f"""
     SELECT
-        DATE_FORMAT(si.posting_date, '%%b %%Y') AS month_year,
         DATE_FORMAT(si.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(sii.amount) AS total_amount,
-        COUNT(DISTINCT si.name) AS invoice_count,
-        COUNT(DISTINCT si.cost_center) AS branch_count,
-        COUNT(DISTINCT si.company) AS company_count
+        si.company AS company,
+        si.cost_center AS cost_center,
+        SUM(sii.amount) AS total_amount
     FROM `tabSales Invoice` si
     INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-    INNER JOIN `tabItem` i ON sii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
         si.docstatus = 1
         AND si.status NOT IN ('Cancelled', 'Return')
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-        
+        AND {reportable_items('sii.item_code')}
     """
     
     try:
-        # Apply filters to queries
-        branch_query, branch_params = apply_filters_to_query(branch_query, filters)
-        company_query, company_params = apply_filters_to_query(company_query, filters)
-        summary_query, summary_params = apply_filters_to_query(summary_query, filters)
+        # Apply filters to the query
+        rollup_query, rollup_params = apply_filters_to_query(rollup_query, filters)
         
-        # Add GROUP BY and ORDER BY clauses
-        branch_query += """
+        # Plain columns in the GROUP BY, labels are built in Python
+        rollup_query += """
         GROUP BY 
-            si.cost_center,
-            DATE_FORMAT(si.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(si.posting_date, '%%b %%Y')
-        ORDER BY 
-            si.cost_center,
-            sort_date
-        """
-        
-        company_query += """
-        GROUP BY 
-            si.company,
             DATE_FORMAT(si.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(si.posting_date, '%%b %%Y')
-        ORDER BY 
             si.company,
-            sort_date
+            si.cost_center
+        WITH ROLLUP
         """
         
-        summary_query += """
-        GROUP BY 
-            DATE_FORMAT(si.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(si.posting_date, '%%b %%Y')
-        ORDER BY sort_date
-        """
-        
-        # Execute queries
-        branch_result = frappe.db.sql(branch_query, branch_params, as_dict=True)
-        company_result = frappe.db.sql(company_query, company_params, as_dict=True)
-        summary_result = frappe.db.sql(summary_query, summary_params, as_dict=True)
+        rollup = get_monthly_rollup(rollup_query, rollup_params)
         
         # Process branch-wise data
         branch_data = {}
         branch_months = set()
         
-        for row in branch_result:
-            branch = row['branch']
-            month = row['month_year']
-            amount = float(row['total_amount']) if row['total_amount'] else 0
+        for (company, branch), months in rollup.branches.items():
+            if not branch:
+                continue
             
             if branch not in branch_data:
                 branch_data[branch] = {}
-            branch_data[branch][month] = amount
-            branch_months.add(month)
+            for sort_date, amount in months.items():
+                month = get_month_label(sort_date)
+                branch_data[branch][month] = branch_data[branch].get(month, 0) + amount
+                branch_months.add(month)
         
         # Process company-wise data
         company_data = {}
         company_months = set()
         
-        for row in company_result:
-            company = row['company']
-            month = row['month_year']
-            amount = float(row['total_amount']) if row['total_amount'] else 0
+        for company, months in rollup.companies.items():
+            if not company:
+                continue
             
-            if company not in company_data:
-                company_data[company] = {}
-            company_data[company][month] = amount
-            company_months.add(month)
+            company_data[company] = {get_month_label(sort_date): amount for sort_date, amount in months.items()}
+            company_months.update(company_data[company])
         
         # Sort months chronologically
         all_months = sorted(list(branch_months.union(company_months)), 
@@ -230,9 +169,27 @@ def get_total_branch_wise_selling(filters=None):
                 'borderWidth': 1
             })
         
+        # Branch group totals, rolled up the Cost Center tree from the branch rows
+        branch_group_datasets = []
+        branch_groups = get_group_totals("Cost Center", branch_data)
+        
+        for i, branch_group in enumerate(sorted(branch_groups.keys())):
+            data_points = []
+            for month in all_months:
+                data_points.append(branch_groups[branch_group].get(month, 0))
+            
+            branch_group_datasets.append({
+                'label': branch_group,
+                'data': data_points,
+                'backgroundColor': colors[i % len(colors)],
+                'borderColor': colors[i % len(colors)],
+                'borderWidth': 1
+            })
+        
         # Prepare summary data
-        summary_labels = [row['month_year'] for row in summary_result]
-        summary_data = [float(row['total_amount']) if row['total_amount'] else 0 for row in summary_result]
+        summary_months = sorted(rollup.months)
+        summary_labels = [get_month_label(sort_date) for sort_date in summary_months]
+        summary_data = [rollup.months[sort_date] for sort_date in summary_months]
         
         return {
             "chart_type": "bar",
@@ -246,6 +203,11 @@ def get_total_branch_wise_selling(filters=None):
                 "datasets": company_datasets,
                 "title": "Total Selling - Company Wise"
             },
+            "branch_group_wise": {
+                "labels": all_months,
+                "datasets": branch_group_datasets,
+                "title": "Total Selling - Branch Group Wise"
+            },
             "summary": {
                 "labels": summary_labels,
                 "data": summary_data,
@@ -254,6 +216,7 @@ def get_total_branch_wise_selling(filters=None):
             "metadata": {
                 "total_branches": len(branch_data),
                 "total_companies": len(company_data),
+                "total_branch_groups": len(branch_groups),
                 "date_range": "Last 12 months",
                 "filters_applied": filters
             },
@@ -266,12 +229,14 @@ def get_total_branch_wise_selling(filters=None):
             "chart_type": "bar",
             "branch_wise": {"labels": [], "datasets": []},
             "company_wise": {"labels": [], "datasets": []},
+            "branch_group_wise": {"labels": [], "datasets": []},
             "summary": {"labels": [], "data": []},
             "error": str(e),
             "success": False
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_branch_wise_selling(filters=None):
     """
     Separate endpoint for branch-wise data only
@@ -282,6 +247,7 @@ def get_branch_wise_selling(filters=None):
     return {"labels": [], "datasets": [], "error": result.get('error')}
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_company_wise_selling(filters=None):
     """
     Separate endpoint for company-wise data only
@@ -292,6 +258,18 @@ def get_company_wise_selling(filters=None):
     return {"labels": [], "datasets": [], "error": result.get('error')}
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
+def get_branch_group_wise_selling(filters=None):
+    """
+    Separate endpoint for branch group (group Cost Center) data only
+    """
+    result = get_total_branch_wise_selling(filters)
+    if result.get('success'):
+        return result['branch_group_wise']
+    return {"labels": [], "datasets": [], "error": result.get('error')}
+
+@frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_selling_summary(filters=None):
     """
     Separate endpoint for summary data only
@@ -302,6 +280,7 @@ def get_selling_summary(filters=None):
     return {"labels": [], "data": [], "error": result.get('error')}
 
 @frappe.whitelist()
+@report_endpoint(schema="consolidated_total_amount", sources=REPORT_SOURCES, background=True)
 def consolidated_total_selling(filters=None):
     """
     Chart Name: Consolidate Total Selling
@@ -309,81 +288,39 @@ def consolidated_total_selling(filters=None):
     Note: All the company's selling shows in one bar chart using different colour for each company or branch
     """
     
-    # Query to get consolidated data by company and branch
-    consolidated_query = """
+    # One scan: the branch x month rows of a WITH ROLLUP over month, company and branch
+    rollup_query = f"""
     SELECT
-        CASE 
-            WHEN si.cost_center IS NOT NULL AND si.cost_center != '' 
-            THEN CONCAT(COALESCE(si.company, 'Unknown'), ' - ', si.cost_center)
-            ELSE COALESCE(si.company, 'Unknown Company')
-        END AS entity_name,
-        COALESCE(si.company, 'Unknown Company') AS company,
-        COALESCE(si.cost_center, 'No Branch') AS branch,
-        DATE_FORMAT(si.posting_date, '%%b %%Y') AS month_year,
         DATE_FORMAT(si.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(sii.amount) AS total_amount,
-        COUNT(DISTINCT si.name) AS invoice_count,
-        SUM(sii.qty) AS total_qty
-    FROM `tabSales Invoice` si
-    INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-    INNER JOIN `tabItem` i ON sii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        si.docstatus = 1
-        AND si.status NOT IN ('Cancelled', 'Return')
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-        
-    """
-    
-    # Query to get entity totals for sorting
-    entity_totals_query = """
-    SELECT
-        CASE 
-            WHEN si.cost_center IS NOT NULL AND si.cost_center != '' 
-            THEN CONCAT(COALESCE(si.company, 'Unknown'), ' - ', si.cost_center)
-            ELSE COALESCE(si.company, 'Unknown Company')
-        END AS entity_name,
+        si.company AS company,
+        si.cost_center AS cost_center,
         SUM(sii.amount) AS total_amount
     FROM `tabSales Invoice` si
     INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-    INNER JOIN `tabItem` i ON sii.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
         si.docstatus = 1
         AND si.status NOT IN ('Cancelled', 'Return')
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-        
+        AND {reportable_items('sii.item_code')}
     """
     
     try:
-        # Apply filters to queries
-        consolidated_query, consolidated_params = apply_filters_to_query(consolidated_query, filters)
-        entity_totals_query, entity_totals_params = apply_filters_to_query(entity_totals_query, filters)
+        # Apply filters to the query
+        rollup_query, rollup_params = apply_filters_to_query(rollup_query, filters)
         
-        # Add GROUP BY and ORDER BY clauses
-        consolidated_query += """
+        # Entities are labelled and ordered in Python rather than grouped by a
+        # CONCAT() of company and branch
+        rollup_query += """
         GROUP BY 
-            entity_name,
-            si.company,
-            si.cost_center,
             DATE_FORMAT(si.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(si.posting_date, '%%b %%Y')
-        ORDER BY 
             si.company,
-            si.cost_center,
-            sort_date
-        """
-        
-        entity_totals_query += """
-        GROUP BY entity_name
-        ORDER BY total_amount DESC
+            si.cost_center
+        WITH ROLLUP
         """
         
-        # Execute queries
-        consolidated_result = frappe.db.sql(consolidated_query, consolidated_params, as_dict=True)
-        entity_totals_result = frappe.db.sql(entity_totals_query, entity_totals_params, as_dict=True)
+        rollup = get_monthly_rollup(rollup_query, rollup_params)
+        report_progress(80, "Building datasets")
         
-        if not consolidated_result:
+        if not rollup.branches:
             return {
                 "chart_type": "bar",
                 "labels": [],
@@ -392,26 +329,11 @@ def consolidated_total_selling(filters=None):
                 "success": True
             }
         
-        # Process consolidated data
-        entity_data = {}
-        all_months = set()
-        
-        for row in consolidated_result:
-            entity = row['entity_name']
-            month = row['month_year']
-            amount = float(row['total_amount']) if row['total_amount'] else 0
-            
-            if entity not in entity_data:
-                entity_data[entity] = {}
-            entity_data[entity][month] = amount
-            all_months.add(month)
+        # Process consolidated data, entities ordered by total amount (descending)
+        entity_data, entity_order = get_entity_data(rollup)
         
         # Sort months chronologically
-        sorted_months = sorted(list(all_months), 
-                              key=lambda x: frappe.utils.getdate(f"01 {x}"))
-        
-        # Get entity order by total amount (descending)
-        entity_order = [row['entity_name'] for row in entity_totals_result]
+        sorted_months = [get_month_label(sort_date) for sort_date in sorted(rollup.months)]
         
         # Color palette for different entities
         color_palette = [
@@ -498,6 +420,7 @@ def consolidated_total_selling(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_entity_wise_selling(filters=None):
     """
     Get summary of all entities with their totals for a single-bar-per-entity chart
@@ -537,6 +460,7 @@ def get_entity_wise_selling(filters=None):
         }
 
 @frappe.whitelist()
+@read_from_replica
 def get_top_customers_raw_bar(filters=None, branch=None, company=None, limit=10):
     """
     Top Customers Raw Bar Chart
@@ -554,7 +478,7 @@ def get_top_customers_raw_bar(filters=None, branch=None, company=None, limit=10)
     if company:
         filters['company'] = company
     
-    base_query = """
+    base_query = f"""
         SELECT 
             si.customer_name,
             si.customer,
@@ -564,12 +488,10 @@ def get_top_customers_raw_bar(filters=None, branch=None, company=None, limit=10)
             AVG(si.total) as avg_invoice_value
         FROM `tabSales Invoice` si
         INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             si.docstatus = 1
             AND si.status NOT IN ('Cancelled', 'Return')
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('sii.item_code')}
             
     """
     
@@ -620,11 +542,12 @@ def get_top_customers_raw_bar(filters=None, branch=None, company=None, limit=10)
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_customers_by_branch(filters=None):
     """
     Get top customers for each branch with color grouping
     """
-    base_query = """
+    base_query = f"""
         SELECT 
             si.cost_center as branch,
             si.customer_name,
@@ -632,14 +555,12 @@ def get_top_customers_by_branch(filters=None):
             COUNT(DISTINCT si.name) as invoice_count
         FROM `tabSales Invoice` si
         INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             si.docstatus = 1 
             AND si.status NOT IN ('Cancelled', 'Return')
             AND si.cost_center IS NOT NULL 
             AND si.cost_center != ''
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('sii.item_code')}
             
     """
     
@@ -648,10 +569,10 @@ def get_top_customers_by_branch(filters=None):
         query, params = apply_filters_to_query(base_query, filters)
         query += """
         GROUP BY si.cost_center, si.customer_name
-        ORDER BY si.cost_center, total_amount DESC
         """
         
-        result = frappe.db.sql(query, params, as_dict=True)
+        # Top 5 customers per branch
+        groups = get_top_n_per_group(query, params, 'branch', ['total_amount'], 5, columns=['customer_name'])
         
         # Color palette for branches
         branch_colors = {
@@ -663,17 +584,11 @@ def get_top_customers_by_branch(filters=None):
         
         # Process data by branch
         branch_data = {}
-        for row in result:
-            branch = row['branch']
-            if branch not in branch_data:
-                branch_data[branch] = []
-            
-            # Only take top 5 customers per branch
-            if len(branch_data[branch]) < 5:
-                branch_data[branch].append({
-                    'customer': row['customer_name'],
-                    'amount': float(row['total_amount'])
-                })
+        for branch, entry in groups.items():
+            branch_data[branch] = [
+                {'customer': row['customer_name'], 'amount': float(row['total_amount'])}
+                for row in entry.top
+            ]
         
         # Get all unique customers across branches
         all_customers = set()
@@ -719,25 +634,24 @@ def get_top_customers_by_branch(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_customers_by_company(filters=None):
     """
     Get top customers for each company
     """
-    base_query = """
+    base_query = f"""
         SELECT 
             si.company,
             si.customer_name,
             SUM(si.total) as total_amount
         FROM `tabSales Invoice` si
         INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             si.docstatus = 1 
             AND si.status NOT IN ('Cancelled', 'Return')
             AND si.company IS NOT NULL 
             AND si.company != ''
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('sii.item_code')}
             
     """
     
@@ -746,10 +660,10 @@ def get_top_customers_by_company(filters=None):
         query, params = apply_filters_to_query(base_query, filters)
         query += """
         GROUP BY si.company, si.customer_name
-        ORDER BY si.company, total_amount DESC
         """
         
-        result = frappe.db.sql(query, params, as_dict=True)
+        # Top 5 customers per company
+        groups = get_top_n_per_group(query, params, 'company', ['total_amount'], 5, columns=['customer_name'])
         
         # Color palette for the bars
         color_palette = [
@@ -759,23 +673,12 @@ def get_top_customers_by_company(filters=None):
         
         # Process data by company
         company_data = {}
-        for row in result:
-            company = row['company']
-            if company not in company_data:
-                company_data[company] = {
-                    'labels': [],
-                    'data': [],
-                    'backgroundColor': []
-                }
-            
-            # Only take top 5 customers per company
-            if len(company_data[company]['labels']) < 5:
-                label = f"{row['customer_name']} (₹{row['total_amount']:,.0f})"
-                company_data[company]['labels'].append(label)
-                company_data[company]['data'].append(float(row['total_amount']))
-                company_data[company]['backgroundColor'].append(
-                    color_palette[len(company_data[company]['labels']) - 1]
-                )
+        for company, entry in groups.items():
+            company_data[company] = {
+                'labels': [f"{row['customer_name']} (₹{row['total_amount']:,.0f})" for row in entry.top],
+                'data': [float(row['total_amount']) for row in entry.top],
+                'backgroundColor': color_palette[:len(entry.top)]
+            }
         
         # Combine all company data
         labels = []
@@ -813,11 +716,12 @@ def get_top_customers_by_company(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="heavy")
 def get_consolidated_top_customers(filters=None):
     """
     Get consolidated top 10 customers across all companies
     """
-    base_query = """
+    base_query = f"""
         SELECT 
             si.customer_name,
             si.customer,
@@ -826,18 +730,22 @@ def get_consolidated_top_customers(filters=None):
             GROUP_CONCAT(DISTINCT si.company) as companies
         FROM `tabSales Invoice` si
         INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             si.docstatus = 1 
             AND si.status NOT IN ('Cancelled', 'Return')
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('sii.item_code')}
             
     """
     
     try:
         # Apply filters
+        filters = apply_rolling_window(filters)
         query, params = apply_filters_to_query(base_query, filters)
+        # Exact re-rank of the heavy hitter candidates only, when the sketches cover the filters
+        candidates = get_sketch_candidates('customer_amount', params, 10, filters)
+        if candidates:
+            query += " AND si.customer IN %(candidates)s"
+            params['candidates'] = candidates
         query += """
         GROUP BY si.customer, si.customer_name
         ORDER BY total_amount DESC
@@ -882,11 +790,12 @@ def get_consolidated_top_customers(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_selling_products_by_branch(filters=None):
     """
     Get top selling products for each branch with percentage calculations
     """
-    base_query = """
+    base_query = f"""
         SELECT 
             si.cost_center as branch,
             sii.item_name,
@@ -896,14 +805,12 @@ def get_top_selling_products_by_branch(filters=None):
             COUNT(DISTINCT si.name) as invoice_count
         FROM `tabSales Invoice` si
         INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             si.docstatus = 1 
             AND si.status NOT IN ('Cancelled', 'Return')
             AND si.cost_center IS NOT NULL 
             AND si.cost_center != ''
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('sii.item_code')}
             
     """
     
@@ -912,71 +819,22 @@ def get_top_selling_products_by_branch(filters=None):
         query, params = apply_filters_to_query(base_query, filters)
         query += """
         GROUP BY si.cost_center, sii.item_code, sii.item_name
-        ORDER BY si.cost_center, total_amount DESC
         """
         
-        result = frappe.db.sql(query, params, as_dict=True)
-        
-        # Process data by branch
-        branch_data = {}
-        for row in result:
-            branch = row['branch']
-            if branch not in branch_data:
-                branch_data[branch] = {
-                    'items': [],
-                    'total_branch_amount': 0
-                }
-            
-            # Add to branch total
-            branch_data[branch]['total_branch_amount'] += float(row['total_amount'])
-            
-            # Only store top 10 items per branch
-            if len(branch_data[branch]['items']) < 10:
-                branch_data[branch]['items'].append({
-                    'item_name': row['item_name'],
-                    'amount': float(row['total_amount']),
-                    'quantity': float(row['total_quantity'])
-                })
-        
-        # Color palette for the pie charts
-        colors = [
-            '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
-            '#FF9F40', '#FF6384', '#C9CBCF', '#4BC0C0', '#FF9F40'
-        ]
+        # Top 10 items per branch, the rest summed into one row
+        groups = get_top_n_per_group(
+            query, params, 'branch', ['total_amount', 'total_quantity'], 10, columns=['item_code', 'item_name']
+        )
         
         # Prepare datasets for each branch
         datasets = {}
-        for branch, data in branch_data.items():
-            total_branch_amount = data['total_branch_amount']
-            
-            # Calculate percentages and prepare labels
-            labels = []
-            data_values = []
-            background_colors = []
-            
-            # Process top items
-            top_items_amount = 0
-            for i, item in enumerate(data['items']):
-                percentage = (item['amount'] / total_branch_amount) * 100
-                top_items_amount += item['amount']
-                label = f"{item['item_name']} ({percentage:.1f}%)"
-                labels.append(label)
-                data_values.append(item['amount'])
-                background_colors.append(colors[i % len(colors)])
-            
-            # Add "Others" category if there's remaining amount
-            remaining_amount = total_branch_amount - top_items_amount
-            if remaining_amount > 0:
-                percentage = (remaining_amount / total_branch_amount) * 100
-                labels.append(f"Others ({percentage:.1f}%)")
-                data_values.append(remaining_amount)
-                background_colors.append('#C9CBCF')
-            
+        for branch, entry in groups.items():
+            pie = get_share_pie(entry, 'item_name', 'total_amount')
             datasets[branch] = {
-                'labels': labels,
-                'data': data_values,
-                'backgroundColor': background_colors,
-                'total_amount': total_branch_amount
+                'labels': pie.labels,
+                'data': pie.data,
+                'backgroundColor': pie.backgroundColor,
+                'total_amount': pie.total
             }
         
         return {
@@ -994,11 +852,12 @@ def get_top_selling_products_by_branch(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_selling_products_by_company(filters=None):
     """
     Get top selling products for each company with percentage calculations
     """
-    base_query = """
+    base_query = f"""
         SELECT 
             si.company,
             sii.item_name,
@@ -1009,14 +868,12 @@ def get_top_selling_products_by_company(filters=None):
             COUNT(DISTINCT si.company) as company_count
         FROM `tabSales Invoice` si
         INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             si.docstatus = 1 
             AND si.status NOT IN ('Cancelled', 'Return')
             AND si.company IS NOT NULL 
             AND si.company != ''
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('sii.item_code')}
             
     """
     
@@ -1025,72 +882,22 @@ def get_top_selling_products_by_company(filters=None):
         query, params = apply_filters_to_query(base_query, filters)
         query += """
         GROUP BY si.company, sii.item_code, sii.item_name
-        ORDER BY si.company, total_amount DESC
         """
         
-        result = frappe.db.sql(query, params, as_dict=True)
-        
-        # Process data by company
-        company_data = {}
-        for row in result:
-            company = row['company']
-            if company not in company_data:
-                company_data[company] = {
-                    'items': [],
-                    'total_company_amount': 0
-                }
-            
-            # Add to company total
-            amount = float(row['total_amount']) if row['total_amount'] else 0
-            company_data[company]['total_company_amount'] += amount
-            
-            # Only store top 10 items per company
-            if len(company_data[company]['items']) < 10:
-                company_data[company]['items'].append({
-                    'item_name': row['item_name'],
-                    'amount': amount,
-                    'quantity': float(row['total_quantity']) if row['total_quantity'] else 0
-                })
-        
-        # Color palette for the pie charts
-        colors = [
-            '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
-            '#FF9F40', '#FF6384', '#C9CBCF', '#4BC0C0', '#FF9F40'
-        ]
+        # Top 10 items per company, the rest summed into one row
+        groups = get_top_n_per_group(
+            query, params, 'company', ['total_amount', 'total_quantity'], 10, columns=['item_code', 'item_name']
+        )
         
         # Prepare datasets for each company
         datasets = {}
-        for company, data in company_data.items():
-            total_company_amount = data['total_company_amount']
-            
-            # Calculate percentages and prepare labels
-            labels = []
-            data_values = []
-            background_colors = []
-            
-            # Process top items
-            top_items_amount = 0
-            for i, item in enumerate(data['items']):
-                percentage = (item['amount'] / total_company_amount) * 100
-                top_items_amount += item['amount']
-                label = f"{item['item_name']} ({percentage:.1f}%)"
-                labels.append(label)
-                data_values.append(item['amount'])
-                background_colors.append(colors[i % len(colors)])
-            
-            # Add "Others" category if there's remaining amount
-            remaining_amount = total_company_amount - top_items_amount
-            if remaining_amount > 0:
-                percentage = (remaining_amount / total_company_amount) * 100
-                labels.append(f"Others ({percentage:.1f}%)")
-                data_values.append(remaining_amount)
-                background_colors.append('#C9CBCF')
-            
+        for company, entry in groups.items():
+            pie = get_share_pie(entry, 'item_name', 'total_amount')
             datasets[company] = {
-                'labels': labels,
-                'data': data_values,
-                'backgroundColor': background_colors,
-                'total_amount': total_company_amount
+                'labels': pie.labels,
+                'data': pie.data,
+                'backgroundColor': pie.backgroundColor,
+                'total_amount': pie.total
             }
         
         return {
@@ -1109,12 +916,13 @@ def get_top_selling_products_by_company(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="heavy")
 def get_consolidated_top_selling_products(filters=None):
     """
     Get consolidated top 10 selling products across all companies
     Shows overall top selling products regardless of company
     """
-    base_query = """
+    base_query = f"""
         SELECT 
             sii.item_name,
             sii.item_code,
@@ -1125,12 +933,10 @@ def get_consolidated_top_selling_products(filters=None):
             GROUP_CONCAT(DISTINCT si.company) as companies
         FROM `tabSales Invoice` si
         INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-        INNER JOIN `tabItem` i ON sii.item_code = i.name
-        INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         WHERE 
             si.docstatus = 1 
             AND si.status NOT IN ('Cancelled', 'Return')
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+            AND {reportable_items('sii.item_code')}
             
     """
     
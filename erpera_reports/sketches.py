@@ -0,0 +1,631 @@
+import functools
+import hashlib
+import json
+import math
+
+import frappe
+from frappe.utils import add_days, cint, flt, get_first_day, get_last_day, getdate, today
+
+from erpera_reports.comparison import get_comparison
+from erpera_reports.items import sku_items
+from erpera_reports.replica import is_lagging_read
+from erpera_reports.rollup import split_whole_months
+from erpera_reports.trees import cost_center_condition
+
+# Counters kept per sketch. A day of one branch rarely has more distinct
+# heavy hitters than this; the long tail is what Space-Saving drops.
+SKETCH_CAPACITY = 200
+# Days of sketches kept; windows starting earlier fall back to the full query
+SKETCH_RETENTION_DAYS = 120
+# Merged candidate lists and distinct counts are reused for this long (or
+# until the sketches are rebuilt); invoice submits do not retire them
+SKETCH_CACHE_TTL = 10 * 60
+# Candidates re-ranked exactly per requested row
+CANDIDATE_FACTOR = 5
+# Rolling leaderboards, e.g. {"window": 30} for the last 30 days
+ROLLING_WINDOWS = (7, 30, 90)
+# Query params a sketch can answer; anything else (item, warehouse, ...) cannot
+SKETCH_PARAMS = {"from_date", "to_date", "company", "branch"}
+# Request filters the sketches are not keyed on; any of them rules the sketches out
+UNCOVERED_FILTERS = ("item", "item_group", "warehouse")
+
+# Distinct count sketches are kept long enough for a year compared with the year before
+DISTINCT_RETENTION_DAYS = 800
+# HyperLogLog registers: 2^12. The relative standard error is 1.04 / sqrt(4096),
+# about 1.6%, so ~95% of distinct counts land within 3.2% of the exact value.
+HLL_PRECISION = 12
+HLL_RELATIVE_ERROR = 1.04 / math.sqrt(1 << HLL_PRECISION)
+
+# Invoice submits and cancels are applied to the sketches by a job on this
+# queue once they commit, so the sketch row locks stay off the submit
+SKETCH_QUEUE = "short"
+
+# Levels (period, scope) a metric's sketches are kept at. A Branch sketch
+# covers one company and cost center, a Company sketch every cost center of
+# the company; a Month sketch is dated the first day of its month. Any range
+# reads the Month sketches of its whole months and the Day sketches of the
+# days at either end.
+SKETCH_LEVELS = (("Day", "Branch"), ("Month", "Branch"), ("Day", "Company"), ("Month", "Company"))
+
+# Heavy hitter metrics: `key` weighted by `weight`, per (company, cost center, day).
+# A metric with an `sku_column` only counts the SKU items (see erpera_reports.items.sku_items).
+SKETCH_METRICS = {
+    "sku_qty": frappe._dict(
+        doctype="Sales Invoice",
+        table="""`tabSales Invoice Item` sii
+            INNER JOIN `tabSales Invoice` si ON si.name = sii.parent""",
+        alias="si",
+        key="sii.item_code",
+        weight="sii.qty",
+        conditions=""
+    ),
+    "item_revenue": frappe._dict(
+        doctype="Sales Invoice",
+        table="""`tabSales Invoice Item` sii
+            INNER JOIN `tabSales Invoice` si ON si.name = sii.parent""",
+        alias="si",
+        key="sii.item_code",
+        weight="sii.amount",
+        conditions="",
+        sku_column="sii.item_code"
+    ),
+    "customer_amount": frappe._dict(
+        doctype="Sales Invoice",
+        table="`tabSales Invoice` si",
+        alias="si",
+        key="si.customer",
+        weight="si.total",
+        conditions=" AND si.is_return = 0"
+    ),
+    "supplier_amount": frappe._dict(
+        doctype="Purchase Invoice",
+        table="`tabPurchase Invoice` pi",
+        alias="pi",
+        key="pi.supplier",
+        weight="pi.grand_total",
+        conditions=""
+    )
+}
+
+
+# Distinct count metrics: HyperLogLog of `key` per (company, cost center, day)
+DISTINCT_METRICS = {
+    "customers": frappe._dict(
+        doctype="Sales Invoice",
+        table="`tabSales Invoice` si",
+        alias="si",
+        key="si.customer",
+        weight="1",
+        conditions=""
+    ),
+    "suppliers": frappe._dict(
+        doctype="Purchase Invoice",
+        table="`tabPurchase Invoice` pi",
+        alias="pi",
+        key="pi.supplier",
+        weight="1",
+        conditions=""
+    ),
+    "skus": frappe._dict(
+        doctype="Sales Invoice",
+        table="""`tabSales Invoice Item` sii
+            INNER JOIN `tabSales Invoice` si ON si.name = sii.parent""",
+        alias="si",
+        key="sii.item_code",
+        weight="1",
+        conditions="",
+        sku_column="sii.item_code"
+    )
+}
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitter summary: at most `capacity` counters of
+    key -> [count, error]. A key's true weight lies in [count - error, count];
+    a key without a counter weighs at most floor() once the summary is full.
+    """
+
+    def __init__(self, counters=None, capacity=SKETCH_CAPACITY):
+        self.counters = counters or {}
+        self.capacity = capacity
+
+    def floor(self):
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, error in self.counters.values())
+
+    def add(self, key, weight):
+        counter = self.counters.get(key)
+        if counter:
+            counter[0] += weight
+        elif weight <= 0:
+            # Returns and cancellations of unmonitored keys have nothing to undo
+            return
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [weight, 0]
+        else:
+            victim = min(self.counters, key=lambda k: self.counters[k][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[key] = [floor + weight, floor]
+
+
+def merge_sketches(sketches):
+    """
+    Merge summaries of disjoint streams (days, branches) into (key -> [count,
+    error], total floor). A key missing from a full summary may still have
+    weighed up to its floor there, so that floor is added to the key's count
+    and error; a key missing from every summary weighs at most the total floor.
+    """
+    merged = {}
+    total_floor = 0
+    for sketch in sketches:
+        floor = sketch.floor()
+        total_floor += floor
+        for key, (count, error) in sketch.counters.items():
+            entry = merged.setdefault(key, [0, 0])
+            entry[0] += count - floor
+            entry[1] += error - floor
+    for entry in merged.values():
+        entry[0] += total_floor
+        entry[1] += total_floor
+    return merged, total_floor
+
+
+def get_candidates(merged, total_floor, limit):
+    """
+    Keys that can be in the top `limit`: every key whose count reaches the
+    `limit`-th best guaranteed weight (count - error), best first. None when
+    the sketches cannot bound the top: an unmonitored key may reach the
+    threshold, or more than `limit` * CANDIDATE_FACTOR keys do.
+    """
+    if not merged:
+        return None
+    guaranteed = sorted((count - error for count, error in merged.values()), reverse=True)
+    threshold = guaranteed[min(limit, len(guaranteed)) - 1]
+    if total_floor >= threshold:
+        return None
+    ranked = sorted(merged, key=lambda key: merged[key][0], reverse=True)
+    candidates = [key for key in ranked if merged[key][0] >= threshold]
+    if len(candidates) > limit * CANDIDATE_FACTOR:
+        return None
+    return candidates
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter over 2^HLL_PRECISION registers, stored sparse
+    as {register: rank} so the small daily sketches stay small. Sketches of any
+    days and branches union by taking the register-wise maximum.
+    """
+
+    def __init__(self, registers=None):
+        self.registers = {int(index): rank for index, rank in (registers or {}).items()}
+
+    def add(self, key):
+        x = int.from_bytes(hashlib.sha1(str(key).encode()).digest()[:8], "big")
+        index = x >> (64 - HLL_PRECISION)
+        rest = x & ((1 << (64 - HLL_PRECISION)) - 1)
+        rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+        if rank > self.registers.get(index, 0):
+            self.registers[index] = rank
+
+    def update(self, other):
+        for index, rank in other.registers.items():
+            if rank > self.registers.get(index, 0):
+                self.registers[index] = rank
+
+    def count(self):
+        m = 1 << HLL_PRECISION
+        zeros = m - len(self.registers)
+        z = sum(2.0 ** -rank for rank in self.registers.values()) + zeros
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / z
+        # Linear counting is near exact while most registers are still empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+def get_sketch_name(metric, company, cost_center, day, period="Day", scope="Branch"):
+    owner = hashlib.sha1(f"{company}\n{cost_center}".encode()).hexdigest()[:10]
+    level = "" if (period, scope) == ("Day", "Branch") else f"{period}-{scope}-".lower()
+    return f"{metric}-{level}{getdate(day)}-{owner}"
+
+
+def get_sketch_targets(company, cost_center, day):
+    """(company, cost center, day, period, scope) of the sketch at every SKETCH_LEVELS level a branch's day feeds."""
+    for period, scope in SKETCH_LEVELS:
+        yield (
+            company,
+            cost_center if scope == "Branch" else None,
+            getdate(day) if period == "Day" else get_first_day(day),
+            period,
+            scope
+        )
+
+
+def get_version_key(metric):
+    # A raw Redis counter: prefixed per site like the keys of get_value/set_value
+    return frappe.cache().make_key(f"erpera_reports:sketch_version:{metric}")
+
+
+def bump_sketch_version(metric):
+    """Retire the cached reads of a metric's sketches, e.g. after a rebuild."""
+    frappe.cache().incr(get_version_key(metric))
+
+
+def get_metric_weights(metric, conditions="", values=None):
+    """Weight per (company, cost center, day, key) of `metric` over the rows matching `conditions`."""
+    alias = metric.alias
+    if metric.sku_column:
+        conditions = f" AND {sku_items(metric.sku_column)}{conditions}"
+    return frappe.db.sql(f"""
+        SELECT
+            {alias}.company AS company,
+            {alias}.cost_center AS cost_center,
+            {alias}.posting_date AS day,
+            {metric.key} AS sketch_key,
+            SUM({metric.weight}) AS weight
+        FROM {metric.table}
+        WHERE {metric.key} IS NOT NULL
+        {metric.conditions}
+        {conditions}
+        GROUP BY {alias}.company, {alias}.cost_center, {alias}.posting_date, {metric.key}
+    """, values or {}, as_dict=True)
+
+
+def update_sketches(doc, method=None):
+    """
+    doc_events hook (on_submit/on_cancel): queue adding or taking back the
+    invoice in the sketches of its day once the submit or cancel commits.
+    """
+    if getdate(doc.posting_date) < getdate(add_days(today(), -max(SKETCH_RETENTION_DAYS, DISTINCT_RETENTION_DAYS))):
+        return
+    frappe.enqueue(
+        "erpera_reports.sketches.update_invoice_sketches",
+        queue=SKETCH_QUEUE,
+        enqueue_after_commit=True,
+        doctype=doc.doctype,
+        invoice=doc.name,
+        company=doc.company,
+        cost_center=doc.cost_center,
+        posting_date=doc.posting_date,
+        cancel=cint(method == "on_cancel")
+    )
+
+
+def update_invoice_sketches(doctype, invoice, company, cost_center, posting_date, cancel=0):
+    """Background job: add or take back (`cancel`) a committed invoice in the sketches of its day."""
+    day = getdate(posting_date)
+    sign = -1 if cint(cancel) else 1
+    # The invoice is read back as stored: on cancel its docstatus is already 2
+    invoice_condition = " AND {alias}.name = %(invoice)s"
+
+    if day >= getdate(add_days(today(), -SKETCH_RETENTION_DAYS)):
+        updates = {}
+        for name, metric in SKETCH_METRICS.items():
+            if metric.doctype != doctype:
+                continue
+            rows = get_metric_weights(metric, invoice_condition.format(alias=metric.alias), {"invoice": invoice})
+            for row in rows:
+                for target in get_sketch_targets(row.company, row.cost_center, row.day):
+                    weights = updates.setdefault((name,) + target, {})
+                    weights[row.sketch_key] = weights.get(row.sketch_key, 0) + sign * flt(row.weight)
+        # In name order, so concurrent jobs lock shared sketches in the same order
+        for target in sorted(updates, key=lambda target: get_sketch_name(*target)):
+            update_sketch(*target, functools.partial(add_weights, updates[target]))
+
+    if day >= getdate(add_days(today(), -DISTINCT_RETENTION_DAYS)):
+        updates = {}
+        for name, metric in DISTINCT_METRICS.items():
+            if metric.doctype != doctype:
+                continue
+            if cint(cancel):
+                # A HyperLogLog cannot forget a key: recount every level the invoice's branch and day feed
+                for target in get_sketch_targets(company, cost_center, day):
+                    updates[(name,) + target] = functools.partial(get_level_registers, name, *target)
+            else:
+                rows = get_metric_weights(metric, invoice_condition.format(alias=metric.alias), {"invoice": invoice})
+                keys = {}
+                for row in rows:
+                    for target in get_sketch_targets(row.company, row.cost_center, row.day):
+                        keys.setdefault((name,) + target, []).append(row.sketch_key)
+                for target, target_keys in keys.items():
+                    updates[target] = functools.partial(add_keys, target_keys)
+        # In name order: shared sketches are locked in the same order, and a
+        # branch's day is recounted before the month and company levels union it
+        for target in sorted(updates, key=lambda target: get_sketch_name(*target)):
+            update_sketch(*target, updates[target])
+
+    frappe.db.commit()
+
+
+def add_weights(weights, counters):
+    sketch = SpaceSaving(counters)
+    for key, weight in weights.items():
+        sketch.add(key, weight)
+    return sketch.counters
+
+
+def add_keys(keys, registers):
+    sketch = HyperLogLog(registers)
+    for key in keys:
+        sketch.add(key)
+    return sketch.registers
+
+
+def get_distinct_registers(metric, company, cost_center, day):
+    """Registers of one branch and day, recounted from the submitted invoices."""
+    definition = DISTINCT_METRICS[metric]
+    alias = definition.alias
+    rows = get_metric_weights(
+        definition,
+        f" AND {alias}.docstatus = 1 AND {alias}.company <=> %(company)s"
+        f" AND {alias}.cost_center <=> %(cost_center)s AND {alias}.posting_date = %(day)s",
+        {"company": company, "cost_center": cost_center, "day": day}
+    )
+    return add_keys([row.sketch_key for row in rows], {})
+
+
+def get_level_registers(metric, company, cost_center, day, period, scope, registers=None):
+    """
+    Registers of a distinct count sketch, recounted: a branch's day from the
+    submitted invoices, any other level as the union of the branch sketches
+    it covers.
+    """
+    if (period, scope) == ("Day", "Branch"):
+        return get_distinct_registers(metric, company, cost_center, day)
+
+    conditions = " AND company <=> %(company)s AND scope = 'Branch'"
+    if scope == "Branch":
+        conditions += " AND cost_center <=> %(cost_center)s AND period = 'Day' AND day BETWEEN %(day)s AND %(last_day)s"
+    else:
+        conditions += " AND period = %(period)s AND day = %(day)s"
+    rows = frappe.db.sql(f"""
+        SELECT data
+        FROM `tabReport Sketch`
+        WHERE metric = %(metric)s
+        {conditions}
+    """, {
+        "metric": metric,
+        "company": company,
+        "cost_center": cost_center,
+        "period": period,
+        "day": day,
+        "last_day": get_last_day(day)
+    }, as_dict=True)
+    union = HyperLogLog()
+    for row in rows:
+        union.update(HyperLogLog(json.loads(row.data or "{}")))
+    return union.registers
+
+
+def update_sketch(metric, company, cost_center, day, period, scope, apply):
+    """Store apply(data) as the data of a sketch, creating the sketch empty first."""
+    name = get_sketch_name(metric, company, cost_center, day, period, scope)
+    frappe.get_doc({
+        "doctype": "Report Sketch",
+        "name": name,
+        "metric": metric,
+        "company": company,
+        "cost_center": cost_center,
+        "day": day,
+        "period": period,
+        "scope": scope,
+        "data": "{}"
+    }).db_insert(ignore_if_duplicate=True)
+
+    # Row lock: concurrent sketch jobs of the same branch and day queue here
+    data = frappe.db.sql("SELECT data FROM `tabReport Sketch` WHERE name = %s FOR UPDATE", name)[0][0]
+    data = apply(json.loads(data or "{}"))
+    frappe.db.set_value("Report Sketch", name, "data", json.dumps(data), update_modified=False)
+
+
+def apply_rolling_window(filters):
+    """Parsed filters, with a `window` of ROLLING_WINDOWS days turned into the matching date range."""
+    if isinstance(filters, str):
+        filters = json.loads(filters)
+    filters = dict(filters or {})
+    if cint(filters.get("window")) in ROLLING_WINDOWS:
+        filters["from_date"] = add_days(today(), -(cint(filters["window"]) - 1))
+        filters["to_date"] = today()
+    return filters
+
+
+def get_sketch_candidates(metric, params, limit, filters):
+    """
+    Candidate keys for the top `limit` of `metric` under the query `params`
+    (from_date, to_date and optionally company/branch), for an exact re-rank
+    restricted to them. None when the sketches cannot answer the params, or
+    when the request `filters` set any of UNCOVERED_FILTERS.
+    """
+    if any((filters or {}).get(key) not in (None, "", []) for key in UNCOVERED_FILTERS):
+        return None
+    params = {key: value for key, value in params.items() if value not in (None, "", [])}
+    if set(params) - SKETCH_PARAMS or not (params.get("from_date") and params.get("to_date")):
+        return None
+    if getdate(params["from_date"]) < getdate(add_days(today(), -SKETCH_RETENTION_DAYS)):
+        return None
+
+    cache_key = "erpera_reports:sketch_candidates:" + hashlib.sha1(json.dumps([
+        metric,
+        str(getdate(params["from_date"])),
+        str(getdate(params["to_date"])),
+        params.get("company"),
+        params.get("branch"),
+        limit,
+        cint(frappe.cache().get(get_version_key(metric)))
+    ]).encode()).hexdigest()
+    candidates = frappe.cache().get_value(cache_key)
+    if candidates is None:
+        merged, total_floor = merge_sketches(SpaceSaving(data) for data in load_level_data(metric, params))
+        candidates = get_candidates(merged, total_floor, limit) or []
+        # A lagging replica may not hold the sketches of the current version yet
+        if not is_lagging_read():
+            frappe.cache().set_value(cache_key, candidates, expires_in_sec=SKETCH_CACHE_TTL)
+    return candidates or None
+
+
+def load_level_data(metric, params):
+    """
+    Data of the fewest sketches covering the params' date range: the Month
+    sketches of its whole months and the Day sketches of the days at either
+    end, of every company (or `company`), or of the cost centers of `branch`.
+    """
+    whole, partial = split_whole_months(getdate(params["from_date"]), getdate(params["to_date"]))
+    spans = ([("Month",) + whole] if whole else []) + [("Day", start, end) for start, end in partial]
+
+    values = {"metric": metric, "scope": "Branch" if params.get("branch") else "Company"}
+    span_conditions = []
+    for i, (period, start, end) in enumerate(spans):
+        values.update({f"period_{i}": period, f"start_{i}": start, f"end_{i}": end})
+        span_conditions.append(f"(period = %(period_{i})s AND day BETWEEN %(start_{i})s AND %(end_{i})s)")
+
+    conditions = ""
+    if params.get("company"):
+        conditions += " AND company = %(company)s"
+        values["company"] = params["company"]
+    if params.get("branch"):
+        conditions += f" AND {cost_center_condition('cost_center', params['branch'])}"
+    rows = frappe.db.sql(f"""
+        SELECT data
+        FROM `tabReport Sketch`
+        WHERE metric = %(metric)s
+        AND scope = %(scope)s
+        AND ({" OR ".join(span_conditions)})
+        {conditions}
+    """, values, as_dict=True)
+    return [json.loads(row.data or "{}") for row in rows]
+
+
+def count_distinct(metric, from_date, to_date, company=None, branch=None):
+    """
+    Approximate distinct count of a DISTINCT_METRICS metric over any date
+    range, company and branch: the union of the Month sketches of its whole
+    months and the Day sketches at either end (see load_level_data()),
+    within HLL_RELATIVE_ERROR. None when the range starts before the
+    retention window.
+    """
+    if not (from_date and to_date):
+        return None
+    if getdate(from_date) < getdate(add_days(today(), -DISTINCT_RETENTION_DAYS)):
+        return None
+
+    params = {"from_date": getdate(from_date), "to_date": getdate(to_date), "company": company, "branch": branch}
+    cache_key = "erpera_reports:distinct_count:" + hashlib.sha1(json.dumps([
+        metric,
+        str(params["from_date"]),
+        str(params["to_date"]),
+        company,
+        branch,
+        cint(frappe.cache().get(get_version_key(metric)))
+    ]).encode()).hexdigest()
+    value = frappe.cache().get_value(cache_key)
+    if value is None:
+        union = HyperLogLog()
+        for registers in load_level_data(metric, params):
+            union.update(HyperLogLog(registers))
+        value = union.count()
+        if not is_lagging_read():
+            frappe.cache().set_value(cache_key, value, expires_in_sec=SKETCH_CACHE_TTL)
+    return value
+
+
+def get_distinct_comparison(metric, windows, company=None, branch=None):
+    """count_distinct() of both comparison windows, or None when either is out of range."""
+    current = count_distinct(metric, *windows.current, company=company, branch=branch)
+    previous = count_distinct(metric, *windows.previous, company=company, branch=branch)
+    if current is None or previous is None:
+        return None
+    return get_comparison(current, previous)
+
+
+def rebuild_sketches(from_date=None, to_date=None):
+    """
+    Rebuild the sketches of every level over the whole months of a date range
+    (default: the retention window) from the submitted invoices. The weights
+    are exact here, so a rebuilt sketch holds the true top SKETCH_CAPACITY
+    keys with no error.
+    """
+    from_date = get_first_day(from_date or add_days(today(), -SKETCH_RETENTION_DAYS))
+    to_date = get_last_day(to_date or today())
+
+    for name, metric in SKETCH_METRICS.items():
+        frappe.db.delete("Report Sketch", {"metric": name, "day": ["between", [from_date, to_date]]})
+
+        rows = get_metric_weights(
+            metric,
+            f" AND {metric.alias}.docstatus = 1 AND {metric.alias}.posting_date BETWEEN %(from_date)s AND %(to_date)s",
+            {"from_date": from_date, "to_date": to_date}
+        )
+        weights = {}
+        for row in rows:
+            for target in get_sketch_targets(row.company, row.cost_center, row.day):
+                sketch_weights = weights.setdefault(target, {})
+                sketch_weights[row.sketch_key] = sketch_weights.get(row.sketch_key, 0) + flt(row.weight)
+
+        for (company, cost_center, day, period, scope), sketch_weights in weights.items():
+            # Heaviest first: every key left out weighs at most the lightest one kept
+            heaviest = sorted(sketch_weights.items(), key=lambda item: item[1], reverse=True)[:SKETCH_CAPACITY]
+            frappe.get_doc({
+                "doctype": "Report Sketch",
+                "name": get_sketch_name(name, company, cost_center, day, period, scope),
+                "metric": name,
+                "company": company,
+                "cost_center": cost_center,
+                "day": day,
+                "period": period,
+                "scope": scope,
+                "data": json.dumps({key: [weight, 0] for key, weight in heaviest if weight > 0})
+            }).db_insert()
+        bump_sketch_version(name)
+    frappe.db.commit()
+
+
+def rebuild_distinct_sketches(from_date=None, to_date=None):
+    """
+    Rebuild the distinct count sketches of every level over the whole months
+    of a date range (default: their retention window).
+    """
+    from_date = get_first_day(from_date or add_days(today(), -DISTINCT_RETENTION_DAYS))
+    to_date = get_last_day(to_date or today())
+
+    for name, metric in DISTINCT_METRICS.items():
+        frappe.db.delete("Report Sketch", {"metric": name, "day": ["between", [from_date, to_date]]})
+
+        rows = get_metric_weights(
+            metric,
+            f" AND {metric.alias}.docstatus = 1 AND {metric.alias}.posting_date BETWEEN %(from_date)s AND %(to_date)s",
+            {"from_date": from_date, "to_date": to_date}
+        )
+        sketches = {}
+        for row in rows:
+            for target in get_sketch_targets(row.company, row.cost_center, row.day):
+                sketches.setdefault(target, HyperLogLog()).add(row.sketch_key)
+
+        for (company, cost_center, day, period, scope), sketch in sketches.items():
+            frappe.get_doc({
+                "doctype": "Report Sketch",
+                "name": get_sketch_name(name, company, cost_center, day, period, scope),
+                "metric": name,
+                "company": company,
+                "cost_center": cost_center,
+                "day": day,
+                "period": period,
+                "scope": scope,
+                "data": json.dumps(sketch.registers)
+            }).db_insert()
+        bump_sketch_version(name)
+    frappe.db.commit()
+
+
+def purge_expired_sketches():
+    """Daily scheduler job: drop sketches past their retention window, Month sketches once wholly past it."""
+    for metrics, retention_days in ((SKETCH_METRICS, SKETCH_RETENTION_DAYS), (DISTINCT_METRICS, DISTINCT_RETENTION_DAYS)):
+        cutoff = getdate(add_days(today(), -retention_days))
+        frappe.db.delete("Report Sketch", {"metric": ["in", list(metrics)], "period": "Day", "day": ["<", cutoff]})
+        frappe.db.delete("Report Sketch", {
+            "metric": ["in", list(metrics)],
+            "period": "Month",
+            "day": ["<", get_first_day(cutoff)]
+        })
@@ -2,6 +2,15 @@ import frappe
 from frappe import _
 import json
 from datetime import datetime, timedelta
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.items import items_in_group, reportable_items, stock_items
+from erpera_reports.jobs import report_progress
+from erpera_reports.movements import get_stock_movements
+from erpera_reports.rollup import get_entity_name, get_month_label
+from erpera_reports.topn import get_share_pie, get_top_n_per_group
+
+# Doctypes whose modification watermark versions the report responses
+REPORT_SOURCES = ("Stock Ledger Entry", "Batch", "Sales Invoice", "Item", "Item Group")
 
 def apply_filters_to_query(base_query, filters):
     """
@@ -30,8 +39,7 @@ def apply_filters_to_query(base_query, filters):
     
     # Item group filter
     if filters.get('item_group'):
-        conditions.append("i.item_group = %(item_group)s")
-        params['item_group'] = filters['item_group']
+        conditions.append(items_in_group("sle.item_code", filters['item_group']))
     
     # Company filter
     if filters.get('company'):
@@ -78,6 +86,7 @@ def get_expiry_color_coding(expiry_date):
         return '#44aa44'  # Green for > 45 days
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_warehouse_wise_stock(filters=None):
     """
     Chart Name: Warehouse Wise Stock
@@ -85,7 +94,7 @@ def get_warehouse_wise_stock(filters=None):
     Shows stock levels by warehouse
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         COALESCE(sle.warehouse, 'Unknown Warehouse') AS warehouse,
         DATE_FORMAT(sle.posting_date, '%%b %%Y') AS month_year,
@@ -94,13 +103,10 @@ def get_warehouse_wise_stock(filters=None):
         SUM(sle.stock_value) AS total_value,
         COUNT(DISTINCT sle.item_code) AS item_count
     FROM `tabStock Ledger Entry` sle
-    INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.warehouse IS NOT NULL
         AND sle.warehouse != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -191,6 +197,7 @@ def get_warehouse_wise_stock(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_company_wise_stock(filters=None):
     """
     Chart Name: Company Wise Stock
@@ -198,7 +205,7 @@ def get_company_wise_stock(filters=None):
     Shows stock levels by company
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         COALESCE(sle.company, 'Unknown Company') AS company,
         DATE_FORMAT(sle.posting_date, '%%b %%Y') AS month_year,
@@ -207,13 +214,10 @@ def get_company_wise_stock(filters=None):
         SUM(sle.stock_value) AS total_value,
         COUNT(DISTINCT sle.item_code) AS item_count
     FROM `tabStock Ledger Entry` sle
-    INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.company IS NOT NULL
         AND sle.company != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -304,6 +308,7 @@ def get_company_wise_stock(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_stock_summary(filters=None):
     """
     Chart Name: Stock Summary
@@ -311,7 +316,7 @@ def get_stock_summary(filters=None):
     Shows overall stock summary
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         DATE_FORMAT(sle.posting_date, '%%b %%Y') AS month_year,
         DATE_FORMAT(sle.posting_date, '%%Y-%%m') AS sort_date,
@@ -321,11 +326,8 @@ def get_stock_summary(filters=None):
         COUNT(DISTINCT sle.warehouse) AS warehouse_count,
         COUNT(DISTINCT sle.company) AS company_count
     FROM `tabStock Ledger Entry` sle
-    INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
-        i.is_stock_item = 1
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+        {reportable_items('sle.item_code', stock_only=True)}
         
     """
     
@@ -375,6 +377,7 @@ def get_stock_summary(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(schema="stock.stacked_expiry", sources=REPORT_SOURCES, cost="heavy")
 def get_consolidated_stock(filters=None):
     """
     Chart Name: Consolidated Stock
@@ -382,7 +385,7 @@ def get_consolidated_stock(filters=None):
     Shows consolidated stock data by company and warehouse
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         CASE 
             WHEN sle.warehouse IS NOT NULL AND sle.warehouse != '' 
@@ -397,14 +400,11 @@ def get_consolidated_stock(filters=None):
         SUM(sle.stock_value) AS total_value,
         COUNT(DISTINCT sle.item_code) AS item_count
     FROM `tabStock Ledger Entry` sle
-    INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.batch_no IS NOT NULL
         AND b.expiry_date IS NOT NULL
         AND sle.actual_qty > 0
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -430,7 +430,7 @@ def get_consolidated_stock(filters=None):
         
         # If no batch data, create consolidated sample data
         if not result:
-            alt_query = """
+            alt_query = f"""
             SELECT
                 CASE 
                     WHEN sle.warehouse IS NOT NULL AND sle.warehouse != '' 
@@ -441,9 +441,8 @@ def get_consolidated_stock(filters=None):
                 COUNT(DISTINCT sle.item_code) as item_count,
                 SUM(sle.stock_value) as total_value
             FROM `tabStock Ledger Entry` sle
-            INNER JOIN `tabItem` i ON sle.item_code = i.name
             WHERE 
-                i.is_stock_item = 1
+                {stock_items('sle.item_code')}
                 AND sle.actual_qty > 0
                 
             """
@@ -650,6 +649,7 @@ def get_consolidated_stock(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_entity_wise_stock(filters=None):
     """
     Get summary of all entities with their totals for a single-bar-per-entity chart
@@ -689,11 +689,12 @@ def get_entity_wise_stock(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_stock_items_by_warehouse(filters=None):
     """
     Get top stock items for each warehouse with percentage calculations
     """
-    base_query = """
+    base_query = f"""
     SELECT 
         sle.warehouse,
         i.item_name,
@@ -703,12 +704,10 @@ def get_top_stock_items_by_warehouse(filters=None):
         COUNT(DISTINCT sle.item_code) as item_count
     FROM `tabStock Ledger Entry` sle
     INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.warehouse IS NOT NULL 
         AND sle.warehouse != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -717,71 +716,22 @@ def get_top_stock_items_by_warehouse(filters=None):
         query, params = apply_filters_to_query(base_query, filters)
         query += """
         GROUP BY sle.warehouse, sle.item_code, i.item_name
-        ORDER BY sle.warehouse, total_value DESC
         """
         
-        result = frappe.db.sql(query, params, as_dict=True)
-        
-        # Process data by warehouse
-        warehouse_data = {}
-        for row in result:
-            warehouse = row['warehouse']
-            if warehouse not in warehouse_data:
-                warehouse_data[warehouse] = {
-                    'items': [],
-                    'total_warehouse_value': 0
-                }
-            
-            # Add to warehouse total
-            warehouse_data[warehouse]['total_warehouse_value'] += float(row['total_value'])
-            
-            # Only store top 10 items per warehouse
-            if len(warehouse_data[warehouse]['items']) < 10:
-                warehouse_data[warehouse]['items'].append({
-                    'item_name': row['item_name'],
-                    'value': float(row['total_value']),
-                    'quantity': float(row['total_quantity'])
-                })
-        
-        # Color palette for the pie charts
-        colors = [
-            '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
-            '#FF9F40', '#FF6384', '#C9CBCF', '#4BC0C0', '#FF9F40'
-        ]
+        # Top 10 items per warehouse, the rest summed into one row
+        groups = get_top_n_per_group(
+            query, params, 'warehouse', ['total_value', 'total_quantity'], 10, columns=['item_code', 'item_name']
+        )
         
         # Prepare datasets for each warehouse
         datasets = {}
-        for warehouse, data in warehouse_data.items():
-            total_warehouse_value = data['total_warehouse_value']
-            
-            # Calculate percentages and prepare labels
-            labels = []
-            data_values = []
-            background_colors = []
-            
-            # Process top items
-            top_items_value = 0
-            for i, item in enumerate(data['items']):
-                percentage = (item['value'] / total_warehouse_value) * 100
-                top_items_value += item['value']
-                label = f"{item['item_name']} ({percentage:.1f}%)"
-                labels.append(label)
-                data_values.append(item['value'])
-                background_colors.append(colors[i % len(colors)])
-            
-            # Add "Others" category if there's remaining value
-            remaining_value = total_warehouse_value - top_items_value
-            if remaining_value > 0:
-                percentage = (remaining_value / total_warehouse_value) * 100
-                labels.append(f"Others ({percentage:.1f}%)")
-                data_values.append(remaining_value)
-                background_colors.append('#C9CBCF')
-            
+        for warehouse, entry in groups.items():
+            pie = get_share_pie(entry, 'item_name', 'total_value')
             datasets[warehouse] = {
-                'labels': labels,
-                'data': data_values,
-                'backgroundColor': background_colors,
-                'total_value': total_warehouse_value
+                'labels': pie.labels,
+                'data': pie.data,
+                'backgroundColor': pie.backgroundColor,
+                'total_value': pie.total
             }
         
         return {
@@ -799,11 +749,12 @@ def get_top_stock_items_by_warehouse(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_top_stock_items_by_company(filters=None):
     """
     Get top stock items for each company with percentage calculations
     """
-    base_query = """
+    base_query = f"""
     SELECT 
         sle.company,
         i.item_name,
@@ -813,12 +764,10 @@ def get_top_stock_items_by_company(filters=None):
         COUNT(DISTINCT sle.item_code) as item_count
     FROM `tabStock Ledger Entry` sle
     INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.company IS NOT NULL 
         AND sle.company != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -827,72 +776,22 @@ def get_top_stock_items_by_company(filters=None):
         query, params = apply_filters_to_query(base_query, filters)
         query += """
         GROUP BY sle.company, sle.item_code, i.item_name
-        ORDER BY sle.company, total_value DESC
         """
         
-        result = frappe.db.sql(query, params, as_dict=True)
-        
-        # Process data by company
-        company_data = {}
-        for row in result:
-            company = row['company']
-            if company not in company_data:
-                company_data[company] = {
-                    'items': [],
-                    'total_company_value': 0
-                }
-            
-            # Add to company total
-            value = float(row['total_value']) if row['total_value'] else 0
-            company_data[company]['total_company_value'] += value
-            
-            # Only store top 10 items per company
-            if len(company_data[company]['items']) < 10:
-                company_data[company]['items'].append({
-                    'item_name': row['item_name'],
-                    'value': value,
-                    'quantity': float(row['total_quantity']) if row['total_quantity'] else 0
-                })
-        
-        # Color palette for the pie charts
-        colors = [
-            '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
-            '#FF9F40', '#FF6384', '#C9CBCF', '#4BC0C0', '#FF9F40'
-        ]
+        # Top 10 items per company, the rest summed into one row
+        groups = get_top_n_per_group(
+            query, params, 'company', ['total_value', 'total_quantity'], 10, columns=['item_code', 'item_name']
+        )
         
         # Prepare datasets for each company
         datasets = {}
-        for company, data in company_data.items():
-            total_company_value = data['total_company_value']
-            
-            # Calculate percentages and prepare labels
-            labels = []
-            data_values = []
-            background_colors = []
-            
-            # Process top items
-            top_items_value = 0
-            for i, item in enumerate(data['items']):
-                percentage = (item['value'] / total_company_value) * 100
-                top_items_value += item['value']
-                label = f"{item['item_name']} ({percentage:.1f}%)"
-                labels.append(label)
-                data_values.append(item['value'])
-                background_colors.append(colors[i % len(colors)])
-            
-            # Add "Others" category if there's remaining value
-            remaining_value = total_company_value - top_items_value
-            if remaining_value > 0:
-                percentage = (remaining_value / total_company_value) * 100
-                labels.append(f"Others ({percentage:.1f}%)")
-                data_values.append(remaining_value)
-                background_colors.append('#C9CBCF')
-            
+        for company, entry in groups.items():
+            pie = get_share_pie(entry, 'item_name', 'total_value')
             datasets[company] = {
-                'labels': labels,
-                'data': data_values,
-                'backgroundColor': background_colors,
-                'total_value': total_company_value
+                'labels': pie.labels,
+                'data': pie.data,
+                'backgroundColor': pie.backgroundColor,
+                'total_value': pie.total
             }
         
         return {
@@ -911,12 +810,13 @@ def get_top_stock_items_by_company(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES, cost="heavy")
 def get_consolidated_top_stock_items(filters=None):
     """
     Get consolidated top 10 stock items across all companies
     Shows overall top stock items regardless of company
     """
-    base_query = """
+    base_query = f"""
     SELECT 
         i.item_name,
         sle.item_code,
@@ -926,10 +826,8 @@ def get_consolidated_top_stock_items(filters=None):
         GROUP_CONCAT(DISTINCT sle.company) as companies
     FROM `tabStock Ledger Entry` sle
     INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
-        i.is_stock_item = 1
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
+        {reportable_items('sle.item_code', stock_only=True)}
         
     """
     
@@ -1007,6 +905,7 @@ def get_consolidated_top_stock_items(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_warehouse_wise_expiry_stock(filters=None):
     """
     Chart Name: Warehouse Wise Expiry Stock
@@ -1014,7 +913,7 @@ def get_warehouse_wise_expiry_stock(filters=None):
     Shows expiry stock by warehouse with color coding based on expiry days
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         COALESCE(sle.warehouse, 'Unknown Warehouse') AS warehouse,
         i.item_name,
@@ -1026,16 +925,14 @@ def get_warehouse_wise_expiry_stock(filters=None):
         DATEDIFF(b.expiry_date, CURDATE()) AS days_until_expiry
     FROM `tabStock Ledger Entry` sle
     INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     LEFT JOIN `tabBatch` b ON sle.batch_no = b.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.warehouse IS NOT NULL
         AND sle.warehouse != ''
         AND sle.batch_no IS NOT NULL
         AND b.expiry_date IS NOT NULL
         AND sle.actual_qty > 0
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -1055,16 +952,14 @@ def get_warehouse_wise_expiry_stock(filters=None):
         # If no batch data, try with item expiry dates or create sample data
         if not result:
             # Try alternative approach - check if there are any items with shelf_life_in_days
-            alt_query = """
+            alt_query = f"""
             SELECT
                 COALESCE(sle.warehouse, 'Unknown Warehouse') AS warehouse,
                 COUNT(DISTINCT sle.item_code) as item_count,
                 SUM(sle.stock_value) as total_value
             FROM `tabStock Ledger Entry` sle
-            INNER JOIN `tabItem` i ON sle.item_code = i.name
-            INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
             WHERE 
-                i.is_stock_item = 1
+                {stock_items('sle.item_code')}
                 AND sle.warehouse IS NOT NULL
                 AND sle.warehouse != ''
                 AND sle.actual_qty > 0
@@ -1209,6 +1104,7 @@ def get_warehouse_wise_expiry_stock(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_company_wise_expiry_stock(filters=None):
     """
     Chart Name: Company Wise Expiry Stock
@@ -1216,7 +1112,7 @@ def get_company_wise_expiry_stock(filters=None):
     Shows expiry stock by company with color coding based on expiry days
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         COALESCE(sle.company, 'Unknown Company') AS company,
         i.item_name,
@@ -1228,16 +1124,14 @@ def get_company_wise_expiry_stock(filters=None):
         DATEDIFF(b.expiry_date, CURDATE()) AS days_until_expiry
     FROM `tabStock Ledger Entry` sle
     INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     LEFT JOIN `tabBatch` b ON sle.batch_no = b.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.company IS NOT NULL
         AND sle.company != ''
         AND sle.batch_no IS NOT NULL
         AND b.expiry_date IS NOT NULL
         AND sle.actual_qty > 0
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -1256,16 +1150,14 @@ def get_company_wise_expiry_stock(filters=None):
         
         # If no batch data, create sample data based on companies
         if not result:
-            alt_query = """
+            alt_query = f"""
             SELECT
                 COALESCE(sle.company, 'Unknown Company') AS company,
                 COUNT(DISTINCT sle.item_code) as item_count,
                 SUM(sle.stock_value) as total_value
             FROM `tabStock Ledger Entry` sle
-            INNER JOIN `tabItem` i ON sle.item_code = i.name
-            INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
             WHERE 
-                i.is_stock_item = 1
+                {stock_items('sle.item_code')}
                 AND sle.company IS NOT NULL
                 AND sle.company != ''
                 AND sle.actual_qty > 0
@@ -1408,6 +1300,7 @@ def get_company_wise_expiry_stock(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_expiry_stock_summary(filters=None):
     """
     Chart Name: Expiry Stock Summary
@@ -1415,7 +1308,7 @@ def get_expiry_stock_summary(filters=None):
     Shows overall expiry stock summary across all warehouses and companies
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         DATE_FORMAT(sle.posting_date, '%%b %%Y') AS month_year,
         DATE_FORMAT(sle.posting_date, '%%Y-%%m') AS sort_date,
@@ -1430,14 +1323,12 @@ def get_expiry_stock_summary(filters=None):
         COUNT(DISTINCT sle.company) AS company_count
     FROM `tabStock Ledger Entry` sle
     INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     LEFT JOIN `tabBatch` b ON sle.batch_no = b.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.batch_no IS NOT NULL
         AND b.expiry_date IS NOT NULL
         AND sle.actual_qty > 0
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -1456,7 +1347,7 @@ def get_expiry_stock_summary(filters=None):
         
         # If no batch data found, create alternate query without batch filtering
         if not result:
-            alt_query = """
+            alt_query = f"""
             SELECT
                 DATE_FORMAT(sle.posting_date, '%%b %%Y') AS month_year,
                 DATE_FORMAT(sle.posting_date, '%%Y-%%m') AS sort_date,
@@ -1465,10 +1356,8 @@ def get_expiry_stock_summary(filters=None):
                 COUNT(DISTINCT sle.warehouse) AS warehouse_count,
                 COUNT(DISTINCT sle.company) AS company_count
             FROM `tabStock Ledger Entry` sle
-            INNER JOIN `tabItem` i ON sle.item_code = i.name
-            INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
             WHERE 
-                i.is_stock_item = 1
+                {stock_items('sle.item_code')}
                 AND sle.actual_qty > 0
                 
             """
@@ -1608,6 +1497,7 @@ def get_expiry_stock_summary(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(schema="stock.expired_items", sources=REPORT_SOURCES, cost="heavy")
 def get_consolidated_expired_items(filters=None):
     """
     Chart Name: Consolidated Expired Items
@@ -1615,7 +1505,7 @@ def get_consolidated_expired_items(filters=None):
     Shows expired/expiring items across all companies with different color coding
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         i.item_name,
         sle.item_code,
@@ -1630,15 +1520,13 @@ def get_consolidated_expired_items(filters=None):
         GROUP_CONCAT(DISTINCT sle.warehouse) as warehouses
     FROM `tabStock Ledger Entry` sle
     INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     LEFT JOIN `tabBatch` b ON sle.batch_no = b.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.batch_no IS NOT NULL
         AND b.expiry_date IS NOT NULL
         AND sle.actual_qty > 0
         AND DATEDIFF(b.expiry_date, CURDATE()) <= 45
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -1661,7 +1549,7 @@ def get_consolidated_expired_items(filters=None):
         
         # If no expired batch data, create sample data based on companies/warehouses
         if not result:
-            alt_query = """
+            alt_query = f"""
             SELECT
                 CASE 
                     WHEN sle.warehouse IS NOT NULL AND sle.warehouse != '' 
@@ -1672,9 +1560,8 @@ def get_consolidated_expired_items(filters=None):
                 COUNT(DISTINCT sle.item_code) as item_count,
                 SUM(sle.stock_value) as total_value
             FROM `tabStock Ledger Entry` sle
-            INNER JOIN `tabItem` i ON sle.item_code = i.name
             WHERE 
-                i.is_stock_item = 1
+                {stock_items('sle.item_code')}
                 AND sle.actual_qty > 0
                 
             """
@@ -1885,6 +1772,7 @@ def get_consolidated_expired_items(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(schema="stock.stacked_expiry", sources=REPORT_SOURCES, background=True)
 def get_consolidated_expiry_stock(filters=None):
     """
     Chart Name: Consolidated Expiry Stock
@@ -1893,7 +1781,7 @@ def get_consolidated_expiry_stock(filters=None):
     different colors for each company and expiration-based color coding
     """
     
-    base_query = """
+    base_query = f"""
     SELECT
         CASE 
             WHEN sle.warehouse IS NOT NULL AND sle.warehouse != '' 
@@ -1908,14 +1796,11 @@ def get_consolidated_expiry_stock(filters=None):
         SUM(sle.stock_value) AS total_value,
         COUNT(DISTINCT sle.item_code) AS item_count
     FROM `tabStock Ledger Entry` sle
-    INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
     WHERE 
-        i.is_stock_item = 1
+        {reportable_items('sle.item_code', stock_only=True)}
         AND sle.batch_no IS NOT NULL
         AND b.expiry_date IS NOT NULL
         AND sle.actual_qty > 0
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -1938,10 +1823,11 @@ def get_consolidated_expiry_stock(filters=None):
         """
         
         result = frappe.db.sql(query, params, as_dict=True)
+        report_progress(60, "Categorising by expiry")
         
         # If no batch data, create consolidated sample data
         if not result:
-            alt_query = """
+            alt_query = f"""
             SELECT
                 CASE 
                     WHEN sle.warehouse IS NOT NULL AND sle.warehouse != '' 
@@ -1952,9 +1838,8 @@ def get_consolidated_expiry_stock(filters=None):
                 COUNT(DISTINCT sle.item_code) as item_count,
                 SUM(sle.stock_value) as total_value
             FROM `tabStock Ledger Entry` sle
-            INNER JOIN `tabItem` i ON sle.item_code = i.name
             WHERE 
-                i.is_stock_item = 1
+                {stock_items('sle.item_code')}
                 AND sle.actual_qty > 0
                 
             """
@@ -2161,6 +2046,7 @@ def get_consolidated_expiry_stock(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(sources=REPORT_SOURCES)
 def get_expiry_demand_comparison(filters=None):
     """
     Chart Name: Expiry vs Demand Comparison
@@ -2169,7 +2055,7 @@ def get_expiry_demand_comparison(filters=None):
     """
     
     # Stock query with expiry data
-    stock_query = """
+    stock_query = f"""
         SELECT
             i.item_name,
             sle.item_code,
@@ -2180,14 +2066,12 @@ def get_expiry_demand_comparison(filters=None):
         DATEDIFF(b.expiry_date, CURDATE()) AS days_until_expiry
         FROM `tabStock Ledger Entry` sle
         INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
         LEFT JOIN `tabBatch` b ON sle.batch_no = b.name
         WHERE 
-            i.is_stock_item = 1
+            {reportable_items('sle.item_code', stock_only=True)}
             AND sle.batch_no IS NOT NULL
             AND b.expiry_date IS NOT NULL
             AND sle.actual_qty > 0
-            AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
         
     """
     
@@ -2261,6 +2145,7 @@ def get_expiry_demand_comparison(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(schema="stock.in_out_branch", sources=REPORT_SOURCES)
 def get_branch_wise_in_out_quantity(filters=None):
     """
     Chart Name: Branch Wise In/Out Quantity
@@ -2268,43 +2153,9 @@ def get_branch_wise_in_out_quantity(filters=None):
     Shows stock in and out quantities by branch (warehouse)
     """
     
-    base_query = """
-    SELECT
-        COALESCE(sle.warehouse, 'Unknown Warehouse') AS warehouse,
-        DATE_FORMAT(sle.posting_date, '%%b %%Y') AS month_year,
-        DATE_FORMAT(sle.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(CASE WHEN sle.actual_qty > 0 THEN sle.actual_qty ELSE 0 END) AS quantity_in,
-        SUM(CASE WHEN sle.actual_qty < 0 THEN ABS(sle.actual_qty) ELSE 0 END) AS quantity_out,
-        SUM(CASE WHEN sle.actual_qty > 0 THEN sle.stock_value ELSE 0 END) AS value_in,
-        SUM(CASE WHEN sle.actual_qty < 0 THEN ABS(sle.stock_value) ELSE 0 END) AS value_out,
-        COUNT(DISTINCT sle.item_code) AS item_count
-    FROM `tabStock Ledger Entry` sle
-    INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        i.is_stock_item = 1
-        AND sle.warehouse IS NOT NULL
-        AND sle.warehouse != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-        
-    """
-    
     try:
-        # Apply filters to query
-        query, params = apply_filters_to_query(base_query, filters)
-        
-        # Add GROUP BY and ORDER BY clauses
-        query += """
-        GROUP BY 
-            sle.warehouse,
-            DATE_FORMAT(sle.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(sle.posting_date, '%%b %%Y')
-        ORDER BY 
-            sle.warehouse,
-            sort_date
-        """
-        
-        result = frappe.db.sql(query, params, as_dict=True)
+        # In/out movements per company, warehouse and month, from the stock movement summary
+        result = get_stock_movements(filters)
         
         if not result:
             return {
@@ -2321,9 +2172,9 @@ def get_branch_wise_in_out_quantity(filters=None):
         
         for row in result:
             branch = row['warehouse']
-            month = row['month_year']
-            in_qty = float(row['quantity_in']) if row['quantity_in'] else 0
-            out_qty = float(row['quantity_out']) if row['quantity_out'] else 0
+            month = get_month_label(row['sort_date'])
+            in_qty = row['qty_in']
+            out_qty = row['qty_out']
             
             if branch not in branch_data:
                 branch_data[branch] = {}
@@ -2421,6 +2272,7 @@ def get_branch_wise_in_out_quantity(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(schema="stock.in_out_company", sources=REPORT_SOURCES)
 def get_company_wise_in_out_quantity(filters=None):
     """
     Chart Name: Company Wise In/Out Quantity
@@ -2428,43 +2280,9 @@ def get_company_wise_in_out_quantity(filters=None):
     Shows stock in and out quantities by company
     """
     
-    base_query = """
-    SELECT
-        COALESCE(sle.company, 'Unknown Company') AS company,
-        DATE_FORMAT(sle.posting_date, '%%b %%Y') AS month_year,
-        DATE_FORMAT(sle.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(CASE WHEN sle.actual_qty > 0 THEN sle.actual_qty ELSE 0 END) AS quantity_in,
-        SUM(CASE WHEN sle.actual_qty < 0 THEN ABS(sle.actual_qty) ELSE 0 END) AS quantity_out,
-        SUM(CASE WHEN sle.actual_qty > 0 THEN sle.stock_value ELSE 0 END) AS value_in,
-        SUM(CASE WHEN sle.actual_qty < 0 THEN ABS(sle.stock_value) ELSE 0 END) AS value_out,
-        COUNT(DISTINCT sle.item_code) AS item_count
-    FROM `tabStock Ledger Entry` sle
-    INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        i.is_stock_item = 1
-        AND sle.company IS NOT NULL
-        AND sle.company != ''
-        AND i.item_group NOT IN ('Raw Material', 'Services', 'Sub Assemblies', 'Consumable', 'Furniture', 'EXPENSE', 'FIXED ASSET')
-        
-    """
-    
     try:
-        # Apply filters to query
-        query, params = apply_filters_to_query(base_query, filters)
-        
-        # Add GROUP BY and ORDER BY clauses
-        query += """
-        GROUP BY 
-            sle.company,
-            DATE_FORMAT(sle.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(sle.posting_date, '%%b %%Y')
-        ORDER BY 
-            sle.company,
-            sort_date
-        """
-        
-        result = frappe.db.sql(query, params, as_dict=True)
+        # In/out movements per company, warehouse and month, from the stock movement summary
+        result = get_stock_movements(filters)
         
         if not result:
             return {
@@ -2481,9 +2299,9 @@ def get_company_wise_in_out_quantity(filters=None):
         
         for row in result:
             company = row['company']
-            month = row['month_year']
-            in_qty = float(row['quantity_in']) if row['quantity_in'] else 0
-            out_qty = float(row['quantity_out']) if row['quantity_out'] else 0
+            month = get_month_label(row['sort_date'])
+            in_qty = row['qty_in']
+            out_qty = row['qty_out']
             
             if company not in company_data:
                 company_data[company] = {}
@@ -2598,6 +2416,7 @@ def get_company_wise_in_out_quantity(filters=None):
         }
 
 @frappe.whitelist()
+@report_endpoint(schema="stock.in_out_consolidated", sources=REPORT_SOURCES)
 def get_consolidate_in_out_quantity(filters=None):
     """
     Chart Name: Consolidate In/Out Quantity
@@ -2605,48 +2424,9 @@ def get_consolidate_in_out_quantity(filters=None):
     Shows consolidated stock in and out quantities for all companies and warehouses
     """
     
-    base_query = """
-    SELECT
-        CASE 
-            WHEN sle.warehouse IS NOT NULL AND sle.warehouse != '' 
-            THEN CONCAT(COALESCE(sle.company, 'Unknown'), ' - ', sle.warehouse)
-            ELSE COALESCE(sle.company, 'Unknown Company')
-        END AS entity_name,
-        COALESCE(sle.company, 'Unknown Company') AS company,
-        COALESCE(sle.warehouse, 'No Warehouse') AS warehouse,
-        DATE_FORMAT(sle.posting_date, '%%b %%Y') AS month_year,
-        DATE_FORMAT(sle.posting_date, '%%Y-%%m') AS sort_date,
-        SUM(CASE WHEN sle.actual_qty > 0 THEN sle.actual_qty ELSE 0 END) AS quantity_in,
-        SUM(CASE WHEN sle.actual_qty < 0 THEN ABS(sle.actual_qty) ELSE 0 END) AS quantity_out,
-        SUM(CASE WHEN sle.actual_qty > 0 THEN sle.stock_value ELSE 0 END) AS value_in,
-        SUM(CASE WHEN sle.actual_qty < 0 THEN ABS(sle.stock_value) ELSE 0 END) AS value_out,
-        COUNT(DISTINCT sle.item_code) AS item_count
-    FROM `tabStock Ledger Entry` sle
-    INNER JOIN `tabItem` i ON sle.item_code = i.name
-    INNER JOIN `tabItem Group` ig ON i.item_group = ig.name
-    WHERE 
-        i.is_stock_item = 1
-        
-    """
-    
     try:
-        # Apply filters to query
-        query, params = apply_filters_to_query(base_query, filters)
-        
-        # Add GROUP BY and ORDER BY clauses
-        query += """
-        GROUP BY 
-            entity_name,
-            sle.company,
-            sle.warehouse,
-            DATE_FORMAT(sle.posting_date, '%%Y-%%m'),
-            DATE_FORMAT(sle.posting_date, '%%b %%Y')
-        ORDER BY 
-            entity_name,
-            sort_date
-        """
-        
-        result = frappe.db.sql(query, params, as_dict=True)
+        # In/out movements per company, warehouse and month, from the stock movement summary
+        result = get_stock_movements(filters, reportable=False)
         
         if not result:
             return {
@@ -2663,16 +2443,16 @@ def get_consolidate_in_out_quantity(filters=None):
         entity_info = {}
         
         for row in result:
-            entity = row['entity_name']
-            month = row['month_year']
-            in_qty = float(row['quantity_in']) if row['quantity_in'] else 0
-            out_qty = float(row['quantity_out']) if row['quantity_out'] else 0
+            entity = get_entity_name(row['company'], row['warehouse'])
+            month = get_month_label(row['sort_date'])
+            in_qty = row['qty_in']
+            out_qty = row['qty_out']
             
             if entity not in entity_data:
                 entity_data[entity] = {}
                 entity_info[entity] = {
-                    'company': row['company'],
-                    'warehouse': row['warehouse'],
+                    'company': row['company'] or 'Unknown Company',
+                    'warehouse': row['warehouse'] or 'No Warehouse',
                     'total_in': 0,
                     'total_out': 0,
                     'net_movement': 0
@@ -0,0 +1,95 @@
+import frappe
+from frappe.utils import flt
+
+# Slice colors of the per-group share pies, in rank order
+PIE_COLORS = (
+    '#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF',
+    '#FF9F40', '#FF6384', '#C9CBCF', '#4BC0C0', '#FF9F40'
+)
+OTHERS_COLOR = '#C9CBCF'
+
+
+def get_top_n_per_group(query, values, group, measures, limit, columns=(), rank_by=None):
+    """
+    Top `limit` rows of every `group` of an aggregate query, ranked in SQL.
+
+    `query` is a grouped SELECT (no ORDER BY) returning the `group` column, the
+    entity `columns` and the numeric `measures`. Rows are numbered within their
+    group with ROW_NUMBER() by `rank_by` (default: the first measure) descending,
+    ties broken by `columns`, so only `limit` rows per group leave the database.
+    Everything ranked below is summed into one "others" row per group, with the
+    number of rows it stands for as `entity_count`.
+
+    Returns {group: {"top": [rows], "others": row or None, "total": {measure: total}}}
+    in group order.
+    """
+    rank_by = rank_by or measures[0]
+    order = ", ".join([f"`{rank_by}` DESC"] + [f"`{column}`" for column in columns])
+    top_columns = ", ".join([f"`{column}`" for column in columns] + [f"`{measure}`" for measure in measures])
+    others_columns = ", ".join(
+        [f"NULL AS `{column}`" for column in columns]
+        + [f"SUM(`{measure}`) AS `{measure}`" for measure in measures]
+    )
+
+    rows = frappe.db.sql(f"""
+        WITH aggregated AS (
+            {query}
+        ),
+        ranked AS (
+            SELECT
+                aggregated.*,
+                ROW_NUMBER() OVER (PARTITION BY `{group}` ORDER BY {order}) AS row_rank
+            FROM aggregated
+        )
+        SELECT `{group}`, 0 AS is_others, row_rank, 1 AS entity_count, {top_columns}
+        FROM ranked
+        WHERE row_rank <= %(top_n)s
+        UNION ALL
+        SELECT `{group}`, 1 AS is_others, NULL AS row_rank, COUNT(*) AS entity_count, {others_columns}
+        FROM ranked
+        WHERE row_rank > %(top_n)s
+        GROUP BY `{group}`
+        ORDER BY `{group}`, is_others, row_rank
+    """, dict(values or {}, top_n=limit), as_dict=True)
+
+    groups = {}
+    for row in rows:
+        entry = groups.setdefault(row[group], frappe._dict(
+            top=[],
+            others=None,
+            total=frappe._dict({measure: 0 for measure in measures})
+        ))
+        if row.is_others:
+            entry.others = row
+        else:
+            entry.top.append(row)
+        for measure in measures:
+            entry.total[measure] += flt(row[measure])
+    return groups
+
+
+def get_share_pie(entry, label, value):
+    """
+    Pie of one get_top_n_per_group() group: a slice per top row labelled with
+    its share of the group total, plus an "Others" slice for the remainder.
+    """
+    total = entry.total[value]
+    labels = []
+    data = []
+    background_colors = []
+
+    for i, row in enumerate(entry.top):
+        amount = flt(row[value])
+        percentage = (amount / total) * 100 if total else 0
+        labels.append(f"{row[label]} ({percentage:.1f}%)")
+        data.append(amount)
+        background_colors.append(PIE_COLORS[i % len(PIE_COLORS)])
+
+    remaining = flt(entry.others[value]) if entry.others else 0
+    if remaining > 0:
+        percentage = (remaining / total) * 100
+        labels.append(f"Others ({percentage:.1f}%)")
+        data.append(remaining)
+        background_colors.append(OTHERS_COLOR)
+
+    return frappe._dict(labels=labels, data=data, backgroundColor=background_colors, total=total)
@@ -0,0 +1,98 @@
+import frappe
+from frappe.utils import cint, flt
+
+TREE_KEY = "erpera_reports:tree"
+
+# Nested set doctypes the report filters accept group nodes of
+TREE_DOCTYPES = {
+    "Item Group": "parent_item_group",
+    "Cost Center": "parent_cost_center"
+}
+
+
+def get_tree(doctype):
+    """
+    name -> (lft, rgt, parent, is_group) of every node of a nested set doctype,
+    cached until a node of the doctype changes.
+    """
+    cache_key = f"{TREE_KEY}:{doctype}"
+    tree = frappe.cache().get_value(cache_key)
+    if tree is None:
+        parent_field = TREE_DOCTYPES[doctype]
+        tree = {
+            node.name: (cint(node.lft), cint(node.rgt), node.parent, cint(node.is_group))
+            for node in frappe.db.sql(f"""
+                SELECT name, lft, rgt, `{parent_field}` AS parent, is_group
+                FROM `tab{doctype}`
+            """, as_dict=True)
+        }
+        frappe.cache().set_value(cache_key, tree)
+    return tree
+
+
+def clear_tree_cache(doc, method=None):
+    """doc_events hook on Item Group and Cost Center: reload the tree on next use."""
+    frappe.cache().delete_value(f"{TREE_KEY}:{doc.doctype}")
+
+
+def is_group_node(doctype, name):
+    node = get_tree(doctype).get(name)
+    return bool(node and node[3])
+
+
+def get_descendants(doctype, name):
+    """The node and every node below it, read off the lft/rgt range of the cached tree."""
+    tree = get_tree(doctype)
+    if name not in tree:
+        return {name}
+    lft, rgt = tree[name][0], tree[name][1]
+    return {node for node, bounds in tree.items() if bounds[0] >= lft and bounds[1] <= rgt}
+
+
+def get_tree_condition(column, doctype, name, param):
+    """
+    Filter of `column` on a tree node. A leaf (or unknown) node is matched on
+    %(param)s as before; a group node becomes a lft/rgt range over the doctype,
+    with the bounds taken from the cached tree, so it matches every node below.
+    """
+    if not is_group_node(doctype, name):
+        return f"{column} = %({param})s"
+    lft, rgt = get_tree(doctype)[name][:2]
+    return f"{column} IN (SELECT name FROM `tab{doctype}` WHERE lft >= {lft} AND rgt <= {rgt})"
+
+
+def cost_center_condition(column, branch, param="branch"):
+    return get_tree_condition(column, "Cost Center", branch, param)
+
+
+def item_group_condition(column, item_group, param="item_group"):
+    return get_tree_condition(column, "Item Group", item_group, param)
+
+
+def roll_up(doctype, totals):
+    """
+    Totals of every group node from the totals of the nodes below it, in memory:
+    {node: amount} or {node: {key: amount}} -> the same shape for the given
+    nodes and all their ancestors.
+    """
+    tree = get_tree(doctype)
+    rolled = {}
+    for name, total in totals.items():
+        node = name
+        while node:
+            if isinstance(total, dict):
+                entry = rolled.setdefault(node, {})
+                for key, amount in total.items():
+                    entry[key] = entry.get(key, 0) + flt(amount)
+            else:
+                rolled[node] = rolled.get(node, 0) + flt(total)
+            node = tree[node][2] if node in tree else None
+    return rolled
+
+
+def get_group_totals(doctype, totals):
+    """roll_up() restricted to the group nodes, for charts of branch groups."""
+    return {
+        node: total for node, total in roll_up(doctype, totals).items()
+        if is_group_node(doctype, node)
+    }
@@ -1,6 +1,19 @@
 import frappe
 from datetime import datetime
 
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.fragments import get_page_fragments
+from erpera_reports.items import get_excluded_item_groups
+from erpera_reports.replica import read_from_replica
+from erpera_reports.trees import cost_center_condition
+
+# Doctypes whose modification watermark versions the modal responses
+MODAL_SOURCES = ("Purchase Invoice", "Item", "Cost Center")
+
+# Doctypes whose data version keys the cached page fragments
+FRAGMENT_SOURCES = ("Purchase Invoice", "Supplier", "Item", "Item Group", "Company", "Cost Center")
+
+@read_from_replica
 def get_context(context):
     """
     Get context for the buying reports page.
@@ -8,7 +21,12 @@ def get_context(context):
     Now uses filters from frappe.request.args.get for from_date, to_date, company, branch.
     """
     context.active_page = "buying"
-    
+
+    # Filter panel and number cards are served from the fragment cache while their data is unchanged
+    context.fragments = get_page_fragments(context.active_page, FRAGMENT_SOURCES)
+    if context.fragments.cached:
+        return context
+
     # Fetch companies
     companies = frappe.get_all(
         "Company",
@@ -20,21 +38,22 @@ def get_context(context):
     branches = frappe.get_all(
         "Cost Center",
         fields=["name as value", "cost_center_name as label"],
-        filters={"is_group": 0}
+        order_by="lft"
     )
     
     # Fetch items (stock items only for buying)
     items = frappe.get_all(
         "Item",
         fields=["name as value", "item_name as label"],
-        filters={"is_stock_item": 1, "item_group": ["!=", "Raw Material", "Services", "Sub Assemblies", "Consumable", "Furniture", "EXPENSE", "FIXED ASSET"]}
+        filters={"is_stock_item": 1, "item_group": ["not in", get_excluded_item_groups()]}
     )
     
     # Fetch item groups
     item_groups = frappe.get_all(
         "Item Group",
         fields=["name as value", "name as label"],
-        filters={"is_group": 0, "item_group_name": ["!=", "Raw Material", "Services", "Sub Assemblies", "Consumable", "Furniture", "EXPENSE", "FIXED ASSET"]}
+        order_by="lft",
+        filters={"item_group_name": ["not in", get_excluded_item_groups()]}
     )
     
     # Fetch suppliers
@@ -58,30 +77,12 @@ def get_context(context):
     company = args.get('company')
     branch = args.get('branch')
     
-    # Calculate dynamic periods (defaults)
-    current_date = datetime.now()
-    current_month = current_date.strftime("%B")  # Full month name (e.g., "July")
-    current_year = current_date.year
-    
-    # Calculate fiscal year (assuming April to March fiscal year)
-    if current_date.month >= 4:  # April onwards
-        fiscal_year = f"FY {current_year}-{str(current_year + 1)[2:]}"
-        fy_start = f"{current_year}-04-01"
-        fy_end = f"{current_year + 1}-03-31"
-    else:  # January to March
-        fiscal_year = f"FY {current_year - 1}-{str(current_year)[2:]}"
-        fy_start = f"{current_year - 1}-04-01"
-        fy_end = f"{current_year}-03-31"
-    
-    # Add periods to context
-    context.current_fiscal_year = fiscal_year
-    context.current_month = current_month
-    
-    # Use filters or defaults for number cards
-    filter_from = from_date or fy_start
-    filter_to = to_date or fy_end
-    filter_month_from = from_date or current_date.replace(day=1).strftime("%Y-%m-%d")
-    filter_month_to = to_date or current_date.strftime("%Y-%m-%d")
+    # Calculate dynamic periods (defaults) and use filters where set
+    periods = get_filter_periods(from_date, to_date)
+    context.current_fiscal_year = periods.fiscal_year
+    context.current_month = periods.current_month
+    filter_from, filter_to = periods.filter_from, periods.filter_to
+    filter_month_from, filter_month_to = periods.filter_month_from, periods.filter_month_to
     
     # Build extra conditions for company/branch
     extra_pi = ""
@@ -90,7 +91,7 @@ def get_context(context):
         extra_pi += " AND pi.company = %(company)s"
         extra_args['company'] = company
     if branch:
-        extra_pi += " AND pi.cost_center = %(branch)s"
+        extra_pi += f" AND {cost_center_condition('pi.cost_center', branch)}"
         extra_args['branch'] = branch
     
     # Calculate statistics for number cards
@@ -173,11 +174,34 @@ def get_context(context):
     context.supplier_count = f"{unique_suppliers:,}"
     context.avg_invoice_value = f"₹{avg_purchase:,.0f}"
     
-    # Get detailed data for each cost center for modal display, using filters
-    context.cost_center_details = get_cost_center_details(filter_from, filter_to, filter_month_from, filter_month_to, company, branch)
+    # Breakdowns behind the number card modals are fetched when a modal opens, see get_modal_details
     
     return context
 
+def get_filter_periods(from_date=None, to_date=None):
+    """
+    Number card periods: the fiscal year and the current month by default,
+    replaced by the page's date filter when one is set
+    """
+    current_date = datetime.now()
+    current_year = current_date.year
+    if current_date.month >= 4:
+        fiscal_year = f"FY {current_year}-{str(current_year + 1)[2:]}"
+        fy_start = f"{current_year}-04-01"
+        fy_end = f"{current_year + 1}-03-31"
+    else:
+        fiscal_year = f"FY {current_year - 1}-{str(current_year)[2:]}"
+        fy_start = f"{current_year - 1}-04-01"
+        fy_end = f"{current_year}-03-31"
+    return frappe._dict(
+        fiscal_year=fiscal_year,
+        current_month=current_date.strftime("%B"),
+        filter_from=from_date or fy_start,
+        filter_to=to_date or fy_end,
+        filter_month_from=from_date or current_date.replace(day=1).strftime("%Y-%m-%d"),
+        filter_month_to=to_date or current_date.strftime("%Y-%m-%d")
+    )
+
 def get_cost_center_details(fy_start, fy_end, month_start, month_end, company=None, branch=None):
     """
     Get detailed statistics for each cost center to display in modal, using filters if provided
@@ -188,7 +212,7 @@ def get_cost_center_details(fy_start, fy_end, month_start, month_end, company=No
         extra_pi += " AND pi.company = %(company)s"
         args['company'] = company
     if branch:
-        extra_pi += " AND pi.cost_center = %(branch)s"
+        extra_pi += f" AND {cost_center_condition('pi.cost_center', branch)}"
         args['branch'] = branch
     # Query for fiscal year data by cost center
     fy_by_cost_center_query = f"""
@@ -285,3 +309,10 @@ def get_cost_center_details(fy_start, fy_end, month_start, month_end, company=No
         })
     
     return result
+
+@frappe.whitelist()
+@report_endpoint(sources=MODAL_SOURCES)
+def get_modal_details(from_date=None, to_date=None, company=None, branch=None):
+    """Per cost center breakdown of the number cards, loaded when a modal is opened"""
+    periods = get_filter_periods(from_date, to_date)
+    return get_cost_center_details(periods.filter_from, periods.filter_to, periods.filter_month_from, periods.filter_month_to, company, branch)
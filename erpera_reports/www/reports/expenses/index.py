@@ -2,7 +2,15 @@ import frappe
 from datetime import datetime
 from erpnext.accounts.utils import get_balance_on
 
+from erpera_reports.fragments import get_page_fragments
+from erpera_reports.replica import read_from_replica
+from erpera_reports.trees import cost_center_condition
 
+# Doctypes whose data version keys the cached page fragments
+FRAGMENT_SOURCES = ("GL Entry", "Account", "Supplier", "Item Group", "Company", "Cost Center")
+
+
+@read_from_replica
 def get_context(context):
     """
     Get context for the expenses dashboard page.
@@ -10,6 +18,12 @@ def get_context(context):
     Only includes item group 'EXPENSE'.
     """
     context.active_page = "expenses"
+    context.cost_center_details = 0
+
+    # Filter panel and number cards are served from the fragment cache while their data is unchanged
+    context.fragments = get_page_fragments(context.active_page, FRAGMENT_SOURCES)
+    if context.fragments.cached:
+        return context
 
     # Fetch companies
     companies = frappe.get_all(
@@ -21,7 +35,7 @@ def get_context(context):
     branches = frappe.get_all(
         "Cost Center",
         fields=["name as value", "cost_center_name as label"],
-        filters={"is_group": 0}
+        order_by="lft"
     )
     # Fetch only item groups that are 'EXPENSE'
     item_groups = frappe.get_all(
@@ -76,7 +90,7 @@ def get_context(context):
         extra_gle += " AND gle.company = %(company)s"
         extra_args['company'] = company
     if branch and branch.strip():
-        extra_gle += " AND gle.cost_center = %(branch)s"
+        extra_gle += f" AND {cost_center_condition('gle.cost_center', branch)}"
         extra_args['branch'] = branch
 
     # Query for Total Expense (all expense accounts) like salary, rent, electric, etc.
@@ -113,7 +127,4 @@ def get_context(context):
     context.total_rents = f"₹{total_rents:,.0f}"
     context.total_electric_bill = f"₹{total_electric_bill:,.0f}"
 
-    # Get detailed data for each cost center for modal display, using filters
-    context.cost_center_details = 0
-
     return context
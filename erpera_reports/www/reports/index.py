@@ -1,7 +1,21 @@
 import frappe
 from frappe import _
 from datetime import datetime, timedelta
-from frappe.utils import nowdate, add_months, add_days, getdate
+from frappe.utils import nowdate, add_months, add_days, getdate, cint
+
+from erpera_reports.comparison import compare_totals, resolve_windows
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.fragments import get_page_fragments
+from erpera_reports.items import get_excluded_item_groups
+from erpera_reports.replica import read_from_replica
+from erpera_reports.sketches import count_distinct
+from erpera_reports.trees import cost_center_condition
+
+# Doctypes whose modification watermark versions the modal responses
+MODAL_SOURCES = ("Sales Invoice", "Purchase Invoice", "Stock Ledger Entry", "Cost Center", "Warehouse")
+
+# Doctypes whose data version keys the cached page fragments
+FRAGMENT_SOURCES = ("Sales Invoice", "Purchase Invoice", "Item", "Item Group", "Company", "Cost Center")
 
 def format_currency(value):
     
@@ -10,10 +24,17 @@ def format_currency(value):
     except Exception:
         return f"₹{value}"
 
+@read_from_replica
 def get_context(context):
     """Get context data for the main dashboard page"""
     context.title = _("ERPera Reports Dashboard")
     context.active_page = "dashboard"
+
+    # Filter panel and number cards are served from the fragment cache while their data is unchanged
+    context.fragments = get_page_fragments(context.active_page, FRAGMENT_SOURCES)
+    if context.fragments.cached:
+        return context
+
     # Get filters from URL args
     args = frappe.request.args
     from_date = args.get('from_date')
@@ -22,26 +43,12 @@ def get_context(context):
     branch = args.get('branch')
     warehouse = args.get('warehouse')
 
-    # Calculate dynamic periods (defaults)
-    current_date = datetime.now()
-    current_month = current_date.strftime("%B")
-    current_year = current_date.year
-    if current_date.month >= 4:
-        fiscal_year = f"FY {current_year}-{str(current_year + 1)[2:]}"
-        fy_start = f"{current_year}-04-01"
-        fy_end = f"{current_year + 1}-03-31"
-    else:
-        fiscal_year = f"FY {current_year - 1}-{str(current_year)[2:]}"
-        fy_start = f"{current_year - 1}-04-01"
-        fy_end = f"{current_year}-03-31"
-    context.current_fiscal_year = fiscal_year
-    context.current_month = current_month
-
-    # Use filters or defaults for number cards
-    filter_from = from_date or fy_start
-    filter_to = to_date or fy_end
-    filter_month_from = from_date or current_date.replace(day=1).strftime("%Y-%m-%d")
-    filter_month_to = to_date or current_date.strftime("%Y-%m-%d")
+    # Calculate dynamic periods (defaults) and use filters where set
+    periods = get_filter_periods(from_date, to_date)
+    context.current_fiscal_year = periods.fiscal_year
+    context.current_month = periods.current_month
+    filter_from, filter_to = periods.filter_from, periods.filter_to
+    filter_month_from, filter_month_to = periods.filter_month_from, periods.filter_month_to
 
     # Build extra conditions for company/branch
     extra_si = ""
@@ -54,7 +61,7 @@ def get_context(context):
         extra_si += " AND si.company = %(company)s"
         extra_args['company'] = company
     if branch:
-        extra_si += " AND si.cost_center = %(branch)s"
+        extra_si += f" AND {cost_center_condition('si.cost_center', branch)}"
         extra_args['branch'] = branch
 
     # Query for total sales, invoice count (fiscal year or filtered)
@@ -80,18 +87,23 @@ def get_context(context):
         extra_pi += " AND pi.company = %(company)s"
         extra_pi_args['company'] = company
     if branch:
-        extra_pi += " AND pi.cost_center = %(branch)s"
+        extra_pi += f" AND {cost_center_condition('pi.cost_center', branch)}"
         extra_pi_args['branch'] = branch
+    # Distinct suppliers come from the HyperLogLog sketches when they cover the range
+    unique_suppliers = count_distinct("suppliers", from_date, to_date, company, branch)
+    unique_suppliers_column = "COUNT(DISTINCT supplier) AS unique_suppliers," if unique_suppliers is None else ""
     purchase_query = f"""
         SELECT
             SUM(grand_total) AS total_amount,
-            COUNT(DISTINCT supplier) AS unique_suppliers,
+            {unique_suppliers_column}
             SUM(outstanding_amount) AS total_outstanding
         FROM `tabPurchase Invoice` pi
         WHERE docstatus = 1
         {extra_pi}
     """
     purchase_stats = frappe.db.sql(purchase_query, extra_pi_args, as_dict=True)[0] or {}
+    if unique_suppliers is not None:
+        purchase_stats['unique_suppliers'] = unique_suppliers
 
     # Stock summary (SKUs, stock value, efficiency)
     total_skus_result = frappe.db.sql("""
@@ -129,29 +141,51 @@ def get_context(context):
     branches = frappe.get_all(
         "Cost Center",
         fields=["name as value", "cost_center_name as label"],
-        filters={"is_group": 0}
+        order_by="lft"
     )
     items = frappe.get_all(
         "Item",
         fields=["name as value", "item_name as label"],
-        filters={"is_stock_item": 1, "item_group": ["!=", "Raw Material", "Services", "Sub Assemblies", "Consumable", "Furniture", "EXPENSE", "FIXED ASSET"]}
+        filters={"is_stock_item": 1, "item_group": ["not in", get_excluded_item_groups()]}
     )
     item_groups = frappe.get_all(
         "Item Group",
         fields=["name as value", "name as label"],
-        filters={"is_group": 0, "item_group_name": ["!=", "Raw Material", "Services", "Sub Assemblies", "Consumable", "Furniture", "EXPENSE", "FIXED ASSET"]}
+        order_by="lft",
+        filters={"item_group_name": ["not in", get_excluded_item_groups()]}
     )
     context.company_list = companies
     context.branch_list = branches
     context.item_list = items
     context.item_group_list = item_groups
 
-    # Get detailed data for each cost center for modal display, using filters
-    context.sales_details = get_sales_details(filter_from, filter_to, company, branch)
-    context.purchase_details = get_purchase_details(filter_from, filter_to, company, branch)
-    context.stock_details = get_stock_details(warehouse, company)
+    # Breakdowns behind the number card modals are fetched when a modal opens, see get_modal_details
     return context
 
+def get_filter_periods(from_date=None, to_date=None):
+    """
+    Number card periods: the fiscal year and the current month by default,
+    replaced by the page's date filter when one is set
+    """
+    current_date = datetime.now()
+    current_year = current_date.year
+    if current_date.month >= 4:
+        fiscal_year = f"FY {current_year}-{str(current_year + 1)[2:]}"
+        fy_start = f"{current_year}-04-01"
+        fy_end = f"{current_year + 1}-03-31"
+    else:
+        fiscal_year = f"FY {current_year - 1}-{str(current_year)[2:]}"
+        fy_start = f"{current_year - 1}-04-01"
+        fy_end = f"{current_year}-03-31"
+    return frappe._dict(
+        fiscal_year=fiscal_year,
+        current_month=current_date.strftime("%B"),
+        filter_from=from_date or fy_start,
+        filter_to=to_date or fy_end,
+        filter_month_from=from_date or current_date.replace(day=1).strftime("%Y-%m-%d"),
+        filter_month_to=to_date or current_date.strftime("%Y-%m-%d")
+    )
+
 def get_sales_details(start_date, end_date, company=None, branch=None):
     """
     Get detailed sales statistics for each branch to display in modal, using filters if provided
@@ -162,7 +196,7 @@ def get_sales_details(start_date, end_date, company=None, branch=None):
         extra_si += " AND si.company = %(company)s"
         args['company'] = company
     if branch:
-        extra_si += " AND si.cost_center = %(branch)s"
+        extra_si += f" AND {cost_center_condition('si.cost_center', branch)}"
         args['branch'] = branch
     sales_by_branch_query = f"""
         SELECT 
@@ -202,7 +236,7 @@ def get_purchase_details(start_date, end_date, company=None, branch=None):
         extra_pi += " AND pi.company = %(company)s"
         args['company'] = company
     if branch:
-        extra_pi += " AND pi.cost_center = %(branch)s"
+        extra_pi += f" AND {cost_center_condition('pi.cost_center', branch)}"
         args['branch'] = branch
     purchase_by_branch_query = f"""
         SELECT 
@@ -276,6 +310,20 @@ def get_stock_details(warehouse=None, company=None):
     return result
 
 @frappe.whitelist()
+@report_endpoint(sources=MODAL_SOURCES)
+def get_modal_details(detail, from_date=None, to_date=None, company=None, branch=None, warehouse=None):
+    """Per branch (or warehouse) breakdown of a number card, loaded when its modal is opened"""
+    periods = get_filter_periods(from_date, to_date)
+    if detail == "sales":
+        return get_sales_details(periods.filter_from, periods.filter_to, company, branch)
+    if detail == "purchase":
+        return get_purchase_details(periods.filter_from, periods.filter_to, company, branch)
+    if detail == "stock":
+        return get_stock_details(warehouse, company)
+    frappe.throw(_("Unknown detail {0}").format(detail))
+
+@frappe.whitelist()
+@read_from_replica
 def get_dashboard_data(from_date=None, to_date=None, company=None, branch=None):
     """Get dashboard summary data for sales, purchase, and stock"""
     today = getdate(nowdate())
@@ -318,16 +366,21 @@ def get_dashboard_data(from_date=None, to_date=None, company=None, branch=None):
     if branch:
         purchase_filters += " AND cost_center = %s"
         purchase_args.append(branch)
+    # Distinct suppliers come from the HyperLogLog sketches when they cover the range
+    unique_suppliers = count_distinct("suppliers", from_date, to_date, company, branch)
+    unique_suppliers_column = "COUNT(DISTINCT supplier) as unique_suppliers," if unique_suppliers is None else ""
     purchase = frappe.db.sql(f"""
         SELECT 
             COALESCE(SUM(grand_total), 0) as total_amount,
-            COUNT(DISTINCT supplier) as unique_suppliers,
+            {unique_suppliers_column}
             COALESCE(SUM(outstanding_amount), 0) as total_outstanding
         FROM `tabPurchase Invoice`
         WHERE posting_date BETWEEN %s AND %s
         AND docstatus = 1
         {purchase_filters}
     """, tuple(purchase_args), as_dict=True)[0]
+    if unique_suppliers is not None:
+        purchase.unique_suppliers = unique_suppliers
     # Stock summary (SKUs, stock value, efficiency)
     total_skus = frappe.db.sql("""
         SELECT COUNT(DISTINCT item_code) as total_skus
@@ -358,109 +411,77 @@ def get_dashboard_data(from_date=None, to_date=None, company=None, branch=None):
 def get_purchase_orders_summary(start_date, end_date, prev_start, prev_end):
     """Get purchase orders summary for current and previous month"""
     
-    # Current month data
-    current_data = frappe.db.sql("""
-        SELECT 
-            COUNT(*) as count,
-            COALESCE(SUM(grand_total), 0) as total_amount,
-            COUNT(CASE WHEN status = 'Draft' THEN 1 END) as draft_count,
-            COUNT(CASE WHEN status = 'To Receive and Bill' THEN 1 END) as pending_count
-        FROM `tabPurchase Order`
-        WHERE transaction_date BETWEEN %s AND %s
-        AND docstatus != 2
-    """, (start_date, end_date), as_dict=True)[0]
-    
-    # Previous month data for comparison
-    prev_data = frappe.db.sql("""
-        SELECT COALESCE(SUM(grand_total), 0) as total_amount
-        FROM `tabPurchase Order`
-        WHERE transaction_date BETWEEN %s AND %s
-        AND docstatus != 2
-    """, (prev_start, prev_end), as_dict=True)[0]
-    
-    # Calculate growth
-    amount_growth = 0
-    if prev_data.total_amount > 0:
-        amount_growth = round(((current_data.total_amount - prev_data.total_amount) / prev_data.total_amount) * 100, 1)
+    # Current and previous month in a single scan
+    windows = resolve_windows(start_date, end_date, rule="custom", compare_from=prev_start, compare_to=prev_end)
+    data = compare_totals(
+        "`tabPurchase Order`",
+        {
+            "count": ("COUNT", "name"),
+            "total_amount": ("SUM", "grand_total"),
+            "draft_count": ("COUNT", "CASE WHEN status = 'Draft' THEN 1 END"),
+            "pending_count": ("COUNT", "CASE WHEN status = 'To Receive and Bill' THEN 1 END")
+        },
+        windows,
+        date_field="transaction_date",
+        conditions=" AND docstatus != 2"
+    )
     
     return {
-        "count": current_data.count,
-        "total_amount": current_data.total_amount,
-        "draft_count": current_data.draft_count,
-        "pending_count": current_data.pending_count,
-        "amount_growth": amount_growth
+        "count": cint(data["count"].value),
+        "total_amount": data.total_amount.value,
+        "draft_count": cint(data.draft_count.value),
+        "pending_count": cint(data.pending_count.value),
+        "amount_growth": data.total_amount.change
     }
 
 def get_purchase_receipts_summary(start_date, end_date, prev_start, prev_end):
     """Get purchase receipts summary for current and previous month"""
     
-    # Current month data
-    current_data = frappe.db.sql("""
-        SELECT 
-            COUNT(*) as count,
-            COALESCE(SUM(grand_total), 0) as total_amount,
-            COUNT(CASE WHEN status = 'Draft' THEN 1 END) as draft_count,
-            COUNT(CASE WHEN status = 'To Bill' THEN 1 END) as to_bill_count
-        FROM `tabPurchase Receipt`
-        WHERE posting_date BETWEEN %s AND %s
-        AND docstatus != 2
-    """, (start_date, end_date), as_dict=True)[0]
-    
-    # Previous month data for comparison
-    prev_data = frappe.db.sql("""
-        SELECT COALESCE(SUM(grand_total), 0) as total_amount
-        FROM `tabPurchase Receipt`
-        WHERE posting_date BETWEEN %s AND %s
-        AND docstatus != 2
-    """, (prev_start, prev_end), as_dict=True)[0]
-    
-    # Calculate growth
-    amount_growth = 0
-    if prev_data.total_amount > 0:
-        amount_growth = round(((current_data.total_amount - prev_data.total_amount) / prev_data.total_amount) * 100, 1)
+    # Current and previous month in a single scan
+    windows = resolve_windows(start_date, end_date, rule="custom", compare_from=prev_start, compare_to=prev_end)
+    data = compare_totals(
+        "`tabPurchase Receipt`",
+        {
+            "count": ("COUNT", "name"),
+            "total_amount": ("SUM", "grand_total"),
+            "draft_count": ("COUNT", "CASE WHEN status = 'Draft' THEN 1 END"),
+            "to_bill_count": ("COUNT", "CASE WHEN status = 'To Bill' THEN 1 END")
+        },
+        windows,
+        conditions=" AND docstatus != 2"
+    )
     
     return {
-        "count": current_data.count,
-        "total_amount": current_data.total_amount,
-        "draft_count": current_data.draft_count,
-        "to_bill_count": current_data.to_bill_count,
-        "amount_growth": amount_growth
+        "count": cint(data["count"].value),
+        "total_amount": data.total_amount.value,
+        "draft_count": cint(data.draft_count.value),
+        "to_bill_count": cint(data.to_bill_count.value),
+        "amount_growth": data.total_amount.change
     }
 
 def get_purchase_invoices_summary(start_date, end_date, prev_start, prev_end):
     """Get purchase invoices summary for current and previous month"""
     
-    # Current month data
-    current_data = frappe.db.sql("""
-        SELECT 
-            COUNT(*) as count,
-            COALESCE(SUM(grand_total), 0) as total_amount,
-            COUNT(CASE WHEN status = 'Draft' THEN 1 END) as draft_count,
-            COUNT(CASE WHEN status = 'Overdue' THEN 1 END) as overdue_count
-        FROM `tabPurchase Invoice`
-        WHERE posting_date BETWEEN %s AND %s
-        AND docstatus != 2
-    """, (start_date, end_date), as_dict=True)[0]
-    
-    # Previous month data for comparison
-    prev_data = frappe.db.sql("""
-        SELECT COALESCE(SUM(grand_total), 0) as total_amount
-        FROM `tabPurchase Invoice`
-        WHERE posting_date BETWEEN %s AND %s
-        AND docstatus != 2
-    """, (prev_start, prev_end), as_dict=True)[0]
-    
-    # Calculate growth
-    amount_growth = 0
-    if prev_data.total_amount > 0:
-        amount_growth = round(((current_data.total_amount - prev_data.total_amount) / prev_data.total_amount) * 100, 1)
+    # Current and previous month in a single scan
+    windows = resolve_windows(start_date, end_date, rule="custom", compare_from=prev_start, compare_to=prev_end)
+    data = compare_totals(
+        "`tabPurchase Invoice`",
+        {
+            "count": ("COUNT", "name"),
+            "total_amount": ("SUM", "grand_total"),
+            "draft_count": ("COUNT", "CASE WHEN status = 'Draft' THEN 1 END"),
+            "overdue_count": ("COUNT", "CASE WHEN status = 'Overdue' THEN 1 END")
+        },
+        windows,
+        conditions=" AND docstatus != 2"
+    )
     
     return {
-        "count": current_data.count,
-        "total_amount": current_data.total_amount,
-        "draft_count": current_data.draft_count,
-        "overdue_count": current_data.overdue_count,
-        "amount_growth": amount_growth
+        "count": cint(data["count"].value),
+        "total_amount": data.total_amount.value,
+        "draft_count": cint(data.draft_count.value),
+        "overdue_count": cint(data.overdue_count.value),
+        "amount_growth": data.total_amount.change
     }
 
 def get_suppliers_summary():
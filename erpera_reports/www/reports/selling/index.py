@@ -1,6 +1,19 @@
 import frappe
 from datetime import datetime
 
+from erpera_reports.endpoints import report_endpoint
+from erpera_reports.fragments import get_page_fragments
+from erpera_reports.items import get_excluded_item_groups
+from erpera_reports.replica import read_from_replica
+from erpera_reports.trees import cost_center_condition
+
+# Doctypes whose modification watermark versions the modal responses
+MODAL_SOURCES = ("Sales Invoice", "Cost Center")
+
+# Doctypes whose data version keys the cached page fragments
+FRAGMENT_SOURCES = ("Sales Invoice", "Customer", "Item", "Item Group", "Company", "Cost Center")
+
+@read_from_replica
 def get_context(context):
     """
     Get context for the selling reports page.
@@ -8,6 +21,12 @@ def get_context(context):
     Now uses filters from frappe.request.args.get for from_date, to_date, company, branch.
     """
     context.active_page = "selling"
+
+    # Filter panel and number cards are served from the fragment cache while their data is unchanged
+    context.fragments = get_page_fragments(context.active_page, FRAGMENT_SOURCES)
+    if context.fragments.cached:
+        return context
+
     # Fetch companies
     companies = frappe.get_all(
         "Company",
@@ -18,19 +37,20 @@ def get_context(context):
     branches = frappe.get_all(
         "Cost Center",
         fields=["name as value", "cost_center_name as label"],
-        filters={"is_group": 0}
+        order_by="lft"
     )
     # Fetch items
     items = frappe.get_all(
         "Item",
         fields=["name as value", "item_name as label"],
-        filters={"is_stock_item": 1, "item_group": ["!=", "Raw Material", "Services", "Sub Assemblies", "Consumable", "Furniture", "EXPENSE", "FIXED ASSET"]}
+        filters={"is_stock_item": 1, "item_group": ["not in", get_excluded_item_groups()]}
     )
     # Fetch item groups
     item_groups = frappe.get_all(
         "Item Group",
         fields=["name as value", "name as label"],
-        filters={"is_group": 0, "item_group_name": ["!=", "Raw Material", "Services", "Sub Assemblies", "Consumable", "Furniture", "EXPENSE", "FIXED ASSET"]}
+        order_by="lft",
+        filters={"item_group_name": ["not in", get_excluded_item_groups()]}
     )
     context.company_list = companies
     context.branch_list = branches
@@ -44,26 +64,12 @@ def get_context(context):
     company = args.get('company')
     branch = args.get('branch')
 
-    # Calculate dynamic periods (defaults)
-    current_date = datetime.now()
-    current_month = current_date.strftime("%B")
-    current_year = current_date.year
-    if current_date.month >= 4:
-        fiscal_year = f"FY {current_year}-{str(current_year + 1)[2:]}"
-        fy_start = f"{current_year}-04-01"
-        fy_end = f"{current_year + 1}-03-31"
-    else:
-        fiscal_year = f"FY {current_year - 1}-{str(current_year)[2:]}"
-        fy_start = f"{current_year - 1}-04-01"
-        fy_end = f"{current_year}-03-31"
-    context.current_fiscal_year = fiscal_year
-    context.current_month = current_month
-
-    # Use filters or defaults for number cards
-    filter_from = from_date or fy_start
-    filter_to = to_date or fy_end
-    filter_month_from = from_date or current_date.replace(day=1).strftime("%Y-%m-%d")
-    filter_month_to = to_date or current_date.strftime("%Y-%m-%d")
+    # Calculate dynamic periods (defaults) and use filters where set
+    periods = get_filter_periods(from_date, to_date)
+    context.current_fiscal_year = periods.fiscal_year
+    context.current_month = periods.current_month
+    filter_from, filter_to = periods.filter_from, periods.filter_to
+    filter_month_from, filter_month_to = periods.filter_month_from, periods.filter_month_to
 
     # Build extra conditions for company/branch
     extra_si = ""
@@ -72,7 +78,7 @@ def get_context(context):
         extra_si += " AND si.company = %(company)s"
         extra_args['company'] = company
     if branch:
-        extra_si += " AND si.cost_center = %(branch)s"
+        extra_si += f" AND {cost_center_condition('si.cost_center', branch)}"
         extra_args['branch'] = branch
 
     # Query for total sales, invoice count, customer count (fiscal year or filtered)
@@ -113,10 +119,33 @@ def get_context(context):
     context.customer_count = frappe.db.count("Customer")
     context.avg_invoice_value = f"₹{avg_invoice_value:,.0f}"
 
-    # Get detailed data for each cost center for modal display, using filters
-    context.cost_center_details = get_cost_center_details(filter_from, filter_to, filter_month_from, filter_month_to, company, branch)
+    # Breakdowns behind the number card modals are fetched when a modal opens, see get_modal_details
     return context
 
+def get_filter_periods(from_date=None, to_date=None):
+    """
+    Number card periods: the fiscal year and the current month by default,
+    replaced by the page's date filter when one is set
+    """
+    current_date = datetime.now()
+    current_year = current_date.year
+    if current_date.month >= 4:
+        fiscal_year = f"FY {current_year}-{str(current_year + 1)[2:]}"
+        fy_start = f"{current_year}-04-01"
+        fy_end = f"{current_year + 1}-03-31"
+    else:
+        fiscal_year = f"FY {current_year - 1}-{str(current_year)[2:]}"
+        fy_start = f"{current_year - 1}-04-01"
+        fy_end = f"{current_year}-03-31"
+    return frappe._dict(
+        fiscal_year=fiscal_year,
+        current_month=current_date.strftime("%B"),
+        filter_from=from_date or fy_start,
+        filter_to=to_date or fy_end,
+        filter_month_from=from_date or current_date.replace(day=1).strftime("%Y-%m-%d"),
+        filter_month_to=to_date or current_date.strftime("%Y-%m-%d")
+    )
+
 def get_cost_center_details(fy_start, fy_end, month_start, month_end, company=None, branch=None):
     """
     Get detailed statistics for each cost center to display in modal, using filters if provided
@@ -127,7 +156,7 @@ def get_cost_center_details(fy_start, fy_end, month_start, month_end, company=No
         extra_si += " AND si.company = %(company)s"
         args['company'] = company
     if branch:
-        extra_si += " AND si.cost_center = %(branch)s"
+        extra_si += f" AND {cost_center_condition('si.cost_center', branch)}"
         args['branch'] = branch
     # Fiscal year data by cost center
     fy_by_cost_center_query = f"""
@@ -210,3 +239,9 @@ def get_cost_center_details(fy_start, fy_end, month_start, month_end, company=No
         })
     return result
 
+@frappe.whitelist()
+@report_endpoint(sources=MODAL_SOURCES)
+def get_modal_details(from_date=None, to_date=None, company=None, branch=None):
+    """Per cost center breakdown of the number cards, loaded when a modal is opened"""
+    periods = get_filter_periods(from_date, to_date)
+    return get_cost_center_details(periods.filter_from, periods.filter_to, periods.filter_month_from, periods.filter_month_to, company, branch)